@@ -0,0 +1,119 @@
+"""
+Measure memory retained by an assembled extension and the time to diff it.
+
+Assembles a source directory once with the plain round-trip parser and once
+with the parser that interns keys and short strings, each in a fresh
+interpreter. Without --source, a synthetic extension with --metrics metric
+files is generated in a temporary directory.
+
+Usage:
+    python benchmarks/assembly_memory.py [--source src/source] [--metrics 2000]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+
+SRC_DIR_PATH = Path(__file__).resolve().parent.parent / "src"
+
+METRIC = """\
+key: com.example.metric_{i}.count
+metadata:
+  displayName: Metric {i}
+  description: Number of requests handled by component {i}
+  unit: Count
+  tags:
+    - example
+dimensions:
+  - key: dt.entity.host
+    value: oid:1.3.6.1.2.1.1.5
+  - key: device.name
+    value: const:example
+  - key: component
+    value: metric:component_{i}
+type: gauge
+sourceType: snmp
+"""
+
+
+def generate_source(dir_path: Path, metrics: int) -> None:
+    (dir_path / "metrics").mkdir(parents=True)
+    (dir_path / "+index.yaml").write_text("name: com.example.benchmark\n")
+    for i in range(metrics):
+        path = dir_path / "metrics" / f"-metric_{i}.yaml"
+        path.write_text(METRIC.format(i=i))
+
+
+def measure(source: Path, mode: str) -> dict:
+    """Assemble in this process and report memory and timings."""
+    sys.path.insert(0, str(SRC_DIR_PATH))
+    import ruamel.yaml
+    from deepdiff import DeepDiff
+    from yamlex.api import joiner
+
+    if mode == "plain":
+        joiner.parser = ruamel.yaml.YAML()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    data = joiner.assemble_recursively(source, remove_comments=True)
+    assemble_seconds = time.perf_counter() - started
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    other = joiner.assemble_recursively(source, remove_comments=True)
+    started = time.perf_counter()
+    DeepDiff(data, other, ignore_order=True, report_repetition=True)
+    diff_seconds = time.perf_counter() - started
+
+    return {
+        "retained_mb": retained / 1024 / 1024,
+        "assemble_s": assemble_seconds,
+        "diff_s": diff_seconds,
+    }
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--source", type=Path, default=None)
+    arg_parser.add_argument("--metrics", type=int, default=2000)
+    arg_parser.add_argument("--mode", choices=["plain", "interning"])
+    options = arg_parser.parse_args()
+
+    # Child process: measure a single mode
+    if options.mode:
+        print(json.dumps(measure(options.source, options.mode)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = options.source
+        if source is None:
+            source = Path(temp_dir) / "source"
+            generate_source(source, options.metrics)
+
+        results = {}
+        for mode in ("plain", "interning"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--source", str(source), "--mode", mode],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            results[mode] = json.loads(output)
+
+    for mode, result in results.items():
+        print((
+            f"{mode:<10} {result['retained_mb']:8.1f} MB retained  "
+            f"{result['assemble_s']:6.2f} s assemble  "
+            f"{result['diff_s']:6.2f} s diff"
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
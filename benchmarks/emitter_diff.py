@@ -0,0 +1,125 @@
+"""
+Check that the fast emitter writes the same bytes as ruamel.
+
+Assembles the benchmark corpus, the synthetic extension of
+assembly_memory.py with a few scalar files added, and compares the text of
+the fast emitter with the text ruamel writes. Then does the same for
+randomly generated trees with tricky strings, numbers and block scalars.
+Data the fast emitter does not support is only counted, since join writes
+it with ruamel anyway.
+
+Fails if any output differs, and prints the first few differences.
+
+Usage:
+    python benchmarks/emitter_diff.py [--source src/source] [--metrics 2000] [--trees 5000] [--seed 0]
+"""
+import argparse
+import random
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from assembly_memory import SRC_DIR_PATH, generate_source
+
+sys.path.insert(0, str(SRC_DIR_PATH))
+
+from ruamel.yaml.scalarstring import FoldedScalarString, LiteralScalarString
+
+from yamlex.api.emitter import UnsupportedByFastEmitter, emit_yaml
+from yamlex.api.joiner import assemble_recursively
+from yamlex.api.util import dump_yaml
+
+
+# Scalar files of the corpus, with folding, indentation and unicode
+SCALAR_FILES = {
+    "description.txt": "Monitors example devices.\n\n  Indented line\nLast line\n",
+    "query.sql": "SELECT *\n\tFROM requests\n\tWHERE id = 1\n",
+    "notes.md": "# Notes\n\nUnicode: \xe9 \u20ac \U0001f600\nNext line\n",
+}
+
+# Fragments that random strings are made of, chosen to hit quoting rules
+FRAGMENTS = [
+    "", " ", "a", "a b", "yes", "no", "on", "null", "~", "1", "1.0", "0x1F",
+    "1e3", "-", "- a", "? x", "a: b", "a #b", "#x", "'q'", '"d"', "it's",
+    "x\ny", "x\n", "\ty", "\xe9", "\u20ac", "\U0001f600", "a\x00", "\xa0", "@x", "`x",
+    "!x", "&x", "*x", "%x", "{x}", "[x]", "x,y", "|", ">", "a  ", " a",
+    "2024-01-01", "12:30", "1_000", "+1", ".inf", ".nan", "=", "<<", "a\tb",
+    "a\\b", "\x85", "\u2028", "\u2029", "\ufeff", "x\r\ny",
+    "com.example.cpu:avg", "$prefix(x)", "{host}", "true", "False", "NULL",
+]
+NUMBERS = [0, -3, 12345678901234567890, 1.5, -0.0, 1e20, float("inf")]
+
+
+def random_string(rng: random.Random) -> str:
+    return "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 3)))
+
+
+def random_value(rng: random.Random, depth: int = 0) -> Any:
+    r = rng.random()
+    if depth < 4 and r < 0.25:
+        return {random_string(rng) or "k": random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+    if depth < 4 and r < 0.45:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    if r < 0.5:
+        return rng.choice([None, True, False, *NUMBERS])
+    if r < 0.55:
+        return FoldedScalarString(f"{random_string(rng)}\n{random_string(rng)}\n")
+    if r < 0.6:
+        return LiteralScalarString(f"{random_string(rng)}\n{random_string(rng)}")
+    return random_string(rng)
+
+
+def random_tree(rng: random.Random) -> Any:
+    if rng.random() < 0.8:
+        return {f"k{i}": random_value(rng) for i in range(rng.randint(1, 4))}
+    return [random_value(rng) for _ in range(3)]
+
+
+def compare(data: Any, mismatches: list[tuple[Any, str, str]]) -> bool:
+    """Compare both emitters on the data. Returns False if the fast one does not support it."""
+    try:
+        fast = emit_yaml(data)
+    except UnsupportedByFastEmitter:
+        return False
+    expected = dump_yaml(data)
+    if fast != expected:
+        mismatches.append((data, expected, fast))
+    return True
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--source", type=Path, default=None)
+    arg_parser.add_argument("--metrics", type=int, default=2000)
+    arg_parser.add_argument("--trees", type=int, default=5000)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    options = arg_parser.parse_args()
+
+    mismatches: list[tuple[Any, str, str]] = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = options.source
+        if source is None:
+            source = Path(temp_dir) / "source"
+            generate_source(source, options.metrics)
+            for name, text in SCALAR_FILES.items():
+                (source / name).write_text(text)
+        corpus = assemble_recursively(source, remove_comments=True, lazy_scalars=True)
+        supported = compare(corpus, mismatches)
+        print(f"corpus     {'compared' if supported else 'not supported'}  {source}")
+
+    rng = random.Random(options.seed)
+    compared = 0
+    for _ in range(options.trees):
+        compared += compare(random_tree(rng), mismatches)
+    print(f"random     {compared} of {options.trees} trees compared, seed {options.seed}")
+
+    for data, expected, fast in mismatches[:5]:
+        print(f"\nMismatch for {data!r}\n  ruamel: {expected!r}\n  fast:   {fast!r}")
+    print(f"\n{len(mismatches)} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
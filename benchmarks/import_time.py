@@ -0,0 +1,95 @@
+"""
+Measure how long yamlex takes to start and which modules it imports.
+
+Each scenario runs yamlex in a fresh interpreter with -X importtime. The
+script fails if a scenario imports a module it must not import, or if its
+imports take longer than --max-ms.
+
+Usage:
+    python benchmarks/import_time.py [--repeat 5] [--max-ms 300]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+SRC_DIR_PATH = Path(__file__).resolve().parent.parent / "src"
+
+RUNNER = (
+    "import sys; "
+    "sys.argv = ['yamlex'] + sys.argv[1:]; "
+    "from yamlex.cli.app import run; "
+    "run()"
+)
+
+# Arguments of each scenario and the modules it must not import
+SCENARIOS: dict[str, tuple[list[str], list[str]]] = {
+    "version": (["--version"], ["yamlex.api", "deepdiff", "ruamel.yaml"]),
+    "join": (["join", "--help"], ["deepdiff", "fastjsonschema"]),
+    "split": (["split", "--help"], ["deepdiff", "fastjsonschema"]),
+    "map": (["map", "--help"], ["deepdiff", "fastjsonschema"]),
+    "validate": (["validate", "--help"], ["deepdiff"]),
+    "diff": (["diff", "--help"], ["fastjsonschema"]),
+    "server": (["server", "--help"], ["deepdiff", "fastjsonschema"]),
+}
+
+
+def measure(args: list[str]) -> tuple[float, set[str]]:
+    """Return the total import time in milliseconds and imported modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", RUNNER, *args],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": str(SRC_DIR_PATH)},
+    )
+
+    total_us = 0
+    modules: set[str] = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        # Top level imports are not indented, their times add up
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--max-ms", type=float, default=None)
+    options = arg_parser.parse_args()
+
+    failed = False
+    for name, (args, forbidden) in SCENARIOS.items():
+        timings: list[float] = []
+        imported: set[str] = set()
+        for _ in range(options.repeat):
+            ms, modules = measure(args)
+            timings.append(ms)
+            imported |= modules
+
+        median = statistics.median(timings)
+        unexpected = sorted(
+            m for m in imported
+            if any(m == f or m.startswith(f"{f}.") for f in forbidden)
+        )
+        print(f"{name:<10} {median:8.1f} ms")
+
+        if unexpected:
+            failed = True
+            print(f"  Unexpected imports: {', '.join(unexpected)}")
+        if options.max_ms is not None and median > options.max_ms:
+            failed = True
+            print(f"  Slower than {options.max_ms} ms")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
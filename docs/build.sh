@@ -22,6 +22,13 @@ yamlex join --help > "${SCRIPT_DIR}/yamlex_join_help.txt"
 yamlex diff --help > "${SCRIPT_DIR}/yamlex_diff_help.txt"
 yamlex map --help > "${SCRIPT_DIR}/yamlex_map_help.txt"
 yamlex split --help > "${SCRIPT_DIR}/yamlex_split_help.txt"
+yamlex validate --help > "${SCRIPT_DIR}/yamlex_validate_help.txt"
+yamlex get --help > "${SCRIPT_DIR}/yamlex_get_help.txt"
+yamlex where --help > "${SCRIPT_DIR}/yamlex_where_help.txt"
+yamlex lint --help > "${SCRIPT_DIR}/yamlex_lint_help.txt"
+yamlex build --help > "${SCRIPT_DIR}/yamlex_build_help.txt"
+yamlex server --help > "${SCRIPT_DIR}/yamlex_server_help.txt"
+yamlex lsp --help > "${SCRIPT_DIR}/yamlex_lsp_help.txt"
 
 # Render full documentation
 tera \
@@ -35,4 +42,11 @@ rm "${SCRIPT_DIR}/yamlex_help.txt"
 rm "${SCRIPT_DIR}/yamlex_join_help.txt"
 rm "${SCRIPT_DIR}/yamlex_diff_help.txt"
 rm "${SCRIPT_DIR}/yamlex_map_help.txt"
-rm "${SCRIPT_DIR}/yamlex_split_help.txt"
\ No newline at end of file
+rm "${SCRIPT_DIR}/yamlex_split_help.txt"
+rm "${SCRIPT_DIR}/yamlex_validate_help.txt"
+rm "${SCRIPT_DIR}/yamlex_get_help.txt"
+rm "${SCRIPT_DIR}/yamlex_where_help.txt"
+rm "${SCRIPT_DIR}/yamlex_lint_help.txt"
+rm "${SCRIPT_DIR}/yamlex_build_help.txt"
+rm "${SCRIPT_DIR}/yamlex_server_help.txt"
+rm "${SCRIPT_DIR}/yamlex_lsp_help.txt"
\ No newline at end of file
@@ -1,2 +1,42 @@
+"""
+Assemble a Dynatrace extension.yaml from parts and split it back.
+
+The functions below do the same as the commands of the yamlex CLI, but run
+in the current Python process and return their results:
+
+    import yamlex
+
+    result = yamlex.join(Path("src/source"), Path("src/extension/extension.yaml"))
+    difference = yamlex.diff(Path("src/source"), Path("src/extension/extension.yaml"))
+
+Use run_batch to process many extensions at once, sharing parsed files
+between the operations. See yamlex.api.operations for all options.
+"""
+import importlib
+from typing import Any
+
+
+# The API is imported on first use, so that the CLI starts fast
+_API = {
+    "join": "yamlex.api.operations",
+    "split": "yamlex.api.operations",
+    "diff": "yamlex.api.operations",
+    "run_batch": "yamlex.api.operations",
+    "JoinResult": "yamlex.api.operations",
+    "SplitResult": "yamlex.api.operations",
+    "DiffResult": "yamlex.api.operations",
+    "BatchResult": "yamlex.api.operations",
+    "YamlexError": "yamlex.api.exceptions",
+}
+
+__all__ = list(_API)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _API:
+        raise AttributeError(f"module 'yamlex' has no attribute '{name}'")
+    return getattr(importlib.import_module(_API[name]), name)
+
+
 def hello() -> str:
     return "Hello from yamlex!"
@@ -0,0 +1,304 @@
+"""
+Package the extension directory into a deterministic zip archive.
+
+Entries are sorted by name and get fixed timestamps and permissions, so
+that the same files always produce the same archive. Files are compressed
+on a pool of processes. Compressed entries of the previous archive are
+copied as they are when the content of their file did not change.
+"""
+import hashlib
+import json
+import logging
+import os
+import struct
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from yamlex.api.util import hash_file, indent
+
+
+logger = logging.getLogger(__name__)
+
+BUILD_DIR_NAME = "build"
+MANIFEST_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+# Entries are stored with the earliest date a zip file can express
+DOS_TIME = 0
+DOS_DATE = (1 << 5) | 1
+# Regular file with rw-r--r-- permissions, made on Unix
+EXTERNAL_ATTR = 0o100644 << 16
+VERSION_MADE_BY = (3 << 8) | 20
+VERSION_NEEDED = 20
+UTF8_FLAG = 0x800
+MAX_SIZE = 0xFFFFFFFF
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+
+
+@dataclass
+class ArchiveEntry:
+    name: str
+    sha256: str
+    crc: int
+    size: int
+    method: int
+    # Compressed content, as stored in the archive
+    data: bytes
+
+
+def get_manifest_path(cache_dir_path: Path, archive_path: Path) -> Path:
+    """Manifests of archives are kept in the cache directory."""
+    key = hashlib.sha256(str(archive_path.resolve()).encode()).hexdigest()[:16]
+    return cache_dir_path / BUILD_DIR_NAME / f"{key}.json"
+
+
+def build_archive(
+    extension_dir_path: Path,
+    archive_path: Path,
+    cache_dir_path: Path,
+    includes: Optional[list[Path]] = None,
+    workers: Optional[int] = None,
+    reuse: bool = True,
+) -> dict[str, int]:
+    """
+    Write all files of the extension directory into the archive.
+
+    Files and directories in includes are added to the root of the archive
+    under their own names.
+
+    Returns:
+        dict: Number of entries, and how many of them were compressed anew
+            or reused from the previous archive.
+    """
+    files = collect_files(extension_dir_path, includes or [])
+    # The archive must not contain itself, when written next to the files
+    files = {
+        name: path for name, path in files.items()
+        if path.resolve() != archive_path.resolve()
+    }
+    manifest_path = get_manifest_path(cache_dir_path, archive_path)
+    previous = read_manifest(manifest_path, archive_path) if reuse else {}
+
+    # Hash every file to find out which entries can be reused
+    hashes = {name: hash_file(path) for name, path in files.items()}
+    reusable = {
+        name for name, sha256 in hashes.items()
+        if previous.get(name, {}).get("sha256") == sha256
+    }
+    to_compress = [name for name in files if name not in reusable]
+    logger.info((
+        f"Packaging {len(files)} files, {len(to_compress)} to compress, "
+        f"{len(reusable)} unchanged."
+    ))
+
+    compressed: dict[str, ArchiveEntry] = {}
+    paths = [files[name] for name in to_compress]
+    if workers == 1 or len(paths) < 2:
+        results = [compress_file(path) for path in paths]
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(compress_file, paths))
+    for name, entry in zip(to_compress, results):
+        entry.name = name
+        compressed[name] = entry
+
+    entries: list[ArchiveEntry] = []
+    temp_path = archive_path.with_name(f"{archive_path.name}.tmp")
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(temp_path, "wb") as archive:
+        previous_archive = open(archive_path, "rb") if reusable else None
+        try:
+            for name in files:
+                if name in reusable:
+                    entry = read_previous_entry(previous_archive, name, previous[name])
+                    logger.debug(f"{indent(1)}Unchanged: {name}")
+                else:
+                    entry = compressed[name]
+                    logger.debug(f"{indent(1)}Compressed: {name}")
+                entries.append(write_entry(archive, entry))
+            write_central_directory(archive, entries)
+        finally:
+            if previous_archive:
+                previous_archive.close()
+    os.replace(temp_path, archive_path)
+
+    write_manifest(manifest_path, archive_path, entries)
+    return {
+        "entries": len(files),
+        "compressed": len(to_compress),
+        "reused": len(reusable),
+    }
+
+
+def collect_files(extension_dir_path: Path, includes: list[Path]) -> dict[str, Path]:
+    """Map archive names to files, sorted by name."""
+    files: dict[str, Path] = {}
+
+    def add_dir(dir_path: Path, prefix: str) -> None:
+        for path in dir_path.rglob("*"):
+            if path.is_file():
+                name = prefix + path.relative_to(dir_path).as_posix()
+                files[name] = path
+
+    add_dir(extension_dir_path, "")
+    for include in includes:
+        if include.is_dir():
+            add_dir(include, f"{include.name}/")
+        else:
+            files[include.name] = include
+
+    return {name: files[name] for name in sorted(files)}
+
+
+def compress_file(path: Path) -> ArchiveEntry:
+    """Compress a file with raw deflate, as stored in zip archives."""
+    with open(path, "rb") as f:
+        content = f.read()
+    if len(content) > MAX_SIZE:
+        raise ValueError(f"{path} is too large for a zip archive.")
+
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = compressor.compress(content) + compressor.flush()
+    method = zipfile.ZIP_DEFLATED
+    # Store files that do not get smaller, such as nested archives
+    if len(data) >= len(content):
+        data = content
+        method = zipfile.ZIP_STORED
+
+    return ArchiveEntry(
+        name="",
+        sha256=hashlib.sha256(content).hexdigest(),
+        crc=zlib.crc32(content),
+        size=len(content),
+        method=method,
+        data=data,
+    )
+
+
+def read_previous_entry(archive: BinaryIO, name: str, info: dict) -> ArchiveEntry:
+    """Read the compressed content of an entry of the previous archive."""
+    archive.seek(info["offset"])
+    header = LOCAL_HEADER.unpack(archive.read(LOCAL_HEADER.size))
+    name_length, extra_length = header[9], header[10]
+    archive.seek(name_length + extra_length, os.SEEK_CUR)
+    return ArchiveEntry(
+        name=name,
+        sha256=info["sha256"],
+        crc=info["crc"],
+        size=info["size"],
+        method=info["method"],
+        data=archive.read(info["compress_size"]),
+    )
+
+
+def write_entry(archive: BinaryIO, entry: ArchiveEntry) -> dict:
+    """Write the local header and content. Returns the central directory info."""
+    name = entry.name.encode("utf-8")
+    flags = 0 if entry.name.isascii() else UTF8_FLAG
+    offset = archive.tell()
+    if offset > MAX_SIZE:
+        raise ValueError("The archive is too large for a zip archive.")
+
+    archive.write(LOCAL_HEADER.pack(
+        0x04034B50,
+        VERSION_NEEDED,
+        flags,
+        entry.method,
+        DOS_TIME,
+        DOS_DATE,
+        entry.crc,
+        len(entry.data),
+        entry.size,
+        len(name),
+        0,
+    ))
+    archive.write(name)
+    archive.write(entry.data)
+
+    return {
+        "name": entry.name,
+        "sha256": entry.sha256,
+        "crc": entry.crc,
+        "size": entry.size,
+        "compress_size": len(entry.data),
+        "method": entry.method,
+        "offset": offset,
+    }
+
+
+def write_central_directory(archive: BinaryIO, entries: list[dict]) -> None:
+    start = archive.tell()
+    for entry in entries:
+        name = entry["name"].encode("utf-8")
+        flags = 0 if entry["name"].isascii() else UTF8_FLAG
+        archive.write(CENTRAL_HEADER.pack(
+            0x02014B50,
+            VERSION_MADE_BY,
+            VERSION_NEEDED,
+            flags,
+            entry["method"],
+            DOS_TIME,
+            DOS_DATE,
+            entry["crc"],
+            entry["compress_size"],
+            entry["size"],
+            len(name),
+            0,
+            0,
+            0,
+            0,
+            EXTERNAL_ATTR,
+            entry["offset"],
+        ))
+        archive.write(name)
+    end = archive.tell()
+
+    archive.write(END_OF_CENTRAL_DIR.pack(
+        0x06054B50,
+        0,
+        0,
+        len(entries),
+        len(entries),
+        end - start,
+        start,
+        0,
+    ))
+
+
+def read_manifest(manifest_path: Path, archive_path: Path) -> dict[str, dict]:
+    """Return the entries of the previous archive, if it is still the same."""
+    if not manifest_path.exists() or not archive_path.exists():
+        return {}
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+    stat = archive_path.stat()
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    if manifest.get("archive") != [stat.st_size, stat.st_mtime_ns]:
+        logger.debug(f"{archive_path} changed since it was built, not reusing it.")
+        return {}
+    return {entry["name"]: entry for entry in manifest["entries"]}
+
+
+def write_manifest(manifest_path: Path, archive_path: Path, entries: list[dict]) -> None:
+    stat = archive_path.stat()
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(manifest_path, "w") as f:
+        json.dump({
+            "version": MANIFEST_VERSION,
+            "archive": [stat.st_size, stat.st_mtime_ns],
+            "entries": entries,
+        }, f)
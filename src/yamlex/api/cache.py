@@ -0,0 +1,110 @@
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Hashable, Optional
+
+from yamlex.api.memory import phase
+from yamlex.api.tree import freeze, to_builtins
+from yamlex.api.util import scan_source_dir, indent
+
+
+logger = logging.getLogger(__name__)
+
+# Cache shared by all calls within the current process. Only long-running
+# processes, such as the server, enable it. Everyone else reads files anew.
+_cache: Optional[dict] = None
+
+
+def enable_cache() -> dict:
+    """Enable the process-wide cache of parsed files and assembled trees."""
+    global _cache
+    if _cache is None:
+        _cache = {}
+    return _cache
+
+
+def get_cache() -> Optional[dict]:
+    """Return the process-wide cache, or None if it is not enabled."""
+    return _cache
+
+
+def load_cached_file(
+    cache: Optional[dict],
+    path: Path,
+    variant: Hashable,
+    load: Callable[[], Any],
+    compact: bool = False,
+    frozen: bool = False,
+) -> Any:
+    """
+    Return what load() returns for the file, reusing the cached result.
+
+    The cached result is reused as long as modification time and size of
+    the file stay the same. Different ways of loading the same file are
+    told apart by the variant. Cached data is shared between callers, so
+    it must not be modified.
+
+    Data without comments can be kept compact. It is then stored as a
+    frozen tree. Callers that read frozen trees, such as diff, set frozen
+    and share the stored tree. Everyone else gets a copy made of dicts and
+    lists.
+    """
+    if cache is None:
+        return load()
+
+    stat = path.stat()
+    signature = (stat.st_mtime_ns, stat.st_size)
+    key = ("file", os.path.abspath(path), variant)
+
+    entry = cache.get(key)
+    if entry is not None and entry[0] == signature:
+        if compact and not frozen:
+            return to_builtins(entry[1])
+        return entry[1]
+
+    data = load()
+    if compact:
+        compacted = freeze(data)
+        cache[key] = (signature, compacted)
+        return compacted if frozen else data
+    cache[key] = (signature, data)
+    return data
+
+
+def load_cached_tree(
+    cache: Optional[dict],
+    dir_path: Path,
+    variant: Hashable,
+    load: Callable[[], Any],
+    compact: bool = False,
+    frozen: bool = False,
+) -> Any:
+    """
+    Return what load() returns for the directory, reusing the cached result.
+
+    The cached result is reused as long as no file or directory within the
+    directory was added, removed or modified. Only the top level container
+    of the result is copied, everything nested within it is shared. Compact
+    results are copied entirely, unless frozen is set, see load_cached_file.
+    """
+    if cache is None or not dir_path.is_dir():
+        return load()
+
+    with phase("scan"):
+        signature = scan_source_dir(dir_path)
+    key = ("tree", os.path.abspath(dir_path), variant)
+
+    entry = cache.get(key)
+    if entry is not None and entry[0] == signature:
+        logger.debug(f"{indent(1)}Unchanged, reuse assembled: {dir_path}")
+        if compact:
+            return entry[1] if frozen else to_builtins(entry[1])
+        return entry[1].copy()
+
+    data = load()
+    if compact:
+        compacted = freeze(data)
+        cache[key] = (signature, compacted)
+        return compacted if frozen else data
+    cache[key] = (signature, data)
+    return data.copy()
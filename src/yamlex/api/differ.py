@@ -1,11 +1,23 @@
 import logging
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Iterator, Optional
 
-import ruamel.yaml
 from deepdiff import DeepDiff
 
-from yamlex.api.joiner import assemble_recursively
-from yamlex.api.util import remove_yaml_comments
+from yamlex.api.cache import load_cached_file
+from yamlex.api.joiner import assemble
+from yamlex.api.scalars import resolve_scalar_files
+from yamlex.api.selector import MISSING, Selector, format_path, select
+from yamlex.api.snapshot import complete_snapshot, get_snapshot_path, read_snapshot
+from yamlex.api.tree import FrozenMap, freeze, to_builtins
+from yamlex.api.util import (
+    create_yaml_parser,
+    get_cache_dir_path,
+    remove_yaml_comments,
+)
 from yamlex.api.exceptions import (
     FailedToParseYamlError,
     InvalidPath,
@@ -13,21 +25,36 @@ from yamlex.api.exceptions import (
 
 
 logger = logging.getLogger(__name__)
-parser = ruamel.yaml.YAML()
+parser = create_yaml_parser()
 
 
 def diff(
     source: Path,
     target: Path,
+    cache: Optional[dict] = None,
+    only: Optional[list[Selector]] = None,
 ) -> dict:
     """
     Compare two YAML files recursively and return the differences.
 
+    If cache is given, files and directories that did not change since they
+    were cached are not parsed again. Scalar files of source directories are
+    compared by hash where possible.
+
+    If only is given, only the selected parts of both are compared.
+
     Returns:
         dict: A dictionary containing the differences between the two files.
     """
-    source_data = parse_path(source)
-    target_data = parse_path(target)
+    source_data = parse_path(source, cache=cache, only=only)
+    target_data = parse_path(target, cache=cache, only=only)
+    # DeepDiff hashes frozen trees and dicts differently, so when only one
+    # of them comes from the cache, the other is frozen as well
+    if isinstance(source_data, (FrozenMap, tuple)) != isinstance(target_data, (FrozenMap, tuple)):
+        source_data, target_data = freeze(source_data), freeze(target_data)
+
+    # Scalar files that are equal by hash are not read at all
+    source_data, target_data = resolve_scalar_files(source_data, target_data)
 
     differences = DeepDiff(
         source_data,
@@ -37,30 +64,188 @@ def diff(
         verbose_level=2,
     )
 
+    # Reported values are converted, so that they are printed as YAML data
+    for report_type, report in differences.items():
+        if isinstance(report, dict):
+            differences[report_type] = thaw_report(report)
     return differences
 
 
-def parse_path(path: Path) -> dict:
-    if path.is_file(): 
-        try:
-            with open(path, "r") as file:
-                raw_data: dict = parser.load(file)
-        except Exception as e:
-            raise FailedToParseYamlError(
-                f"Failed to parse YAML in {path}: {e}"
-            )
-        data = remove_yaml_comments(
+def thaw_report(value: Any) -> Any:
+    if isinstance(value, (FrozenMap, tuple)):
+        return to_builtins(value)
+    # Types of type changes
+    if value is FrozenMap:
+        return dict
+    if value is tuple:
+        return list
+    if isinstance(value, dict):
+        return {k: thaw_report(v) for k, v in value.items()}
+    return value
+
+
+@dataclass
+class Change:
+    # added, removed or changed
+    kind: str
+    path: list
+    old: Any = None
+    new: Any = None
+
+    def __post_init__(self) -> None:
+        # Values of cached data are frozen trees, see parse_path
+        self.old = to_builtins(self.old)
+        self.new = to_builtins(self.new)
+
+    def as_dict(self) -> dict:
+        change = {"change": self.kind, "path": format_path(self.path)}
+        if self.kind != "added":
+            change["old"] = self.old
+        if self.kind != "removed":
+            change["new"] = self.new
+        return change
+
+
+def iter_changes(
+    source: Path,
+    target: Path,
+    cache: Optional[dict] = None,
+    only: Optional[list[Selector]] = None,
+) -> Iterator[Change]:
+    """
+    Compare two YAML files recursively and yield the changes as they are found.
+
+    Like diff, the order of array items does not matter. Items that are
+    equal somewhere within both arrays are not changed. The remaining
+    items are compared in the order they are in, the path of a changed
+    item is its path within the target. Whatever remains after that is
+    removed from the source or added to the target.
+    """
+    source_data = parse_path(source, cache=cache, only=only)
+    target_data = parse_path(target, cache=cache, only=only)
+    source_data, target_data = resolve_scalar_files(source_data, target_data)
+    return compare(source_data, target_data, [])
+
+
+def compare(old: Any, new: Any, path: list) -> Iterator[Change]:
+    if isinstance(old, Mapping) and isinstance(new, Mapping):
+        for key, value in old.items():
+            if key in new:
+                yield from compare(value, new[key], path + [key])
+            else:
+                yield Change("removed", path + [key], old=value)
+        for key, value in new.items():
+            if key not in old:
+                yield Change("added", path + [key], new=value)
+    elif isinstance(old, (list, tuple)) and isinstance(new, (list, tuple)):
+        yield from compare_items(old, new, path)
+    # Booleans are equal to numbers, but not the same value in YAML
+    elif old != new or isinstance(old, bool) != isinstance(new, bool):
+        yield Change("changed", path, old=old, new=new)
+
+
+def compare_items(old: Sequence, new: Sequence, path: list) -> Iterator[Change]:
+    unmatched_new: dict[Any, list[int]] = {}
+    for j, item in reversed(list(enumerate(new))):
+        unmatched_new.setdefault(item_key(item), []).append(j)
+
+    unmatched_old = []
+    for i, item in enumerate(old):
+        indexes = unmatched_new.get(item_key(item))
+        if indexes:
+            indexes.pop()
+        else:
+            unmatched_old.append(i)
+    remaining_new = sorted(j for indexes in unmatched_new.values() for j in indexes)
+
+    for i, j in zip(unmatched_old, remaining_new):
+        yield from compare(old[i], new[j], path + [j])
+    for i in unmatched_old[len(remaining_new):]:
+        yield Change("removed", path + [i], old=old[i])
+    for j in remaining_new[len(unmatched_old):]:
+        yield Change("added", path + [j], new=new[j])
+
+
+def item_key(data: Any) -> Any:
+    """Hashable value that is equal for equal data, regardless of the order of array items."""
+    if isinstance(data, Mapping):
+        return ("map", frozenset((k, item_key(v)) for k, v in data.items()))
+    if isinstance(data, (list, tuple)):
+        return ("seq", frozenset(Counter(item_key(v) for v in data).items()))
+    if isinstance(data, bool):
+        return ("bool", data)
+    try:
+        hash(data)
+    except TypeError:
+        return ("repr", repr(data))
+    return data
+
+
+def parse_path(
+    path: Path,
+    cache: Optional[dict] = None,
+    only: Optional[list[Selector]] = None,
+) -> Any:
+    """
+    Parse the file or assemble the directory, without comments.
+
+    Cached data and snapshots are returned as the frozen trees they are
+    kept as, instead of being copied, see yamlex.api.tree.
+    """
+    if path.is_file():
+        data = load_cached_file(
+            cache,
             path,
-            raw_data,
-            recursive=True,
+            "diff",
+            lambda: read_file(path),
+            compact=True,
+            frozen=True,
         )
+        if only is not None:
+            data = select(data, only)
+            data = {} if data is MISSING else data
     elif path.is_dir():
-        data = assemble_recursively(
+        data = assemble(
             path,
             remove_comments=True,
+            cache=cache,
+            only=only,
+            frozen=True,
+            # Scalar files are compared by their hash, see resolve_scalar_files
+            lazy_scalars=True,
         )
     else:
         raise InvalidPath(
             f"{path} must be a directory or a file."
         )
     return data
+
+
+def parse_file(path: Path) -> dict:
+    try:
+        with open(path, "r") as file:
+            raw_data: dict = parser.load(file)
+    except Exception as e:
+        raise FailedToParseYamlError(
+            f"Failed to parse YAML in {path}: {e}"
+        )
+    return remove_yaml_comments(
+        path,
+        raw_data,
+        recursive=True,
+    )
+
+
+def read_file(path: Path) -> Any:
+    """
+    Return the data join wrote into the file, if it did not change since.
+
+    Otherwise the file is parsed, and if join left its snapshot to diff,
+    the parsed data completes it.
+    """
+    snapshot_path = get_snapshot_path(get_cache_dir_path(Path(".")), path)
+    data = read_snapshot(snapshot_path, path, frozen=True)
+    if data is None:
+        data = parse_file(path)
+        complete_snapshot(snapshot_path, path, data)
+    return data
@@ -0,0 +1,306 @@
+"""
+Fast writer for the subset of YAML that yamlex writes.
+
+Assembled extensions without comments consist of block mappings, block
+sequences and scalars only. This module writes them directly as text,
+with the same indentation, quoting and block scalar styles that ruamel
+would choose, so that the output is the same byte for byte.
+
+Everything else, such as comments, anchors, tags, flow style or unusual
+scalar types, raises UnsupportedByFastEmitter, and the data is dumped
+with ruamel instead. The style of every string is decided only once and
+kept for strings that repeat, such as keys and common values.
+"""
+import sys
+from functools import lru_cache
+from io import StringIO
+from typing import Any
+
+import ruamel.yaml
+from ruamel.yaml.anchor import Anchor
+from ruamel.yaml.comments import CommentedMap, CommentedSeq, Comment, Format, merge_attrib
+from ruamel.yaml.emitter import Emitter
+from ruamel.yaml.nodes import ScalarNode
+from ruamel.yaml.scalarstring import FoldedScalarString, LiteralScalarString
+from ruamel.yaml.tag import Tag
+
+from yamlex.api.scalars import ScalarFile
+
+
+STR_TAG = "tag:yaml.org,2002:str"
+# Longer keys are written as explicit keys by ruamel
+MAX_SIMPLE_KEY_LENGTH = 100
+LINE_BREAKS = "\n\x85\u2028\u2029"
+# Within block scalars, ruamel does not indent the line after these
+UNICODE_LINE_BREAKS = LINE_BREAKS[1:]
+
+ESCAPE_REPLACEMENTS = Emitter.ESCAPE_REPLACEMENTS
+
+# Scalars are analyzed and resolved the same way ruamel does when dumping
+_yaml = ruamel.yaml.YAML()
+_yaml.indent(mapping=2, sequence=4, offset=2)
+_yaml.width = sys.maxsize
+_analyzer = _yaml.emitter
+
+# Number of distinct strings and block scalars whose written text is kept.
+# The caches are bounded, since a server process writes many extensions.
+STRING_CACHE_SIZE = 65536
+BLOCK_CACHE_SIZE = 1024
+
+MAPPING_TYPES = (dict, CommentedMap)
+SEQUENCE_TYPES = (list, CommentedSeq)
+
+
+class UnsupportedByFastEmitter(Exception):
+    """The data contains something only ruamel can write."""
+
+
+def emit_yaml(data: Any) -> str:
+    """Write the data as YAML, the same as dump_yaml without a line length."""
+    lines: list[str] = []
+    if type(data) in MAPPING_TYPES:
+        check_collection(data)
+        if not data:
+            return "{}\n"
+        emit_mapping(data, 0, lines, "")
+    elif type(data) in SEQUENCE_TYPES:
+        check_collection(data)
+        if not data:
+            return "[]\n"
+        emit_sequence(data, 2, lines, None)
+    else:
+        raise UnsupportedByFastEmitter(f"Top level {type(data)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def check_collection(data: Any) -> None:
+    """Reject collections with comments, anchors, tags, flow style or merge keys."""
+    if type(data) in (dict, list):
+        return
+    comment = getattr(data, Comment.attrib, None)
+    if comment is not None and (
+        comment.comment or comment.items or comment.end or getattr(comment, "_pre", None)
+    ):
+        raise UnsupportedByFastEmitter("Comments")
+    anchor = getattr(data, Anchor.attrib, None)
+    if anchor is not None and anchor.value is not None:
+        raise UnsupportedByFastEmitter("Anchor")
+    tag = getattr(data, Tag.attrib, None)
+    if tag is not None and tag.value is not None:
+        raise UnsupportedByFastEmitter("Tag")
+    fmt = getattr(data, Format.attrib, None)
+    if fmt is not None and fmt.flow_style():
+        raise UnsupportedByFastEmitter("Flow style")
+    if getattr(data, merge_attrib, None):
+        raise UnsupportedByFastEmitter("Merge keys")
+
+
+def emit_mapping(data: Any, column: int, lines: list[str], first_prefix: Any) -> None:
+    """
+    Write the entries of a mapping with their keys at the column.
+
+    The first key continues the last line if first_prefix is given, as
+    within a sequence item.
+    """
+    indent = " " * column
+    for key, value in data.items():
+        if first_prefix is not None:
+            prefix = first_prefix
+            first_prefix = None
+        else:
+            prefix = indent
+        emit_value(value, f"{prefix}{key_text(key)}:", column, lines, is_item=False)
+
+
+def emit_sequence(data: Any, column: int, lines: list[str], first_prefix: Any) -> None:
+    """Write the items of a sequence with their dashes at the column."""
+    indent = " " * column
+    for item in data:
+        if first_prefix is not None:
+            prefix = first_prefix
+            first_prefix = None
+        else:
+            prefix = indent
+        emit_value(item, f"{prefix}-", column, lines, is_item=True)
+
+
+def emit_value(value: Any, head: str, column: int, lines: list[str], is_item: bool) -> None:
+    """
+    Write the value after the head, which is a key or a dash at the column.
+
+    Mappings and sequences within sequence items start on the line of
+    the dash, those within mappings on the next line.
+    """
+    value_type = type(value)
+    if value_type in MAPPING_TYPES:
+        check_collection(value)
+        if not value:
+            lines.append(f"{head} {{}}")
+        elif is_item:
+            emit_mapping(value, column + 2, lines, f"{head} ")
+        else:
+            lines.append(head)
+            emit_mapping(value, column + 2, lines, None)
+        return
+    if value_type in SEQUENCE_TYPES:
+        check_collection(value)
+        if not value:
+            lines.append(f"{head} []")
+        elif is_item:
+            emit_sequence(value, column + 4, lines, f"{head}   ")
+        else:
+            lines.append(head)
+            emit_sequence(value, column + 2, lines, None)
+        return
+
+    if value is None:
+        # Sequence items keep the space after the dash
+        lines.append(f"{head} " if is_item else head)
+        return
+
+    if value_type is ScalarFile:
+        value = value.to_scalar()
+        value_type = type(value)
+    if value_type is FoldedScalarString or value_type is LiteralScalarString:
+        header, body = block_text(value)
+        lines.append(f"{head} {header}")
+        # Block scalar lines are written for the top level, at column 2
+        indent = " " * column
+        lines.extend(f"{indent}{line}" if line else line for line in body)
+        return
+
+    lines.append(f"{head} {scalar_text(value, is_key=False)}")
+
+
+def key_text(key: Any) -> str:
+    text = scalar_text(key, is_key=True)
+    if len(text) > MAX_SIMPLE_KEY_LENGTH:
+        raise UnsupportedByFastEmitter("Long key")
+    return text
+
+
+def scalar_text(value: Any, is_key: bool) -> str:
+    value_type = type(value)
+    if value_type is str:
+        return string_text(value, is_key)
+    if value_type is bool:
+        return "true" if value else "false"
+    if value_type is int:
+        return str(value)
+    if is_key:
+        raise UnsupportedByFastEmitter(f"Key of {value_type}")
+    return other_scalar_text(value)
+
+
+@lru_cache(maxsize=STRING_CACHE_SIZE)
+def string_text(value: str, is_key: bool) -> str:
+    """Write a string with the style ruamel chooses for it, see Emitter.choose_scalar_style."""
+    if not value:
+        if is_key:
+            raise UnsupportedByFastEmitter("Empty key")
+        return "''"
+
+    analysis = _analyzer.analyze_scalar(value)
+    implicit = _yaml.resolver.resolve(ScalarNode, value, (True, False)) == STR_TAG
+    if (
+        implicit
+        and not (is_key and analysis.multiline)
+        and analysis.allow_block_plain
+    ):
+        return value
+    if is_key and analysis.multiline:
+        raise UnsupportedByFastEmitter("Multiline key")
+    if analysis.allow_double_quoted and ("'" in value or "\n" in value):
+        return double_quoted(value)
+    if analysis.allow_single_quoted:
+        if any(c in LINE_BREAKS for c in value):
+            raise UnsupportedByFastEmitter("Line break within a single quoted string")
+        return "'" + value.replace("'", "''") + "'"
+    return double_quoted(value)
+
+
+def double_quoted(value: str) -> str:
+    """Write a double quoted string, see Emitter.write_double_quoted."""
+    parts = ['"']
+    start = 0
+    for end, ch in enumerate(value):
+        if (
+            ch in '"\\\x85\u2028\u2029\uFEFF'
+            or not (
+                "\x20" <= ch <= "\x7E"
+                or "\xA0" <= ch <= "\uD7FF"
+                or "\uE000" <= ch <= "\uFFFD"
+                or "\U00010000" <= ch <= "\U0010FFFF"
+            )
+        ):
+            parts.append(value[start:end])
+            if ch in ESCAPE_REPLACEMENTS:
+                parts.append("\\" + ESCAPE_REPLACEMENTS[ch])
+            elif ch <= "\xFF":
+                parts.append("\\x%02X" % ord(ch))
+            elif ch <= "\uFFFF":
+                parts.append("\\u%04X" % ord(ch))
+            else:
+                parts.append("\\U%08X" % ord(ch))
+            start = end + 1
+    parts.append(value[start:])
+    parts.append('"')
+    return "".join(parts)
+
+
+def other_scalar_text(value: Any) -> str:
+    """Write scalars of other types, such as floats, as ruamel represents them."""
+    if isinstance(value, str) or getattr(value, "anchor", None) is not None and value.anchor.value:
+        raise UnsupportedByFastEmitter(f"Scalar of {type(value)}")
+    try:
+        node = _yaml.representer.represent_data(value)
+    except Exception:
+        raise UnsupportedByFastEmitter(f"Scalar of {type(value)}")
+    if (
+        not isinstance(node, ScalarNode)
+        or node.style
+        or node.anchor
+        or _yaml.resolver.resolve(ScalarNode, node.value, (True, False)) != node.tag
+    ):
+        raise UnsupportedByFastEmitter(f"Scalar of {type(value)}")
+    analysis = _analyzer.analyze_scalar(node.value)
+    if not analysis.allow_block_plain or analysis.multiline:
+        raise UnsupportedByFastEmitter(f"Scalar of {type(value)}")
+    return node.value
+
+
+def block_text(value: Any) -> tuple[str, tuple[str, ...]]:
+    """
+    Header and lines of a block scalar, as ruamel writes it at the top level.
+
+    The lines are indented by 2 and blank lines are empty. At any other
+    column, only the indentation of the lines changes.
+    """
+    # Dumping with ruamel leaves an empty anchor on the scalar
+    anchor = value.yaml_anchor(any=True)
+    if getattr(value, "comment", None) or anchor is not None and anchor.value is not None:
+        raise UnsupportedByFastEmitter("Block scalar with comments or anchor")
+    return block_lines(type(value), str(value), tuple(getattr(value, "fold_pos", ())))
+
+
+@lru_cache(maxsize=BLOCK_CACHE_SIZE)
+def block_lines(value_type: type, text: str, fold_pos: tuple) -> tuple[str, tuple[str, ...]]:
+    """Header and lines of a block scalar of the type with the text and folds, see block_text."""
+    if any(c in UNICODE_LINE_BREAKS for c in text):
+        raise UnsupportedByFastEmitter("Block scalar with unicode line breaks")
+    value = value_type(text)
+    if fold_pos:
+        value.fold_pos = list(fold_pos)
+    stream = StringIO()
+    _yaml.dump({"k": value}, stream)
+    first, *body = stream.getvalue().split("\n")
+    # The text ends with a line break, which leaves an empty last line
+    body.pop()
+    if not first.startswith("k: ") or first[3:4] not in ("|", ">"):
+        raise UnsupportedByFastEmitter("Block scalar not written as a block")
+    if "+" in first:
+        # Kept trailing line breaks are followed by a document end marker
+        # anywhere but at the end of the document
+        raise UnsupportedByFastEmitter("Block scalar with kept line breaks")
+    return first[3:], tuple(body)
@@ -66,3 +66,27 @@ class FailedToWriteVersionFile(YamlexError):
 
 class DuplicateKey(YamlexError):
     code = 25
+
+
+class FailedToCompileSchema(YamlexError):
+    code = 26
+
+
+class ServerAlreadyRunning(YamlexError):
+    code = 27
+
+
+class InvalidSelector(YamlexError):
+    code = 28
+
+
+class PathIndexNotFound(YamlexError):
+    code = 29
+
+
+class InvalidVariant(YamlexError):
+    code = 30
+
+
+class IncompatibleLayout(YamlexError):
+    code = 31
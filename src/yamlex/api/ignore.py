@@ -0,0 +1,276 @@
+"""
+Exclude source files with .yamlexignore files.
+
+A .yamlexignore file can be put into any directory and uses the syntax of
+.gitignore files: one pattern per line, '#' for comments, '!' to include
+again what a previous pattern excluded, '/' at the end to match only
+directories and '/' at the start or in the middle to match relative to the
+directory of the .yamlexignore file. Patterns of deeper files take
+precedence over those of their parent directories.
+
+The patterns of every file are compiled once into two regular
+expressions, one for files and one for directories. Excluded directories
+are skipped as a whole, so that nothing within them is ever listed.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Optional, Union
+
+
+IGNORE_FILE_NAME = ".yamlexignore"
+
+# Compiled ignore files by path, with the modification time and size
+# they were compiled from
+_compiled: dict[str, tuple[tuple[int, int], "IgnoreFile"]] = {}
+
+
+class IgnoreFile:
+    """Compiled patterns of a single .yamlexignore file."""
+
+    __slots__ = ("_files", "_dirs", "_negated")
+
+    def __init__(self, lines: list[str]) -> None:
+        file_alternatives: list[str] = []
+        dir_alternatives: list[str] = []
+        self._negated: dict[str, bool] = {}
+
+        # The last matching pattern decides, so the alternatives are tried
+        # in reverse order and the first one that matches wins
+        for i, line in reversed(list(enumerate(lines))):
+            compiled = compile_pattern(line)
+            if compiled is None:
+                continue
+            regex, negated, dir_only = compiled
+            name = f"p{i}"
+            self._negated[name] = negated
+            alternative = f"(?P<{name}>{regex})"
+            dir_alternatives.append(alternative)
+            if not dir_only:
+                file_alternatives.append(alternative)
+
+        self._files = combine(file_alternatives)
+        self._dirs = combine(dir_alternatives)
+
+    def match(self, relative: str, is_dir: bool) -> Optional[bool]:
+        """
+        Decide about a path relative to the directory of the file.
+
+        Returns True if the path is excluded, False if it is included
+        again with '!', or None if no pattern matches.
+        """
+        regex = self._dirs if is_dir else self._files
+        if regex is None:
+            return None
+        match = regex.fullmatch(relative)
+        if match is None:
+            return None
+        return not self._negated[match.lastgroup]
+
+
+class IgnoreRules:
+    """All .yamlexignore files that apply within one directory."""
+
+    __slots__ = ("_layers",)
+
+    def __init__(self, layers: tuple = ()) -> None:
+        # Pairs of an ignore file and the path of the directory relative
+        # to the ignore file, from the outermost to the innermost
+        self._layers: tuple[tuple[IgnoreFile, str], ...] = layers
+
+    def enter(self, dir_path: Union[Path, str], name: Optional[str] = None) -> "IgnoreRules":
+        """Rules within dir_path, which is the subdirectory name of the current one."""
+        layers = self._layers
+        if name is not None:
+            layers = tuple(
+                (ignore_file, f"{prefix}{name}/")
+                for ignore_file, prefix in layers
+            )
+        ignore_file = load_ignore_file(dir_path)
+        if ignore_file is not None:
+            layers = layers + ((ignore_file, ""),)
+        if layers is self._layers:
+            return self
+        return IgnoreRules(layers)
+
+    def ignores(self, name: str, is_dir: bool) -> bool:
+        """Whether the entry of the directory is excluded."""
+        for ignore_file, prefix in reversed(self._layers):
+            decision = ignore_file.match(f"{prefix}{name}", is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+
+def compile_pattern(line: str) -> Optional[tuple[str, bool, bool]]:
+    """
+    Translate a line of a .yamlexignore file into a regular expression.
+
+    Returns the expression, whether the pattern is negated and whether
+    it matches only directories. Returns None for blank lines and comments.
+    """
+    line = line.rstrip("\r\n")
+    # Trailing spaces are ignored, unless escaped with a backslash
+    line = re.sub(r"(?<!\\) +$", "", line)
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    if dir_only:
+        line = line[:-1]
+    if not line:
+        return None
+
+    # Patterns with a slash are relative to the directory of the file,
+    # others match a name at any depth
+    anchored = "/" in line
+    line = line.lstrip("/")
+
+    regex = translate(line)
+    if not anchored:
+        regex = f"(?:.*/)?{regex}"
+    return regex, negated, dir_only
+
+
+def translate(pattern: str) -> str:
+    parts: list[str] = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+            if pattern.startswith("**/", i):
+                # Any number of directories, including none
+                parts.append("(?:.*/)?")
+                i += 3
+                continue
+            if i + 2 == n:
+                # Everything within the directory
+                parts.append(".*")
+                i += 2
+                continue
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(c))
+            else:
+                content = pattern[i + 1:end].replace("\\", "\\\\")
+                if content.startswith("!"):
+                    content = "^" + content[1:]
+                parts.append(f"[{content}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+def combine(alternatives: list[str]) -> Optional[re.Pattern]:
+    if not alternatives:
+        return None
+    return re.compile("|".join(alternatives), re.DOTALL)
+
+
+def load_ignore_file(dir_path: Union[Path, str]) -> Optional[IgnoreFile]:
+    """Compiled .yamlexignore file of the directory, if it has one."""
+    path = os.path.abspath(os.path.join(dir_path, IGNORE_FILE_NAME))
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    entry = _compiled.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    with open(path, "r") as f:
+        ignore_file = IgnoreFile(f.readlines())
+    _compiled[path] = (signature, ignore_file)
+    return ignore_file
+
+
+def rules_for_dir(dir_path: Path) -> IgnoreRules:
+    """
+    Rules that apply within the directory.
+
+    Within the current working directory, the .yamlexignore files of the
+    parent directories up to the working directory apply as well.
+    """
+    absolute = Path(os.path.abspath(dir_path))
+    cwd = Path(os.getcwd())
+    rules = IgnoreRules()
+    try:
+        relative = absolute.relative_to(cwd)
+    except ValueError:
+        return rules.enter(absolute)
+
+    current = cwd
+    rules = rules.enter(current)
+    for name in relative.parts:
+        current = current / name
+        rules = rules.enter(current, name)
+    return rules
+
+
+def list_dir_entries(dir_path: Union[Path, str], rules: IgnoreRules) -> list[os.DirEntry]:
+    """
+    List the entries of a source directory that are assembled.
+
+    Symlinks, entries starting with '!', .yamlexignore files and entries
+    excluded by the rules are skipped, without reading their metadata.
+    """
+    with os.scandir(dir_path) as entries:
+        return [
+            entry for entry in entries
+            if not (
+                entry.name.startswith("!")
+                or entry.name == IGNORE_FILE_NAME
+                or entry.is_symlink()
+                or rules.ignores(entry.name, entry.is_dir())
+            )
+        ]
+
+
+def is_ignored(
+    path: Path,
+    root: Path,
+    rules_by_dir: Optional[dict[Path, IgnoreRules]] = None,
+) -> bool:
+    """
+    Whether the path within root, or any of its parent directories, is excluded.
+
+    Pass the same rules_by_dir to many calls to read every directory's
+    .yamlexignore file only once.
+    """
+    if rules_by_dir is None:
+        rules_by_dir = {}
+    if root not in rules_by_dir:
+        rules_by_dir[root] = rules_for_dir(root)
+
+    names = path.relative_to(root).parts
+    current = root
+    for i, name in enumerate(names):
+        is_dir = i < len(names) - 1 or path.is_dir()
+        if name == IGNORE_FILE_NAME or rules_by_dir[current].ignores(name, is_dir):
+            return True
+        if not is_dir:
+            break
+        parent = current
+        current = current / name
+        if current not in rules_by_dir:
+            rules_by_dir[current] = rules_by_dir[parent].enter(current, name)
+    return False
@@ -1,10 +1,10 @@
+import os
 import sys
 import logging
 import warnings
 from pathlib import Path
-from typing import Union
+from typing import Any, Optional, Union
 
-import ruamel.yaml
 from ruamel.yaml.scalarstring import FoldedScalarString
 from ruamel.yaml.comments import (
     CommentedBase,
@@ -13,11 +13,15 @@ from ruamel.yaml.comments import (
     Comment,
 )
 
-from .util import remove_yaml_comments, indent as indentation
+from .cache import load_cached_file, load_cached_tree
+from .ignore import IgnoreRules, list_dir_entries, rules_for_dir
+from .memory import phase
+from .selector import MISSING, Selector, format_path, narrow_to_entry, select
+from .scalars import ScalarFile, materialized, non_text_file_error, sniff_scalar_file
+from .util import create_yaml_parser, remove_yaml_comments, indent as indentation
 from .exceptions import (
     InvalidItemWithinArrayDirectoryError,
     UnintendedIndexFileWarning,
-    NonTextFileError,
     FailedToParseYamlError,
     IndexFileIsArray,
     DuplicateKey,
@@ -25,7 +29,151 @@ from .exceptions import (
 
 
 logger = logging.getLogger(__name__)
-parser = ruamel.yaml.YAML()
+parser = create_yaml_parser()
+
+# Prefix of the entries of an overlay that remove an entry of the layers below
+DELETION_PREFIX = "~"
+
+
+def assemble(
+    dir_path: Path,
+    keep_formatting: bool = True,
+    sort_paths: bool = False,
+    remove_comments: bool = False,
+    cache: Optional[dict] = None,
+    only: Optional[list[Selector]] = None,
+    overlays: Optional[list[Path]] = None,
+    frozen: bool = False,
+    origins: Optional[dict[Path, dict]] = None,
+    lines: Optional[dict[Path, dict[str, int]]] = None,
+    lazy_scalars: bool = False,
+) -> Any:
+    """
+    Assemble the directory into a single data object.
+
+    If cache is given, the assembled data is reused until a file within the
+    directory changes, and unchanged files are not parsed again. With
+    frozen and remove_comments, the cached data is returned as the frozen
+    tree it is kept as, instead of a copy, see yamlex.api.tree.
+
+    If origins or lines are given, they are filled like assemble_recursively
+    does. They are cached together with the assembled data.
+
+    If only is given, only the selected parts are assembled and returned.
+    The result is empty if nothing matches.
+
+    If overlays are given, they are layered over the directory in this
+    order, see list_layered_entries. The files of every layer are cached,
+    so that overlays of the same base share its parsed files.
+
+    Scalar files are read into the returned data, unless lazy_scalars is
+    set, see assemble_recursively.
+    """
+    data = assemble_lazily(
+        dir_path,
+        keep_formatting=keep_formatting,
+        sort_paths=sort_paths,
+        remove_comments=remove_comments,
+        cache=cache,
+        only=only,
+        overlays=overlays,
+        frozen=frozen,
+        origins=origins,
+        lines=lines,
+    )
+    return data if lazy_scalars else materialized(data)
+
+
+def assemble_lazily(
+    dir_path: Path,
+    keep_formatting: bool,
+    sort_paths: bool,
+    remove_comments: bool,
+    cache: Optional[dict],
+    only: Optional[list[Selector]],
+    overlays: Optional[list[Path]],
+    frozen: bool,
+    origins: Optional[dict[Path, dict]],
+    lines: Optional[dict[Path, dict[str, int]]],
+) -> Any:
+    """Assemble the directory like assemble does, keeping scalar files as they are."""
+    if only is not None or overlays:
+        # Partial and layered results are not kept, but the parsed files are
+        data = assemble_recursively(
+            dir_path,
+            keep_formatting=keep_formatting,
+            sort_paths=sort_paths,
+            remove_comments=remove_comments,
+            cache=cache,
+            only=only,
+            overlays=overlays,
+            origins=origins,
+            lines=lines,
+            lazy_scalars=True,
+        )
+        if only is None:
+            return data
+        selected = select(data, only)
+        return {} if selected is MISSING else selected
+
+    if origins is not None or lines is not None:
+        assembled = load_cached_tree(
+            cache,
+            dir_path,
+            ("assemble", keep_formatting, sort_paths, remove_comments, "origins"),
+            lambda: assemble_with_origins(
+                dir_path,
+                keep_formatting=keep_formatting,
+                sort_paths=sort_paths,
+                remove_comments=remove_comments,
+                cache=cache,
+            ),
+        )
+        if origins is not None:
+            origins.update(assembled["origins"])
+        if lines is not None:
+            lines.update(assembled["lines"])
+        return assembled["data"].copy()
+
+    return load_cached_tree(
+        cache,
+        dir_path,
+        ("assemble", keep_formatting, sort_paths, remove_comments),
+        lambda: assemble_recursively(
+            dir_path,
+            keep_formatting=keep_formatting,
+            sort_paths=sort_paths,
+            remove_comments=remove_comments,
+            cache=cache,
+            lazy_scalars=True,
+        ),
+        # Without comments, the data does not need ruamel types
+        compact=remove_comments,
+        frozen=frozen,
+    )
+
+
+def assemble_with_origins(
+    dir_path: Path,
+    keep_formatting: bool,
+    sort_paths: bool,
+    remove_comments: bool,
+    cache: Optional[dict],
+) -> dict:
+    """The assembled data with the origins and lines that assembling collects."""
+    origins: dict[Path, dict] = {}
+    lines: dict[Path, dict[str, int]] = {}
+    data = assemble_recursively(
+        dir_path,
+        keep_formatting=keep_formatting,
+        sort_paths=sort_paths,
+        remove_comments=remove_comments,
+        origins=origins,
+        cache=cache,
+        lines=lines,
+        lazy_scalars=True,
+    )
+    return {"data": data, "origins": origins, "lines": lines}
 
 
 def assemble_recursively(
@@ -35,32 +183,87 @@ def assemble_recursively(
     dry_run: bool = False,
     remove_comments: bool = False,
     level: int = 0,
+    origins: Optional[dict[Path, dict]] = None,
+    cache: Optional[dict] = None,
+    ignore: Optional[IgnoreRules] = None,
+    only: Optional[list[Selector]] = None,
+    lines: Optional[dict[Path, dict[str, int]]] = None,
+    overlays: Optional[list[Path]] = None,
+    overlay_ignores: Optional[list[IgnoreRules]] = None,
+    lazy_scalars: bool = False,
 ) -> Union[dict, list]:
+    """
+    Assemble the directory into a single data object.
+
+    If origins is given, it is filled with the location of every source file
+    within the assembled data. See record_origin for the details.
+
+    If lines is given, it is filled with the lines of every YAML file, see
+    collect_lines.
+
+    If cache is given, files that did not change since they were cached are
+    not parsed again. See load_cached_file for the details.
+
+    The ignore rules are those of the .yamlexignore files that apply within
+    the directory. They are looked up when not given.
+
+    If only is given, files and directories that cannot contribute to the
+    selected paths are skipped. The result still contains everything else
+    within the files that are parsed, see select for the exact selection.
+
+    If overlays are given, they are directories at the same level within
+    later layers of the source, see list_layered_entries. Their ignore
+    rules are looked up when not given.
+
+    If lazy_scalars is set, non-YAML files are kept as ScalarFile objects,
+    which are only read when needed, such as when the data is written.
+    Otherwise they are read into strings before the data is returned.
+    """
     indent = indentation(level)
     logger.debug(f"{indent}Assembling level: {dir_path}")
 
-    # Get all files in this directory that we will process, but ignore
-    # symlinks and paths starting with '!'
-    all_paths = [
-        p for p in dir_path.glob("*")
-        if not (p.is_symlink() or p.name.startswith("!"))
-    ]
+    with phase("scan"):
+        if ignore is None:
+            ignore = rules_for_dir(dir_path)
+
+        # Get all files in this directory that we will process, but ignore
+        # symlinks, paths starting with '!' and paths excluded by .yamlexignore
+        if overlays:
+            if overlay_ignores is None:
+                overlay_ignores = [rules_for_dir(d) for d in overlays]
+            all_entries = list_layered_entries(
+                [(dir_path, ignore), *zip(overlays, overlay_ignores)]
+            )
+        else:
+            all_entries = [
+                (entry, dir_path, ignore)
+                for entry in list_dir_entries(dir_path, ignore)
+            ]
 
     # Enable alphabetically sorted keys for fancy users
     if sort_paths:
-        all_paths.sort(key=lambda p: p.name)
+        all_entries.sort(key=lambda e: e[0].name)
+
+    # Selectors within every entry, if only parts are assembled
+    entry_selectors: dict[str, Optional[list[Selector]]] = {}
+    if only is not None:
+        for entry, _, _ in all_entries:
+            name = entry.name if entry.is_dir() else Path(entry.name).stem
+            entry_selectors[entry.name] = narrow_to_entry(only, name)
+        all_entries = [e for e in all_entries if entry_selectors[e[0].name] is not None]
 
     # We deal with three types of paths within the directory:
-    # 1. Directories
-    all_dirs: list[Path] = []
+    # 1. Directories, with the same directory of every layer
+    all_dirs: dict[str, list[tuple[Path, IgnoreRules]]] = {}
     # 2. YAML files
     all_yamls: dict[str, Path] = {}
     # 3. Non-YAML scalar files, such as SQL queries, DQL, text files, etc.
     scalar_files: dict[str, Path] = {}
-    for p in all_paths:
-        if p.is_dir():
-            all_dirs.append(p)
-        elif p.is_file():
+    for entry, parent_path, parent_ignore in all_entries:
+        p = parent_path / entry.name
+        if entry.is_dir():
+            all_dirs.setdefault(entry.name, []).append((p, parent_ignore))
+        elif entry.is_file():
             if p.suffix in (".yaml", ".yml"):
                 all_yamls[p.stem] = p
             else:
@@ -69,67 +272,93 @@ def assemble_recursively(
     # All parsed data will be collected into a single data object.
     # However, we don't know in advance, whether we are dealing with
     # a dictionary or a list.
-    data: dict[str, Union[dict, list, str, FoldedScalarString]] = {}
+    data: dict[str, Union[dict, list, str, FoldedScalarString, ScalarFile]] = {}
+    # For each entry in data: the file it was loaded from, or the origins
+    # collected within the subdirectory.
+    data_origins: dict[str, Union[Path, dict, None]] = {}
 
     # Parse data from YAML files.
     for yaml_file_name, yaml_file_path in all_yamls.items():
-        with open(yaml_file_path, "r") as yaml_file:
-            try:
-                yaml_file_data = parser.load(yaml_file)
-            except Exception as e:
-                raise FailedToParseYamlError(
-                    f"Failed to parse {yaml_file_path} in {dir_path}. "
-                    "Please make sure the YAML syntax is correct. "
-                    f"The exact parsing error is: {e}"
-                )
-            
-            if yaml_file_name in data:
-                raise DuplicateKey(
-                    f"Duplicate key found inside {dir_path}: {yaml_file_name}"
-                )
-            
-            # Remove comments if necessary
-            data[yaml_file_name] = remove_yaml_comments(
-                yaml_file_name,
-                yaml_file_data,
-                recursive=True,
+        file_lines: Optional[dict[str, int]] = {} if lines is not None else None
+        yaml_file_data = load_cached_file(
+            cache,
+            yaml_file_path,
+            ("yaml", remove_comments),
+            lambda: load_yaml_file(
+                yaml_file_path,
+                remove_comments=remove_comments,
                 level=level + 1,
-            ) if remove_comments else yaml_file_data
+                lines=file_lines,
+            ),
+            compact=remove_comments,
+        )
+        if lines is not None:
+            # Cached data has no line numbers, the file is only parsed
+            # again if its lines are not cached either
+            lines[yaml_file_path] = load_cached_file(
+                cache,
+                yaml_file_path,
+                "lines",
+                lambda: file_lines or collect_lines(load_yaml_file(yaml_file_path)),
+            )
+
+        if yaml_file_name in data:
+            raise DuplicateKey(
+                f"Duplicate key found inside {dir_path}: {yaml_file_name}"
+            )
+
+        data[yaml_file_name] = yaml_file_data
+        data_origins[yaml_file_name] = yaml_file_path
 
     # Load data from scalar files.
     # Example: query.sql file containing a SQL query
     for scalar_file_name, scalar_file_path in scalar_files.items():
-        with open(scalar_file_path, "r") as scalar_file:
-            try:
-                scalar_file_content = scalar_file.read()
-            except UnicodeDecodeError:
-                raise NonTextFileError((
-                    f"Non-text file {scalar_file_path} found in {dir_path}. "
-                    "Only plain text files and folders can be read by "
-                    "yamlex. To ignore the file, prefix it with an "
-                    f"exclamation mark like so: !{scalar_file_name}."
-                ))
-            scalar_node: str | FoldedScalarString = scalar_file_content
-            if keep_formatting:
-                scalar_node = FoldedScalarString(scalar_file_content)
+        with phase("parse"):
+            scalar_node = load_cached_file(
+                cache,
+                scalar_file_path,
+                ("scalar", keep_formatting),
+                # Only the beginning of the file is read until its content
+                # is needed. See yamlex.api.scalars for the details.
+                lambda: sniff_scalar_file(
+                    scalar_file_path,
+                    keep_formatting=keep_formatting,
+                ),
+            )
 
-            if scalar_file_name in data:
-                raise DuplicateKey(
-                    f"Duplicate key found inside {dir_path}: {yaml_file_name}"
-                )
+        if scalar_file_name in data:
+            raise DuplicateKey(
+                f"Duplicate key found inside {dir_path}: {scalar_file_name}"
+            )
 
-            data[scalar_file_name] = scalar_node
+        data[scalar_file_name] = scalar_node
+        data_origins[scalar_file_name] = scalar_file_path
 
     # Recursively traverse directories.
     # Directory's name is considered to be the name of the nested field,
     # if it's not an array. Otherwise, directory name is ignored.
-    for sub_dir in all_dirs:
+    for sub_dir_name, sub_dir_layers in all_dirs.items():
+        (sub_dir, sub_dir_ignore), *sub_dir_overlays = [
+            (layer_path, layer_ignore.enter(layer_path, sub_dir_name))
+            for layer_path, layer_ignore in sub_dir_layers
+        ]
+        sub_dir_origins = {} if origins is not None else None
         sub_dir_data = assemble_recursively(
             sub_dir,
+            keep_formatting=keep_formatting,
             sort_paths=sort_paths,
             dry_run=dry_run,
             remove_comments=remove_comments,
             level=level + 1,
+            origins=sub_dir_origins,
+            cache=cache,
+            ignore=sub_dir_ignore,
+            # An empty list selects everything within the directory
+            only=entry_selectors.get(sub_dir.name) or None,
+            lines=lines,
+            overlays=[layer_path for layer_path, _ in sub_dir_overlays],
+            overlay_ignores=[layer_ignore for _, layer_ignore in sub_dir_overlays],
+            lazy_scalars=True,
         )
 
         if sub_dir.name in data:
@@ -138,6 +367,7 @@ def assemble_recursively(
             )
 
         data[sub_dir.name] = sub_dir_data
+        data_origins[sub_dir.name] = sub_dir_origins
 
     # Current directory is an array if either
     #   a. There is at least 1 item in it prefixed with a dash
@@ -170,8 +400,16 @@ def assemble_recursively(
 
         if is_current_dir_array:
             if k.startswith("-"):
+                record_origin(origins, data_origins[k], "value", [len(result_as_list)])
                 result_as_list.append(v)
             elif k.startswith("+") and isinstance(v, list):
+                record_origin(
+                    origins,
+                    data_origins[k],
+                    "items",
+                    [len(result_as_list)],
+                    count=len(v),
+                )
                 result_as_list.extend(v)
             else:
                 # If current dir is an array, then all items in it
@@ -187,10 +425,160 @@ def assemble_recursively(
             
         else:
             if (k.startswith("+") or k == "index") and isinstance(v, dict):
+                record_origin(origins, data_origins[k], "keys", [], keys=list(v))
                 result_as_dict.update(v)
             else:
+                record_origin(origins, data_origins[k], "value", [k])
                 result_as_dict[k] = v
 
     result = result_as_list if is_current_dir_array else result_as_dict
     logger.debug(f"{indent}Level {dir_path} returned {type(result)}")
-    return result
+    return result if lazy_scalars else materialized(result)
+
+
+def list_layered_entries(
+    layers: list[tuple[Path, IgnoreRules]],
+) -> list[tuple[os.DirEntry, Path, IgnoreRules]]:
+    """
+    Entries of the same directory within every layer of the source.
+
+    Entries are told apart by their key, i.e. the name of a directory or
+    the stem of a file. Within a later layer, a file replaces whatever an
+    earlier layer has under the same key, and so does a directory, unless
+    the earlier layers only have directories. These are merged with it.
+    An entry named ~<key>, such as ~-cpu.yaml or ~screens, removes the key
+    of the earlier layers.
+
+    Returns every entry with the directory and the ignore rules of its
+    layer, in the order of the first layer that has its key.
+    """
+    layered: dict[str, list[tuple[os.DirEntry, Path, IgnoreRules]]] = {}
+    for i, (layer_path, layer_ignore) in enumerate(layers):
+        # Keys of this layer, which are not replaced by this layer again
+        layer_keys: set[str] = set()
+        for entry in list_dir_entries(layer_path, layer_ignore):
+            key = entry.name if entry.is_dir() else Path(entry.name).stem
+            if i > 0 and key.startswith(DELETION_PREFIX):
+                layered.pop(key[len(DELETION_PREFIX):], None)
+                continue
+
+            previous = layered.get(key)
+            if previous is None or key in layer_keys:
+                layered.setdefault(key, []).append((entry, layer_path, layer_ignore))
+            elif entry.is_dir() and all(e.is_dir() for e, _, _ in previous):
+                previous.append((entry, layer_path, layer_ignore))
+            else:
+                layered[key] = [(entry, layer_path, layer_ignore)]
+            layer_keys.add(key)
+    return [e for entries in layered.values() for e in entries]
+
+
+def load_yaml_file(
+    yaml_file_path: Path,
+    remove_comments: bool = False,
+    level: int = 0,
+    lines: Optional[dict[str, int]] = None,
+) -> Any:
+    """
+    Parse a YAML file.
+
+    If lines is given, it is filled with the lines of the file before
+    comments are removed, see collect_lines.
+    """
+    with phase("parse"), open(yaml_file_path, "r") as yaml_file:
+        try:
+            yaml_file_data = parser.load(yaml_file)
+        except Exception as e:
+            raise FailedToParseYamlError(
+                f"Failed to parse {yaml_file_path} in {yaml_file_path.parent}. "
+                "Please make sure the YAML syntax is correct. "
+                f"The exact parsing error is: {e}"
+            )
+
+    if lines is not None:
+        with phase("index"):
+            lines.update(collect_lines(yaml_file_data))
+
+    if not remove_comments:
+        return yaml_file_data
+    with phase("comment stripping"):
+        return remove_yaml_comments(
+            yaml_file_path.stem,
+            yaml_file_data,
+            recursive=True,
+            level=level,
+        )
+
+
+def collect_lines(data: Any) -> dict[str, int]:
+    """
+    Line of every key and array item within parsed YAML data, by its path.
+
+    Paths are relative to the root of the data and formatted with
+    format_path, the root itself is the empty path. Lines start at 1.
+    """
+    lines: dict[str, int] = {"": data.lc.line + 1 if isinstance(data, CommentedBase) else 1}
+
+    def collect(node: Any, path: list) -> None:
+        if isinstance(node, CommentedMap):
+            for key, value in node.items():
+                key_path = path + [str(key)]
+                lines[format_path(key_path)] = node.lc.key(key)[0] + 1
+                collect(value, key_path)
+        elif isinstance(node, CommentedSeq):
+            for i, item in enumerate(node):
+                item_path = path + [i]
+                lines[format_path(item_path)] = node.lc.item(i)[0] + 1
+                collect(item, item_path)
+
+    collect(data, [])
+    return lines
+
+
+def load_scalar_file(
+    scalar_file_path: Path,
+    keep_formatting: bool = True,
+) -> Union[str, FoldedScalarString]:
+    with open(scalar_file_path, "r") as scalar_file:
+        try:
+            scalar_file_content = scalar_file.read()
+        except UnicodeDecodeError:
+            raise non_text_file_error(scalar_file_path)
+    scalar_node: Union[str, FoldedScalarString] = scalar_file_content
+    if keep_formatting:
+        scalar_node = FoldedScalarString(scalar_file_content)
+    return scalar_node
+
+
+def record_origin(
+    origins: Optional[dict[Path, dict]],
+    origin: Union[Path, dict, None],
+    kind: str,
+    path: list,
+    **details,
+) -> None:
+    """
+    Record where the content of a file ends up within the current level.
+
+    There are three kinds of locations:
+    - value: the file is the value at the path.
+    - items: the file holds `count` array items, starting at the path.
+    - keys: the file holds the `keys` of the mapping at the path.
+
+    If the origin is a subdirectory, the locations of all files within it
+    are moved into the current level instead.
+    """
+    if origins is None or origin is None:
+        return
+
+    if isinstance(origin, Path):
+        origins[origin] = {"kind": kind, "path": path, **details}
+        return
+
+    for file_path, sub_origin in origin.items():
+        sub_path = sub_origin["path"]
+        if kind == "items":
+            sub_path = [path[0] + sub_path[0]] + sub_path[1:]
+        elif kind == "value":
+            sub_path = path + sub_path
+        origins[file_path] = {**sub_origin, "path": sub_path}
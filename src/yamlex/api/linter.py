@@ -0,0 +1,335 @@
+"""
+Find inconsistencies across the parts of an extension.
+
+The assembled extension is read once into a symbol table: the definitions
+of metric keys, screens, topology types, relationships, datasource groups,
+subgroups and processes, and the references to metrics and entity types.
+Every rule then looks up symbols in the table, instead of searching the
+extension again.
+"""
+import logging
+import re
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from yamlex.api.joiner import assemble_recursively, load_yaml_file
+from yamlex.api.pathindex import index_source_files, locate, source_file_path
+from yamlex.api.selector import format_path
+from yamlex.api.splitter import DATASOURCE_NAMES
+from yamlex.api.util import sanitize_file_stem
+
+
+logger = logging.getLogger(__name__)
+
+# Metric keys within a metric selector. Quoted strings, such as dimension
+# names, and keys of other namespaces, such as builtin:, are not keys of
+# the extension.
+METRIC_KEY_PATTERN = re.compile(r"(?<![\w.:\"'$-])[A-Za-z_][\w-]*(?:\.[\w-]+)+(?![\w\"'(-])")
+# Parts of a metric selector: quoted strings, the opening parenthesis of
+# the arguments of a transformation, such as :splitBy(, other parentheses
+# and metric keys
+SELECTOR_TOKEN_PATTERN = re.compile(
+    r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'"
+    r"|(?P<arguments>:\s*\w+\s*\()|(?P<open>\()|(?P<close>\))"
+    rf"|(?P<key>{METRIC_KEY_PATTERN.pattern})"
+)
+
+
+@dataclass
+class SymbolTable:
+    # Paths of every definition, by kind and by scope and name. Names only
+    # need to be unique within their scope, such as subgroups within their
+    # group.
+    definitions: dict[str, dict[tuple[str, str], list[list]]] = field(default_factory=dict)
+    # Names and paths of every reference, by kind
+    references: dict[str, list[tuple[str, list]]] = field(default_factory=dict)
+
+    def define(self, kind: str, name: Any, path: list, scope: str = "") -> None:
+        if isinstance(name, str) and name:
+            self.definitions.setdefault(kind, {}).setdefault((scope, name), []).append(path)
+
+    def refer(self, kind: str, name: Any, path: list) -> None:
+        if isinstance(name, str) and name:
+            self.references.setdefault(kind, []).append((name, path))
+
+    def defines(self, kind: str, name: str, scope: str = "") -> bool:
+        return (scope, name) in self.definitions.get(kind, {})
+
+    def size(self) -> int:
+        return (
+            sum(len(d) for d in self.definitions.values())
+            + sum(len(r) for r in self.references.values())
+        )
+
+
+@dataclass
+class Finding:
+    rule: str
+    severity: str
+    message: str
+    # Path within the assembled extension
+    path: list
+    # Source file and line of the path, if known
+    file: Optional[str] = None
+    line: Optional[int] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "rule": self.rule,
+            "severity": self.severity,
+            "message": self.message,
+            "path": format_path(self.path),
+            "file": self.file,
+            "line": self.line,
+        }
+
+
+def lint(
+    path: Path,
+    workers: Optional[int] = None,
+    cache: Optional[dict] = None,
+) -> list[Finding]:
+    """
+    Run all rules on the source directory or the extension.yaml file.
+
+    Findings point to the source file and line of the inconsistency.
+    """
+    extension, path_index = load_extension(path, cache)
+    table = build_symbol_table(extension)
+    logger.info(f"Symbols found: {table.size()}")
+
+    findings = run_rules(table, workers)
+    for finding in findings:
+        location = locate(path_index, finding.path)
+        if location is not None:
+            entry, finding.line, _ = location
+            finding.file = source_file_path(path_index, entry).as_posix()
+
+    findings.sort(key=lambda f: (f.file or "", f.line or 0, f.rule))
+    return findings
+
+
+def load_extension(path: Path, cache: Optional[dict] = None) -> tuple[Any, dict]:
+    """The extension and a path index to find the lines of its paths."""
+    lines: dict[Path, dict[str, int]] = {}
+    if path.is_dir():
+        origins: dict[Path, dict] = {}
+        extension = assemble_recursively(
+            path,
+            origins=origins,
+            cache=cache,
+            lines=lines,
+            lazy_scalars=True,
+        )
+        return extension, {
+            "source": path.as_posix(),
+            "files": index_source_files(path, origins, lines),
+        }
+
+    extension = load_yaml_file(path, lines=lines.setdefault(path, {}))
+    origins = {path: {"kind": "value", "path": []}}
+    return extension, {
+        "source": path.parent.as_posix(),
+        "files": index_source_files(path.parent, origins, lines),
+    }
+
+
+def build_symbol_table(extension: Any) -> SymbolTable:
+    table = SymbolTable()
+    if not isinstance(extension, Mapping):
+        return table
+
+    for i, metric in items_of(extension, "metrics"):
+        table.define("metric", metric.get("key"), ["metrics", i])
+
+    for i, screen in items_of(extension, "screens"):
+        path = ["screens", i]
+        table.define("screen", screen.get("entityType"), path)
+        collect_screen_references(table, screen, path)
+
+    topology = extension.get("topology")
+    if isinstance(topology, Mapping):
+        for i, type_ in items_of(topology, "types"):
+            table.define("entity_type", type_.get("name"), ["topology", "types", i])
+        for i, relationship in items_of(topology, "relationships"):
+            path = ["topology", "relationships", i]
+            for field_name in ("fromType", "toType"):
+                refer_to_entity_type(table, relationship.get(field_name), path + [field_name])
+            # Relationships are split by their types and the type of the relation
+            if all(relationship.get(f) for f in ("fromType", "typeOfRelation", "toType")):
+                table.define(
+                    "relationship",
+                    (
+                        f"{relationship['fromType']}_"
+                        f"{relationship['typeOfRelation']}_"
+                        f"{relationship['toType']}"
+                    ),
+                    path,
+                )
+
+    for name in DATASOURCE_NAMES:
+        if name not in extension or name == "python":
+            continue
+        for i, item in items_of(extension, name):
+            path = [name, i]
+            if name == "processes":
+                table.define("process", item.get("name"), path)
+                continue
+            group = item.get("group")
+            table.define("group", group, path)
+            for j, subgroup in items_of(item, "subgroups"):
+                table.define("subgroup", subgroup.get("subgroup"), path + ["subgroups", j], scope=str(group))
+
+    return table
+
+
+def items_of(data: Mapping, key: str) -> Iterator[tuple[int, Mapping]]:
+    """Indexes and items of the array at the key, skipping items that are not mappings."""
+    items = data.get(key)
+    if isinstance(items, list):
+        for i, item in enumerate(items):
+            if isinstance(item, Mapping):
+                yield i, item
+
+
+def collect_screen_references(table: SymbolTable, node: Any, path: list) -> None:
+    if isinstance(node, Mapping):
+        for key, value in node.items():
+            value_path = path + [str(key)]
+            if key == "entityType" and len(path) > 2:
+                refer_to_entity_type(table, value, value_path)
+            elif key in ("metricKey", "metricSelector"):
+                for metric_key in referenced_metric_keys(key, value):
+                    table.refer("metric", metric_key, value_path)
+            else:
+                collect_screen_references(table, value, value_path)
+    elif isinstance(node, list):
+        for i, item in enumerate(node):
+            collect_screen_references(table, item, path + [i])
+
+
+def referenced_metric_keys(key: Any, value: Any) -> list[str]:
+    """
+    Keys of metrics of the extension that a metricKey or metricSelector refers to.
+
+    Keys of other namespaces, such as builtin:host.cpu.usage, and the
+    arguments of transformations, such as the dimension in
+    :splitBy(dt.entity.host), are not metrics of the extension.
+    """
+    if not isinstance(value, str):
+        return []
+    if key == "metricKey":
+        return [] if ":" in value else [value]
+
+    metric_keys = []
+    # Whether each open parenthesis is within the arguments of a transformation
+    open_parentheses: list[bool] = []
+    for match in SELECTOR_TOKEN_PATTERN.finditer(value):
+        in_arguments = bool(open_parentheses) and open_parentheses[-1]
+        if match["arguments"] or match["open"]:
+            open_parentheses.append(in_arguments or bool(match["arguments"]))
+        elif match["close"]:
+            if open_parentheses:
+                open_parentheses.pop()
+        elif match["key"] and not in_arguments:
+            metric_keys.append(match["key"])
+    return metric_keys
+
+
+def refer_to_entity_type(table: SymbolTable, name: Any, path: list) -> None:
+    # Types of the extension have a namespace, such as foo:host. Others
+    # are built into Dynatrace and not defined by the extension.
+    if isinstance(name, str) and ":" in name:
+        table.refer("entity_type", name, path)
+
+
+# Kinds of definitions, how they are called in messages and the key that
+# names them
+DEFINITION_KINDS = {
+    "metric": ("Metric", "key"),
+    "screen": ("Screen of entity type", "entityType"),
+    "entity_type": ("Topology type", "name"),
+    "relationship": ("Relationship", None),
+    "group": ("Group", "group"),
+    "subgroup": ("Subgroup", "subgroup"),
+    "process": ("Process", "name"),
+}
+
+
+def find_duplicates(kind: str, table: SymbolTable) -> Iterator[tuple[str, list]]:
+    label, name_key = DEFINITION_KINDS[kind]
+    for (_, name), paths in table.definitions.get(kind, {}).items():
+        for path in paths[1:]:
+            yield (
+                f"{label} {name} is already defined at {format_path(paths[0])}.",
+                path + [name_key] if name_key else path,
+            )
+
+
+def find_unknown_references(
+    kind: str,
+    defined_at: str,
+    table: SymbolTable,
+) -> Iterator[tuple[str, list]]:
+    for name, path in table.references.get(kind, []):
+        if not table.defines(kind, name):
+            yield f"{name} is not defined in {defined_at}.", path
+
+
+def find_split_collisions(table: SymbolTable) -> Iterator[tuple[str, list]]:
+    """Different names that split writes into the same file, so that one overwrites the other."""
+    for kind, definitions in table.definitions.items():
+        label, name_key = DEFINITION_KINDS[kind]
+        stems: dict[tuple[str, str], str] = {}
+        for (scope, name), paths in definitions.items():
+            stem = sanitize_file_stem(name)
+            first = stems.setdefault((scope, stem), name)
+            if first != name:
+                yield (
+                    f"{label} {name} is split into the same file as {first}: -{stem}.",
+                    paths[0] + [name_key] if name_key else paths[0],
+                )
+
+
+# Rules by name, with their severity
+RULES: dict[str, tuple[str, Callable[[SymbolTable], Iterator[tuple[str, list]]]]] = {
+    "duplicate-metric-key": ("error", partial(find_duplicates, "metric")),
+    "duplicate-screen": ("error", partial(find_duplicates, "screen")),
+    "duplicate-topology-type": ("error", partial(find_duplicates, "entity_type")),
+    "duplicate-relationship": ("error", partial(find_duplicates, "relationship")),
+    "duplicate-group": ("error", partial(find_duplicates, "group")),
+    "duplicate-subgroup": ("error", partial(find_duplicates, "subgroup")),
+    "duplicate-process": ("error", partial(find_duplicates, "process")),
+    "unknown-metric": ("error", partial(find_unknown_references, "metric", "metrics")),
+    "unknown-entity-type": ("error", partial(find_unknown_references, "entity_type", "topology.types")),
+    "split-collision": ("warning", find_split_collisions),
+}
+
+
+def run_rule(name: str, table: SymbolTable) -> list[Finding]:
+    severity, rule = RULES[name]
+    return [
+        Finding(rule=name, severity=severity, message=message, path=path)
+        for message, path in rule(table)
+    ]
+
+
+def run_rules(table: SymbolTable, workers: Optional[int] = None) -> list[Finding]:
+    """
+    Run all rules, in this process unless workers is more than 1.
+
+    The rules only look up the table, which takes less time than sending
+    the table to other processes, so processes are only used on request.
+    """
+    names = list(RULES)
+    if workers is None or workers == 1:
+        results = [run_rule(name, table) for name in names]
+    else:
+        workers = min(workers, len(names))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_rule, names, [table] * len(names)))
+    return [finding for findings in results for finding in findings]
@@ -1,9 +1,12 @@
+import hashlib
 import json
 import logging
 import re
 from pathlib import Path
-from typing import Union
+from typing import Any, Optional, Union
+from urllib.parse import urlparse
 
+from yamlex.api.util import hash_dir
 from yamlex.api.exceptions import (
     MissingExtensionSchema
 )
@@ -133,10 +136,28 @@ def validate_json_schemas_dir(json_schemas_dir_path: Path):
         raise MissingExtensionSchema()
 
 
-def extract_definitions_into_standalone_schemas(json_schemas_dir_path: Path) -> None:
-    """Open each schema file and extract definitions into standalone schema files"""
-    # Get a list of all JSON schema files in the directory
-    schema_file_paths = list(json_schemas_dir_path.glob("*.json"))
+def extract_definitions_into_standalone_schemas(
+    json_schemas_dir_path: Path,
+    deduplicate: bool = False,
+) -> int:
+    """
+    Open each schema file and extract definitions into standalone schema files.
+
+    When deduplicate is enabled, identical definitions are stored only once
+    and every duplicate becomes a thin schema pointing at the shared file
+    through $ref.
+
+    Returns:
+        int: Number of definitions that were deduplicated.
+    """
+    # Get a list of all JSON schema files in the directory. Sort them, so
+    # that the file holding a shared definition is always the same one.
+    schema_file_paths = sorted(json_schemas_dir_path.glob("*.json"))
+
+    # Canonical definition hash -> file name of the first extracted copy
+    known_definitions: Optional[dict[str, str]] = {} if deduplicate else None
+    deduplicated = 0
+
     for schema_file_path in schema_file_paths:
         relative_schema_file_path = schema_file_path.relative_to(json_schemas_dir_path)
         # Get stem two times to convert extension.schema.json to extension
@@ -199,12 +220,19 @@ def extract_definitions_into_standalone_schemas(json_schemas_dir_path: Path) ->
 
             for name, new_schema in new_schemas_to_process.items():
                 valid_name = name.replace("/", ".")
-                extract_single_definition_into_standalone_schema(
+                is_duplicate = extract_single_definition_into_standalone_schema(
                     parent_schema_stem,
                     valid_name,
                     json_schemas_dir_path,
                     new_schema,
+                    known_definitions=known_definitions,
                 )
+                if is_duplicate:
+                    deduplicated += 1
+
+    if deduplicate:
+        logger.info(f"Deduplicated definitions: {deduplicated}")
+    return deduplicated
 
 
 def extract_single_definition_into_standalone_schema(
@@ -212,32 +240,68 @@ def extract_single_definition_into_standalone_schema(
     name: str,
     json_schemas_dir_path: Path,
     definition: dict,
-):
+    known_definitions: Optional[dict[str, str]] = None,
+) -> bool:
+    """
+    Write a definition into its own schema file.
+
+    If known_definitions is given and an identical definition was already
+    extracted, only a $ref to that file is written. Returns True in that case.
+    """
     file_name = f"{parent_schema_stem}.{name}.schema.json"
+    d_schema_file_path = json_schemas_dir_path / file_name
+
+    if known_definitions is not None:
+        # References to sibling definitions are resolved first, because
+        # identical bodies from different parents may point to different files.
+        # Keep the indentation, so that there is one reference per line.
+        canonical_text = replace_sibling_references(
+            json.dumps(definition, indent=2, sort_keys=True),
+            parent_schema_stem,
+        )
+        digest = hashlib.sha256(canonical_text.encode()).hexdigest()
+        shared_file_name = known_definitions.get(digest)
+        if shared_file_name:
+            reference = {"$ref": shared_file_name}
+            enrich_definition_for_standalone_schema(reference, file_name)
+            with open(d_schema_file_path, "w") as d_schema_file:
+                d_schema_file.write(json.dumps(reference, indent=2))
+            logger.info(f"Deduplicated schema: {file_name} -> {shared_file_name}")
+            return True
+        known_definitions[digest] = file_name
+
     enrich_definition_for_standalone_schema(definition, file_name)
 
     # Write the enriched definition to a new schema file
-    d_schema_file_path = json_schemas_dir_path / file_name
     with open(d_schema_file_path, "w") as d_schema_file:
         d_schema_text = json.dumps(definition, indent=2)
 
         # If extracted definition contains references to sibling definitions,
         # then replace them with new extracted schema file names
-        # Regex to replace "#/definitions/{name}"" reference with "{name}.schema.json"
-
-        # Find all references to sibling definitions using regex
-        for m in re.finditer(r'"#/definitions/(.+)"', d_schema_text):
-            full_match = m.group(0)
-            logger.debug(f"Found reference to sibling definition: {full_match}")
-            catch_replacement = m.group(1).replace("/", ".")
-            full_replacement = f'"{parent_schema_stem}.{catch_replacement}.schema.json"'
-            logger.debug(f'Will be replaced with: {full_replacement}')
-            d_schema_text = d_schema_text.replace(full_match, full_replacement)
+        d_schema_text = replace_sibling_references(
+            d_schema_text,
+            parent_schema_stem,
+        )
 
         # Save to file
         d_schema_file.write(d_schema_text)
         logger.info(f"Extracted new schema: {file_name}")
 
+    return False
+
+
+def replace_sibling_references(schema_text: str, parent_schema_stem: str) -> str:
+    """Replace "#/definitions/{name}" references with "{parent}.{name}.schema.json"."""
+    # Find all references to sibling definitions using regex
+    for m in re.finditer(r'"#/definitions/(.+)"', schema_text):
+        full_match = m.group(0)
+        logger.debug(f"Found reference to sibling definition: {full_match}")
+        catch_replacement = m.group(1).replace("/", ".")
+        full_replacement = f'"{parent_schema_stem}.{catch_replacement}.schema.json"'
+        logger.debug(f'Will be replaced with: {full_replacement}')
+        schema_text = schema_text.replace(full_match, full_replacement)
+    return schema_text
+
 
 def enrich_definition_for_standalone_schema(definition: dict, file_name: str):
     definition["$schema"] = "http://json-schema.org/draft-07/schema#"
@@ -246,6 +310,144 @@ def enrich_definition_for_standalone_schema(definition: dict, file_name: str):
     # definition["additionalProperties"] = False
 
 
+BUNDLED_SCHEMAS_DIR_NAME = "bundled"
+BUNDLED_SCHEMAS_HASH_FILE_NAME = ".schemas.hash"
+
+
+def bundle_schemas(
+    json_schemas_dir_path: Path,
+    schema_file_names: list[str],
+) -> Path:
+    """
+    Bundle each of the given schema files into a single self-contained schema.
+
+    All references are resolved ahead of time. Only recursive references
+    remain, pointing into a local definitions block of the bundle. Bundles
+    are regenerated only when the content of the schema directory changes.
+
+    Returns:
+        Path: Directory with the bundled schema files.
+    """
+    bundled_dir_path = json_schemas_dir_path / BUNDLED_SCHEMAS_DIR_NAME
+    hash_file_path = bundled_dir_path / BUNDLED_SCHEMAS_HASH_FILE_NAME
+    schemas_hash = hash_dir(json_schemas_dir_path, "*.json")
+
+    if hash_file_path.exists() and hash_file_path.read_text() == schemas_hash:
+        logger.info(f"Bundled schemas are up to date: {bundled_dir_path}")
+        return bundled_dir_path
+
+    # Load all schemas at once, references may point to any of them
+    schemas: dict[str, dict] = {}
+    for schema_file_path in json_schemas_dir_path.glob("*.json"):
+        with open(schema_file_path, "r") as f:
+            schemas[schema_file_path.name] = json.load(f)
+
+    bundled_dir_path.mkdir(parents=True, exist_ok=True)
+    for schema_file_name in schema_file_names:
+        if schema_file_name not in schemas:
+            logger.debug(f"Schema file not found, skip: {schema_file_name}")
+            continue
+
+        bundle = bundle_single_schema(schema_file_name, schemas)
+        enrich_definition_for_standalone_schema(bundle, schema_file_name)
+        with open(bundled_dir_path / schema_file_name, "w") as f:
+            f.write(json.dumps(bundle, indent=2))
+        logger.info(f"Bundled schema: {schema_file_name}")
+
+    hash_file_path.write_text(schemas_hash)
+    return bundled_dir_path
+
+
+def bundle_single_schema(schema_file_name: str, schemas: dict[str, dict]) -> dict:
+    """Inline all references of a schema, keeping recursive ones local."""
+    definitions: dict[str, Any] = {}
+    recursive: set[tuple[str, str]] = set()
+
+    def definition_key(target: tuple[str, str]) -> str:
+        name, pointer = target
+        stem = name.removesuffix(".json").removesuffix(".schema")
+        return ".".join([stem] + [p for p in pointer.split("/") if p])
+
+    def resolve(node: Any, document: str, stack: list[tuple[str, str]]) -> Any:
+        if isinstance(node, list):
+            return [resolve(item, document, stack) for item in node]
+        if not isinstance(node, dict):
+            return node
+
+        ref = node.get("$ref")
+        if not isinstance(ref, str):
+            return {k: resolve(v, document, stack) for k, v in node.items()}
+
+        target = resolve_reference(ref, document)
+        target_schema = lookup_reference(target, schemas)
+        if target_schema is None:
+            logger.debug(f"Cannot resolve reference {ref} in {document}")
+            return dict(node)
+
+        # Recursive references cannot be inlined, so they are kept local
+        key = definition_key(target)
+        if target in stack or target in recursive:
+            recursive.add(target)
+            return {"$ref": f"#/definitions/{key}"}
+
+        # Definitions of an inlined document are inlined where they are used
+        if isinstance(target_schema, dict) and not target[1]:
+            target_schema = dict(target_schema)
+            target_schema.pop("definitions", None)
+
+        stack.append(target)
+        resolved = resolve(target_schema, target[0], stack)
+        stack.pop()
+
+        # Inlined documents must not change the base URI of the bundle
+        if isinstance(resolved, dict):
+            resolved.pop("$id", None)
+            resolved.pop("$schema", None)
+
+        if target in recursive:
+            definitions[key] = resolved
+            return {"$ref": f"#/definitions/{key}"}
+        return resolved
+
+    root = dict(schemas[schema_file_name])
+    # Everything from the original definitions is inlined where it is used
+    root.pop("definitions", None)
+    root_target = (schema_file_name, "")
+    bundle = resolve(root, schema_file_name, [root_target])
+
+    if root_target in recursive:
+        root_definition = dict(bundle)
+        root_definition.pop("$id", None)
+        root_definition.pop("$schema", None)
+        definitions[definition_key(root_target)] = root_definition
+    if definitions:
+        bundle["definitions"] = definitions
+    return bundle
+
+
+def resolve_reference(ref: str, document: str) -> tuple[str, str]:
+    """Turn a $ref into a schema file name and a JSON pointer within it."""
+    uri, _, pointer = ref.partition("#")
+    name = Path(urlparse(uri).path).name if uri else document
+    return name, pointer
+
+
+def lookup_reference(
+    target: tuple[str, str],
+    schemas: dict[str, dict],
+) -> Optional[Any]:
+    name, pointer = target
+    node = schemas.get(name)
+    for part in pointer.split("/"):
+        if not part:
+            continue
+        part = part.replace("~1", "/").replace("~0", "~")
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
 def read_vscode_settings_json_file(vscode_settings_json_file_path: Path):
     """Read settings.json if it exists, otherwise create an empty dictionary."""
     if vscode_settings_json_file_path.exists():
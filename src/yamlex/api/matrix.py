@@ -0,0 +1,110 @@
+"""
+Variants of extension.yaml that join writes from a single assembly.
+
+A variant is a target file together with the options that only change
+what is written, not what is assembled: dev mode, comments, line length,
+file header and emitter. Variants are given as strings, such as
+
+    target=build/dev/extension.yaml,dev,version=1.2.3
+
+or within a YAML matrix file:
+
+    variants:
+      - target: extension/extension.yaml
+      - target: build/legacy/extension.yaml
+        remove-comments: true
+        line-length: 80
+"""
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Any, Optional
+
+from yamlex.api.exceptions import InvalidVariant
+from yamlex.api.util import EMITTERS, create_yaml_parser
+
+
+@dataclass
+class Variant:
+    target: Path
+    dev: bool = False
+    version: Optional[str] = None
+    remove_comments: bool = False
+    line_length: Optional[int] = None
+    no_file_header: bool = False
+    emitter: str = "ruamel"
+
+
+# Options of a variant by their name within a specification, which is
+# the name of the join option
+OPTION_NAMES = {f.name.replace("_", "-"): f.name for f in fields(Variant)}
+BOOLEAN_VALUES = {"true": True, "yes": True, "false": False, "no": False}
+
+
+def parse_variant(specification: str, defaults: Variant) -> Variant:
+    """
+    Parse a comma-separated list of options, such as target=a.yaml,dev.
+
+    Options that are not given are taken from the defaults. Flags can be
+    given without a value.
+    """
+    options: dict[str, Any] = {}
+    for item in specification.split(","):
+        name, has_value, value = item.strip().partition("=")
+        options[name] = value if has_value else True
+    return make_variant(options, defaults, specification)
+
+
+def read_matrix_file(path: Path, defaults: Variant) -> list[Variant]:
+    """Variants listed under the variants key of a YAML file."""
+    try:
+        with open(path, "r") as f:
+            matrix = create_yaml_parser().load(f)
+    except Exception as e:
+        raise InvalidVariant(f"Failed to read the matrix file {path}: {e}")
+
+    variants = matrix.get("variants") if isinstance(matrix, dict) else None
+    if not isinstance(variants, list) or not all(isinstance(v, dict) for v in variants):
+        raise InvalidVariant(f"{path} must contain a list of variants under the variants key.")
+    return [
+        make_variant(dict(options), defaults, f"variant {i} of {path}")
+        for i, options in enumerate(variants)
+    ]
+
+
+def make_variant(options: dict[str, Any], defaults: Variant, origin: str) -> Variant:
+    values: dict[str, Any] = {}
+    for name, value in options.items():
+        field_name = OPTION_NAMES.get(name)
+        if field_name is None:
+            raise InvalidVariant(
+                f"Unknown option {name} in {origin}. "
+                f"Use any of: {', '.join(OPTION_NAMES)}."
+            )
+        values[field_name] = convert_option(field_name, value, origin)
+
+    if "target" not in values:
+        raise InvalidVariant(f"No target in {origin}.")
+    return replace(defaults, **values)
+
+
+def convert_option(field_name: str, value: Any, origin: str) -> Any:
+    default = getattr(Variant, field_name, None)
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            value = BOOLEAN_VALUES.get(value.lower(), value)
+        if not isinstance(value, bool):
+            raise InvalidVariant(f"{field_name} must be true or false in {origin}.")
+        return value
+
+    if value is True:
+        raise InvalidVariant(f"{field_name} needs a value in {origin}.")
+    if field_name == "target":
+        return Path(str(value))
+    if field_name == "line_length":
+        try:
+            return int(value)
+        except ValueError:
+            raise InvalidVariant(f"line-length must be a number in {origin}.")
+    if field_name == "emitter" and value not in EMITTERS:
+        raise InvalidVariant(f"Unknown emitter {value} in {origin}. Use one of: {', '.join(EMITTERS)}.")
+    return str(value)
@@ -0,0 +1,163 @@
+"""
+Measure the memory that join and split allocate in each phase.
+
+While a report is running, every phase, such as parsing a file or dumping
+the result, is measured with tracemalloc. Phases happen many times and
+within each other, for example a file is parsed while the directory it is
+in is merged. Time within a nested phase only counts for the nested one.
+
+For every phase, the report contains the peak of all traced memory while
+the phase ran and the net size of what it allocated and did not release.
+It also estimates how much memory every top-level section of the data,
+such as metrics or screens, retains.
+"""
+import sys
+import tracemalloc
+from collections.abc import Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+
+# Phases in the order they are reported in
+PHASES = ["scan", "parse", "comment stripping", "merge", "split", "index", "dump", "snapshot"]
+
+
+@dataclass
+class PhaseMemory:
+    name: str
+    calls: int = 0
+    # Highest traced memory while the phase ran, in bytes
+    peak: int = 0
+    # Allocated minus released memory, in bytes
+    net: int = 0
+    # Traced memory when the phase was entered or resumed
+    resumed_at: int = field(default=0, repr=False)
+
+
+@dataclass
+class MemoryReport:
+    phases: dict[str, PhaseMemory] = field(default_factory=dict)
+    # Estimated retained size of every top-level section, in bytes
+    sections: dict[str, int] = field(default_factory=dict)
+    # Highest traced memory of the whole run, in bytes
+    peak: int = 0
+    stack: list[PhaseMemory] = field(default_factory=list, repr=False)
+
+    def as_dict(self) -> dict:
+        return {
+            "peak": self.peak,
+            "phases": [
+                {"phase": p.name, "calls": p.calls, "peak": p.peak, "net": p.net}
+                for p in sorted_phases(self)
+            ],
+            "sections": self.sections,
+        }
+
+
+# Report of the current run. Phases are only measured while it is set.
+_report: Optional[MemoryReport] = None
+# Whether tracing was started for the report, rather than by someone else
+_started_tracing = False
+
+
+def start_memory_report() -> MemoryReport:
+    global _report, _started_tracing
+    _started_tracing = not tracemalloc.is_tracing()
+    if _started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    _report = MemoryReport()
+    return _report
+
+
+def stop_memory_report() -> Optional[MemoryReport]:
+    global _report
+    report, _report = _report, None
+    if report is not None:
+        report.peak = max(report.peak, tracemalloc.get_traced_memory()[1])
+        if _started_tracing:
+            tracemalloc.stop()
+    return report
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Measure the memory of everything within the block as the phase."""
+    report = _report
+    if report is None:
+        yield
+        return
+
+    current = pause(report)
+    measured = report.phases.get(name)
+    if measured is None:
+        measured = report.phases[name] = PhaseMemory(name)
+    measured.calls += 1
+    measured.resumed_at = current
+    report.stack.append(measured)
+    try:
+        yield
+    finally:
+        current = pause(report)
+        report.stack.pop()
+        if report.stack:
+            report.stack[-1].resumed_at = current
+
+
+def pause(report: MemoryReport) -> int:
+    """Account the memory since the innermost phase was resumed. Returns the traced memory."""
+    current, peak = tracemalloc.get_traced_memory()
+    report.peak = max(report.peak, peak)
+    if report.stack:
+        measured = report.stack[-1]
+        measured.peak = max(measured.peak, peak)
+        measured.net += current - measured.resumed_at
+    tracemalloc.reset_peak()
+    return current
+
+
+def record_sections(data: Any) -> None:
+    """Estimate the retained size of every top-level section of the data."""
+    if _report is None or not isinstance(data, Mapping):
+        return
+    # Objects shared between sections, such as equal keys, count only
+    # for the first section that refers to them
+    seen: set[int] = set()
+    for key, value in data.items():
+        _report.sections[str(key)] = deep_size(value, seen)
+
+
+def deep_size(obj: Any, seen: set[int]) -> int:
+    """Size of the object and everything it refers to, except classes and what was seen."""
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if type(obj) in (str, bytes, int, float, bool):
+        return size
+
+    if isinstance(obj, Mapping):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_size(item, seen)
+
+    # Attributes, such as the comments and lines kept by ruamel
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        size += deep_size(attributes, seen)
+    for cls in type(obj).__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        for name in [slots] if isinstance(slots, str) else slots:
+            if name != "__dict__" and hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def sorted_phases(report: MemoryReport) -> list[PhaseMemory]:
+    return sorted(
+        report.phases.values(),
+        key=lambda p: PHASES.index(p.name) if p.name in PHASES else len(PHASES),
+    )
@@ -0,0 +1,722 @@
+"""
+In-process entry points for joining, splitting and comparing extensions.
+
+These functions do what the join, split and diff commands do, without the
+command line. They raise YamlexError subclasses on failure and return
+results instead of printing them, so that build tools can process many
+extensions in a single Python process.
+"""
+import logging
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+from yamlex.api.cache import get_cache
+from yamlex.api.joiner import assemble
+from yamlex.api.matrix import Variant
+from yamlex.api.memory import phase, record_sections
+from yamlex.api.pathindex import (
+    build_path_index,
+    get_path_index_path,
+    refresh_path_index,
+    write_path_index,
+)
+from yamlex.api.selector import parse_selectors
+from yamlex.api.sourcemap import (
+    build_source_map,
+    get_source_map_path,
+    read_source_map,
+    splice_changed_parts,
+    write_source_map,
+)
+from yamlex.api.snapshot import get_snapshot_path, write_snapshot
+from yamlex.api.resplitter import resplit_yaml
+from yamlex.api.scalars import materialized
+from yamlex.api.splitter import split_yaml
+from yamlex.api.util import (
+    copy_without_comments,
+    dump_yaml,
+    get_cache_dir_path,
+    is_manually_created,
+    write_file,
+    write_text,
+    read_version_properties,
+    parse_version,
+)
+from yamlex.api.exceptions import (
+    YamlexError,
+    InvalidPath,
+    WrongExtensionStructureError,
+    EmptyAssembledExtensionError,
+    OverwritingManuallyCreatedFileError,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JoinResult:
+    source: Path
+    # None if the selected parts were only returned
+    target: Optional[Path]
+    # Assembled extension. None if the target was updated incrementally.
+    extension: Optional[dict]
+    # Whether only the changed source files were spliced into the target
+    incremental: bool = False
+    source_map_path: Optional[Path] = None
+    # Messages of the warnings raised while assembling
+    warnings: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SplitResult:
+    source: Path
+    target: Path
+    # Parts that were written, or would be written in a dry run
+    written: list[Path] = field(default_factory=list)
+    # Parts that were not written, because they were created manually
+    skipped: list[Path] = field(default_factory=list)
+    # Parts that were removed, or would be removed in a dry run
+    removed: list[Path] = field(default_factory=list)
+    # Number of existing parts that did not change
+    unchanged: int = 0
+
+
+@dataclass
+class DiffResult:
+    source: Path
+    target: Path
+    # Differences in the format of DeepDiff, empty if there are none
+    differences: dict
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.differences)
+
+
+@dataclass
+class BatchResult:
+    operation: str
+    arguments: dict
+    # Result of the operation, None if it failed
+    result: Union[JoinResult, SplitResult, DiffResult, None] = None
+    # Error that stopped the operation
+    error: Optional[YamlexError] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def join(
+    source: Path,
+    target: Optional[Path],
+    dev: bool = False,
+    version: Optional[str] = None,
+    version_properties: Path = Path("version.properties"),
+    keep_formatting: bool = True,
+    sort_paths: bool = False,
+    remove_comments: bool = False,
+    line_length: Optional[int] = None,
+    add_file_header: bool = True,
+    force: bool = False,
+    dry_run: bool = False,
+    source_map: bool = False,
+    incremental: bool = False,
+    cache_dir_path: Path = get_cache_dir_path(Path(".")),
+    cache: Optional[dict] = None,
+    only: Optional[list[str]] = None,
+    emitter: str = "ruamel",
+    overlays: Optional[list[Path]] = None,
+) -> JoinResult:
+    """
+    Assemble the source directory into the target extension.yaml.
+
+    See the join command for the meaning of the options. If cache is not
+    given, the process-wide cache is used, if it is enabled.
+
+    If overlays are given, these directories are layered over the source
+    in this order, see yamlex.api.joiner.list_layered_entries. Layered
+    joins are never incremental and have no source map.
+
+    If only is given, only the parts selected by these YAML path
+    expressions are assembled, see yamlex.api.selector. Such a partial
+    join is never incremental and ignores dev mode. Target can be None
+    to only return the selected parts, and is required otherwise.
+    """
+    cache = cache if cache is not None else get_cache()
+
+    if target is None and not only:
+        raise InvalidPath("A target is needed, unless only parts of the extension are joined.")
+
+    if only:
+        return join_selected(
+            source,
+            target,
+            only,
+            keep_formatting=keep_formatting,
+            sort_paths=sort_paths,
+            remove_comments=remove_comments,
+            line_length=line_length,
+            add_file_header=add_file_header,
+            force=force,
+            dry_run=dry_run,
+            cache=cache,
+            emitter=emitter,
+            overlays=overlays,
+        )
+
+    # Options that affect the generated text. A source map can only be
+    # reused by a join with the same options.
+    join_options = {
+        "keep_formatting": keep_formatting,
+        "sort_paths": sort_paths,
+        "remove_comments": remove_comments,
+        "line_length": line_length,
+        "add_file_header": add_file_header,
+        "dev": dev,
+        "version": version,
+    }
+
+    if overlays and (source_map or incremental):
+        logger.info("Source maps are not supported with several source directories.")
+        source_map = incremental = False
+
+    source_map_path: Optional[Path] = None
+    if (source_map or incremental) and not dry_run:
+        source_map_path = get_source_map_path(cache_dir_path, target)
+
+    if incremental and source_map_path:
+        if dev or line_length:
+            logger.info(
+                "Incremental join is not possible with --dev or --line-length."
+            )
+        elif splice_into_target(source, target, source_map_path, join_options):
+            refresh_path_index(get_path_index_path(cache_dir_path, target), target)
+            return JoinResult(
+                source=source,
+                target=target,
+                extension=None,
+                incremental=True,
+                source_map_path=source_map_path,
+            )
+        logger.info("Performing full join.")
+
+    # Locations and lines of source files, for the path index and the
+    # source map. Nothing is written in a dry run.
+    origins = {} if not dry_run else None
+    lines = {} if not dry_run else None
+
+    with warnings.catch_warnings(record=True) as caught_warnings:
+        warnings.simplefilter("always")
+        extension = assemble_extension(
+            source,
+            keep_formatting=keep_formatting,
+            sort_paths=sort_paths,
+            remove_comments=remove_comments,
+            cache=cache,
+            overlays=overlays,
+            origins=origins,
+            lines=lines,
+        )
+
+    if dev:
+        apply_dev_mode(extension, version, version_properties)
+    record_sections(extension)
+
+    logger.debug(f"Target file: {target}")
+
+    # Check if the target file exists and was created manually
+    if is_manually_created(target) and not force:
+        raise OverwritingManuallyCreatedFileError(
+            f"The {target} file was created manually. Use --force to overwrite it."
+        )
+
+    # Write to output file
+    write_file(
+        target,
+        extension,
+        add_file_header=add_file_header,
+        line_length=line_length,
+        dry_run=dry_run,
+        emitter=emitter,
+    )
+
+    # Let diff use the written data instead of parsing the file again
+    if not dry_run:
+        with phase("snapshot"):
+            write_snapshot(get_snapshot_path(cache_dir_path, target), target, extension)
+
+    with phase("index"):
+        if origins is not None:
+            write_path_index(
+                get_path_index_path(cache_dir_path, target),
+                build_path_index(source, target, origins, lines),
+            )
+
+        if source_map_path is not None:
+            with open(target, "r") as f:
+                text = f.read()
+            write_source_map(
+                source_map_path,
+                build_source_map(text, extension, origins, source, join_options),
+            )
+            logger.info(f"Source map written: {source_map_path}")
+
+    return JoinResult(
+        source=source,
+        target=target,
+        extension=materialized(extension),
+        source_map_path=source_map_path,
+        warnings=[str(w.message) for w in caught_warnings],
+    )
+
+
+def assemble_extension(
+    source: Path,
+    keep_formatting: bool,
+    sort_paths: bool,
+    remove_comments: bool,
+    cache: Optional[dict],
+    overlays: Optional[list[Path]],
+    origins: Optional[dict[Path, dict]],
+    lines: Optional[dict[Path, dict[str, int]]],
+) -> dict:
+    """Assemble the source directory and check that the result is an extension."""
+    with phase("merge"):
+        extension = assemble(
+            source,
+            keep_formatting=keep_formatting,
+            sort_paths=sort_paths,
+            remove_comments=remove_comments,
+            cache=cache,
+            overlays=overlays,
+            origins=origins,
+            lines=lines,
+            # Scalar files are read when the extension is written
+            lazy_scalars=True,
+        )
+
+    # An assembled extension cannot be an array.
+    if isinstance(extension, list):
+        raise WrongExtensionStructureError((
+            "Error! Invalid source directory structure. "
+            "Assembled extension is an array while object is expected."
+        ))
+
+    # An assembled extension cannot be empty
+    if not extension:
+        raise EmptyAssembledExtensionError(
+            "Error! Failed to assemble the extension. The result is empty."
+        )
+    return extension
+
+
+def join_matrix(
+    source: Path,
+    variants: list[Variant],
+    version_properties: Path = Path("version.properties"),
+    keep_formatting: bool = True,
+    sort_paths: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+    cache_dir_path: Path = get_cache_dir_path(Path(".")),
+    cache: Optional[dict] = None,
+    overlays: Optional[list[Path]] = None,
+    workers: Optional[int] = None,
+) -> list[JoinResult]:
+    """
+    Assemble the source directory once and write every variant of it.
+
+    The assembled extension is shared by all variants. Dev mode only
+    changes a copy of its top level and comments are removed from a copy,
+    so that no variant sees the changes of another. The variants are
+    dumped by several processes at once, unless workers is 1 or there is
+    only one variant.
+    """
+    cache = cache if cache is not None else get_cache()
+
+    # Every target must be writable before anything is assembled
+    for variant in variants:
+        if is_manually_created(variant.target) and not force:
+            raise OverwritingManuallyCreatedFileError(
+                f"The {variant.target} file was created manually. Use --force to overwrite it."
+            )
+
+    origins = {} if not dry_run else None
+    lines = {} if not dry_run else None
+    with warnings.catch_warnings(record=True) as caught_warnings:
+        warnings.simplefilter("always")
+        extension = assemble_extension(
+            source,
+            keep_formatting=keep_formatting,
+            sort_paths=sort_paths,
+            # Comments are removed for the variants that need it
+            remove_comments=False,
+            cache=cache,
+            overlays=overlays,
+            origins=origins,
+            lines=lines,
+        )
+    record_sections(extension)
+
+    variant_extensions = []
+    for variant in variants:
+        variant_extension = extension
+        if variant.dev:
+            variant_extension = dict(extension)
+            apply_dev_mode(variant_extension, variant.version, version_properties)
+        if variant.remove_comments:
+            variant_extension = copy_without_comments(variant_extension)
+        variant_extensions.append(variant_extension)
+
+    workers = min(workers or os.cpu_count() or 1, len(variants))
+    dump_arguments = (
+        variant_extensions,
+        [v.line_length for v in variants],
+        [v.emitter for v in variants],
+    )
+    with phase("dump"):
+        if workers == 1:
+            texts = list(map(dump_yaml, *dump_arguments))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                texts = list(executor.map(dump_yaml, *dump_arguments))
+
+    results = []
+    for variant, variant_extension, text in zip(variants, variant_extensions, texts):
+        write_text(
+            variant.target,
+            text,
+            add_file_header=not variant.no_file_header,
+            dry_run=dry_run,
+        )
+        if not dry_run:
+            logger.info(f"Variant written: {variant.target}")
+            with phase("snapshot"):
+                write_snapshot(
+                    get_snapshot_path(cache_dir_path, variant.target),
+                    variant.target,
+                    variant_extension,
+                )
+            with phase("index"):
+                write_path_index(
+                    get_path_index_path(cache_dir_path, variant.target),
+                    build_path_index(source, variant.target, origins, lines),
+                )
+        results.append(JoinResult(
+            source=source,
+            target=variant.target,
+            extension=materialized(variant_extension),
+            warnings=[str(w.message) for w in caught_warnings],
+        ))
+    return results
+
+
+def join_selected(
+    source: Path,
+    target: Optional[Path],
+    only: list[str],
+    keep_formatting: bool = True,
+    sort_paths: bool = False,
+    remove_comments: bool = False,
+    line_length: Optional[int] = None,
+    add_file_header: bool = True,
+    force: bool = False,
+    dry_run: bool = False,
+    cache: Optional[dict] = None,
+    emitter: str = "ruamel",
+    overlays: Optional[list[Path]] = None,
+) -> JoinResult:
+    """Assemble only the selected parts of the source directory and its overlays."""
+    selectors = parse_selectors(only)
+
+    with warnings.catch_warnings(record=True) as caught_warnings, phase("merge"):
+        warnings.simplefilter("always")
+        extension = assemble(
+            source,
+            keep_formatting=keep_formatting,
+            sort_paths=sort_paths,
+            remove_comments=remove_comments,
+            cache=cache,
+            only=selectors,
+            overlays=overlays,
+            lazy_scalars=True,
+        )
+    record_sections(extension)
+
+    if not extension:
+        raise EmptyAssembledExtensionError((
+            f"Error! Nothing in {source} matches "
+            f"{', '.join(only)}."
+        ))
+
+    if target is not None:
+        if is_manually_created(target) and not force:
+            raise OverwritingManuallyCreatedFileError(
+                f"The {target} file was created manually. Use --force to overwrite it."
+            )
+        write_file(
+            target,
+            extension,
+            add_file_header=add_file_header,
+            line_length=line_length,
+            dry_run=dry_run,
+            emitter=emitter,
+        )
+
+    return JoinResult(
+        source=source,
+        target=target,
+        extension=materialized(extension),
+        warnings=[str(w.message) for w in caught_warnings],
+    )
+
+
+def apply_dev_mode(
+    extension: dict,
+    version: Optional[str],
+    version_properties: Path,
+) -> None:
+    """Add the 'custom:' prefix to the name and embed an explicit version."""
+    yaml_version = extension.get("version")
+
+    name = extension.get("name")
+    if isinstance(name, str) and not name.startswith("custom:"):
+        name = f"custom:{name}"
+        extension["name"] = name
+        logger.info(f"Dev mode extension name: {name}")
+
+    # If new version is not explicitly specified
+    if not version:
+        version = parse_version(yaml_version) if yaml_version else None
+        if not version:
+            version = read_version_properties(version_properties)
+            logger.info(f"Version found in {version_properties}: {version}")
+
+    # Explicitly add version to generated extension.yaml
+    if yaml_version != version:
+        extension["version"] = version
+        logger.info(f"Explicit version in dev mode: {version}")
+
+
+def splice_into_target(
+    source: Path,
+    target: Path,
+    source_map_path: Path,
+    join_options: dict,
+) -> bool:
+    """Update the target incrementally. Returns False if a full join is needed."""
+    source_map = read_source_map(source_map_path)
+    if source_map is None:
+        logger.info("No source map from a previous join found.")
+        return False
+
+    text = splice_changed_parts(source, target, source_map, join_options)
+    if text is None:
+        return False
+
+    with open(target, "w") as f:
+        f.write(text)
+    write_source_map(source_map_path, source_map)
+    logger.info(f"Incrementally updated: {target}")
+    return True
+
+
+def split(
+    source: Path,
+    target: Path,
+    remove_comments: bool = False,
+    line_length: Optional[int] = None,
+    add_file_header: bool = True,
+    force: bool = False,
+    dry_run: bool = False,
+    emitter: str = "ruamel",
+    keep_layout: bool = False,
+    cache: Optional[dict] = None,
+) -> SplitResult:
+    """
+    Split the source extension.yaml into parts within the target directory.
+
+    If keep_layout is set, the existing files of the target directory are
+    updated instead, see yamlex.api.resplitter. Only the files that change
+    are written, and only new files get the file header. If cache is not
+    given, the process-wide cache is used to read the target directory.
+    """
+    if keep_layout:
+        return split_into_layout(
+            source,
+            target,
+            line_length=line_length,
+            add_file_header=add_file_header,
+            dry_run=dry_run,
+            emitter=emitter,
+            cache=cache if cache is not None else get_cache(),
+        )
+
+    split_parts = split_yaml(
+        source,
+        target,
+        remove_comments=remove_comments,
+    )
+
+    result = SplitResult(source=source, target=target)
+    for path, part in split_parts.items():
+        if is_manually_created(path) and not force:
+            result.skipped.append(path)
+            continue
+        write_file(
+            path,
+            part,
+            add_file_header=add_file_header,
+            line_length=line_length,
+            dry_run=dry_run,
+            print_to_stdout=False,
+            emitter=emitter,
+        )
+        result.written.append(path)
+
+    return result
+
+
+def split_into_layout(
+    source: Path,
+    target: Path,
+    line_length: Optional[int],
+    add_file_header: bool,
+    dry_run: bool,
+    emitter: str,
+    cache: Optional[dict],
+) -> SplitResult:
+    resplit = resplit_yaml(source, target, cache=cache)
+
+    result = SplitResult(source=source, target=target, unchanged=resplit.unchanged)
+    for path, part in resplit.changed.items():
+        if path.suffix not in (".yaml", ".yml"):
+            write_text(path, part, add_file_header=False, dry_run=dry_run)
+        else:
+            write_file(
+                path,
+                part,
+                # Existing files keep the header they have
+                add_file_header=add_file_header and not path.exists(),
+                line_length=line_length,
+                dry_run=dry_run,
+                emitter=emitter,
+                sequence_indent=resplit.sequence_indents.get(path),
+            )
+        result.written.append(path)
+
+    for path in resplit.removed:
+        if not dry_run:
+            path.unlink()
+            # Remove the directories that are left empty
+            parent = path.parent
+            while parent != target and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        result.removed.append(path)
+
+    return result
+
+
+def diff(
+    source: Path,
+    target: Path,
+    cache: Optional[dict] = None,
+    only: Optional[list[str]] = None,
+) -> DiffResult:
+    """
+    Compare the source YAML file or directory to the target.
+
+    If only is given, only the parts selected by these YAML path
+    expressions are compared.
+    """
+    # Imported here, so that joining does not load DeepDiff
+    from yamlex.api.differ import diff as diff_data
+
+    cache = cache if cache is not None else get_cache()
+    differences = diff_data(
+        source=source,
+        target=target,
+        cache=cache,
+        only=parse_selectors(only) if only else None,
+    )
+    return DiffResult(source=source, target=target, differences=differences)
+
+
+def diff_changes(
+    source: Path,
+    target: Path,
+    cache: Optional[dict] = None,
+    only: Optional[list[str]] = None,
+) -> Iterator:
+    """
+    Compare the source YAML file or directory to the target change by change.
+
+    Unlike diff, the changes are yielded while they are found, as
+    yamlex.api.differ.Change objects. See iter_changes for the details.
+    """
+    from yamlex.api.differ import iter_changes
+
+    cache = cache if cache is not None else get_cache()
+    return iter_changes(
+        source=source,
+        target=target,
+        cache=cache,
+        only=parse_selectors(only) if only else None,
+    )
+
+
+OPERATIONS: dict[str, Callable[..., Any]] = {
+    "join": join,
+    "split": split,
+    "diff": diff,
+}
+
+
+def run_batch(
+    requests: Iterable[tuple[str, dict]],
+    cache: Optional[dict] = None,
+    stop_on_error: bool = False,
+) -> list[BatchResult]:
+    """
+    Run many operations in this process, one after another.
+
+    Every request is the name of an operation (join, split or diff) and its
+    keyword arguments. All join and diff operations share the same cache,
+    so files used by several operations are parsed only once.
+
+    An operation that fails with a YamlexError does not stop the batch,
+    unless stop_on_error is set. Its error is returned in its result.
+    """
+    cache = cache if cache is not None else get_cache()
+    if cache is None:
+        cache = {}
+
+    results: list[BatchResult] = []
+    for operation, arguments in requests:
+        function = OPERATIONS[operation]
+        if operation in ("join", "diff"):
+            arguments = {"cache": cache, **arguments}
+
+        started = time.perf_counter()
+        batch_result = BatchResult(operation=operation, arguments=arguments)
+        try:
+            batch_result.result = function(**arguments)
+        except YamlexError as e:
+            batch_result.error = e
+            logger.debug(f"{operation} failed: {e}")
+        batch_result.seconds = time.perf_counter() - started
+        results.append(batch_result)
+
+        if stop_on_error and batch_result.error is not None:
+            break
+
+    return results
@@ -0,0 +1,261 @@
+"""
+Find the source file and line that define a path of an assembled extension.
+
+When join writes extension.yaml, it also stores where each source file ends
+up within the assembled data, together with the lines of every key and item
+within the file. Looking up a path then only needs the index, not another
+assembly. The index is kept in the cache directory, one per target file.
+
+Lines of the target file itself are mapped to paths on first use and kept
+in the index as long as the target stays the same.
+"""
+import bisect
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from ruamel.yaml.events import (
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+)
+
+from yamlex.api.joiner import collect_lines, load_yaml_file
+from yamlex.api.query import event_parser, skip_node
+from yamlex.api.selector import format_path
+from yamlex.api.util import hash_file, indent
+
+
+logger = logging.getLogger(__name__)
+
+PATH_INDEXES_DIR_NAME = "indexes"
+PATH_INDEX_VERSION = 1
+
+
+def get_path_index_path(cache_dir_path: Path, target: Path) -> Path:
+    """Path indexes are kept in the cache directory, one per target file."""
+    key = hashlib.sha256(str(target.resolve()).encode()).hexdigest()[:16]
+    return cache_dir_path / PATH_INDEXES_DIR_NAME / f"{key}.json"
+
+
+def build_path_index(
+    source: Path,
+    target: Path,
+    origins: dict[Path, dict],
+    lines: dict[Path, dict[str, int]],
+) -> dict:
+    """Record the location and the lines of every source file of the target."""
+    return {
+        "version": PATH_INDEX_VERSION,
+        "source": source.as_posix(),
+        "target_hash": hash_file(target),
+        "files": index_source_files(source, origins, lines),
+    }
+
+
+def index_source_files(
+    source: Path,
+    origins: dict[Path, dict],
+    lines: dict[Path, dict[str, int]],
+) -> list[dict]:
+    """
+    Entries of the path index for every source file.
+
+    Files are kept in the order they were assembled in, so that a file that
+    overwrites keys of an earlier one comes later.
+    """
+    files = []
+    for file_path, origin in origins.items():
+        stat = file_path.stat()
+        entry = {
+            # Files of overlays are outside of the source directory
+            "file": Path(os.path.relpath(file_path, source)).as_posix(),
+            "stat": [stat.st_mtime_ns, stat.st_size],
+            "kind": origin["kind"],
+            "path": origin["path"],
+            # Scalar files are a single value
+            "lines": lines.get(file_path, {"": 1}),
+        }
+        if "keys" in origin:
+            entry["keys"] = [str(k) for k in origin["keys"]]
+        if "count" in origin:
+            entry["count"] = origin["count"]
+        files.append(entry)
+    return files
+
+
+def source_file_path(path_index: dict, entry: dict) -> Path:
+    """Path of the source file of the entry, relative to the working directory if the source is."""
+    return Path(os.path.normpath(Path(path_index["source"]) / entry["file"]))
+
+
+def read_path_index(path_index_path: Path) -> Optional[dict]:
+    if not path_index_path.exists():
+        return None
+    try:
+        with open(path_index_path, "r") as f:
+            path_index = json.load(f)
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable path index {path_index_path}: {e}")
+        return None
+    if path_index.get("version") != PATH_INDEX_VERSION:
+        return None
+    return path_index
+
+
+def write_path_index(path_index_path: Path, path_index: dict) -> None:
+    path_index_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path_index_path, "w") as f:
+        json.dump(path_index, f)
+    logger.debug(f"{indent(1)}Path index written: {path_index_path}")
+
+
+def refresh_path_index(path_index_path: Path, target: Path) -> None:
+    """
+    Update the index after the target was updated incrementally.
+
+    Incremental joins keep the location of every file, only lines within
+    the changed files move.
+    """
+    path_index = read_path_index(path_index_path)
+    if path_index is None:
+        return
+    for entry in path_index["files"]:
+        refresh_file_lines(path_index, entry)
+    path_index["target_hash"] = hash_file(target)
+    path_index.pop("target_lines", None)
+    write_path_index(path_index_path, path_index)
+
+
+def refresh_file_lines(path_index: dict, entry: dict) -> bool:
+    """Read the lines of a file again, if it changed. Returns whether it changed."""
+    file_path = source_file_path(path_index, entry)
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        return False
+    if [stat.st_mtime_ns, stat.st_size] == entry["stat"]:
+        return False
+
+    if file_path.suffix in (".yaml", ".yml"):
+        entry["lines"] = collect_lines(load_yaml_file(file_path))
+    entry["stat"] = [stat.st_mtime_ns, stat.st_size]
+    return True
+
+
+def locate(path_index: dict, path: list) -> Optional[tuple[dict, int, list]]:
+    """
+    Find the file that defines the path.
+
+    Returns the entry of the file, the line and the path that was found.
+    If the line of the path itself is not known, for example because the
+    path does not exist, the line of its closest parent within the file
+    is returned.
+    """
+    for entry in reversed(path_index["files"]):
+        relative = relative_path(entry, path)
+        if relative is None:
+            continue
+
+        if refresh_file_lines(path_index, entry):
+            logger.info(f"{entry['file']} changed since the last join.")
+
+        file_lines = entry["lines"]
+        found = len(relative)
+        while found and format_path(relative[:found]) not in file_lines:
+            found -= 1
+        line = file_lines.get(format_path(relative[:found]), 1)
+        return entry, line, path[:len(path) - len(relative) + found]
+    return None
+
+
+def relative_path(entry: dict, path: list) -> Optional[list]:
+    """The path within the file, or None if the file does not contain the path."""
+    kind, origin_path = entry["kind"], entry["path"]
+    n = len(origin_path)
+
+    if kind == "items":
+        if len(path) < n or path[:n - 1] != origin_path[:n - 1]:
+            return None
+        index = path[n - 1]
+        if not isinstance(index, int):
+            return None
+        start = origin_path[-1]
+        if not start <= index < start + entry["count"]:
+            return None
+        return [index - start] + path[n:]
+
+    if path[:n] != origin_path:
+        return None
+    if kind == "keys":
+        if len(path) == n or path[n] not in entry["keys"]:
+            return None
+    return path[n:]
+
+
+def files_within(path_index: dict, path: list) -> Iterator[dict]:
+    """Entries of the files whose content is within the path."""
+    for entry in path_index["files"]:
+        if entry["path"][:len(path)] == path:
+            yield entry
+
+
+def locate_line(path_index: dict, target: Path, line: int) -> Optional[str]:
+    """Path of the key or item at the line of the target, or before it."""
+    target_hash = hash_file(target)
+    target_lines = path_index.get("target_lines")
+    if target_lines is None or target_lines["hash"] != target_hash:
+        logger.debug(f"Reading the lines of {target}")
+        target_lines = {"hash": target_hash, "lines": collect_target_lines(target)}
+        path_index["target_lines"] = target_lines
+
+    starts = [start for start, _ in target_lines["lines"]]
+    i = bisect.bisect_right(starts, line)
+    if i == 0:
+        return None
+    return target_lines["lines"][i - 1][1]
+
+
+def collect_target_lines(target: Path) -> list[list]:
+    """
+    Pairs of a line and the path of the key or item that starts on it.
+
+    The file is read event by event, without constructing anything.
+    """
+    by_line: dict[int, str] = {}
+    with open(target, "r") as f:
+        events = event_parser.parse(f)
+        for event in events:
+            if isinstance(event, DocumentStartEvent):
+                collect_node_lines(events, next(events), [], by_line)
+                break
+    return sorted([line, path] for line, path in by_line.items())
+
+
+def collect_node_lines(events: Iterator, event: Any, path: list, by_line: dict[int, str]) -> None:
+    # The first key or item on a line is the one the line belongs to
+    if isinstance(event, MappingStartEvent):
+        for key_event in events:
+            if isinstance(key_event, MappingEndEvent):
+                return
+            if isinstance(key_event, ScalarEvent):
+                key_path = path + [key_event.value]
+                by_line.setdefault(key_event.start_mark.line + 1, format_path(key_path))
+                collect_node_lines(events, next(events), key_path, by_line)
+            else:
+                # Complex keys cannot be part of a path
+                skip_node(events, key_event)
+                skip_node(events, next(events))
+    elif isinstance(event, SequenceStartEvent):
+        for i, item_event in enumerate(events):
+            if isinstance(item_event, SequenceEndEvent):
+                return
+            item_path = path + [i]
+            by_line.setdefault(item_event.start_mark.line + 1, format_path(item_path))
+            collect_node_lines(events, item_event, item_path, by_line)
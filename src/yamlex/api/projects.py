@@ -0,0 +1,187 @@
+"""
+Run commands in many extension projects at once.
+
+A project is a directory with the usual extension layout: either
+src/source/, or source/ next to extension/. Every project is processed
+with the project directory as the current working directory, so that the
+default paths of the commands resolve within it.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from yamlex.api.exceptions import YamlexError
+from yamlex.api.util import (
+    get_cache_dir_path,
+    get_default_extension_dir_path,
+    get_default_extension_source_dir_path,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Directories that never contain extension projects
+SKIPPED_DIR_NAMES = ["node_modules", "__pycache__", "venv"]
+
+# A task receives its options and returns an exit code and details to print
+Task = Callable[[dict], tuple[int, list[str]]]
+
+
+@dataclass
+class ProjectResult:
+    project: Path
+    # 0 on success, 1 on differences or invalid files, otherwise error code
+    code: int
+    seconds: float
+    details: list[str] = field(default_factory=list)
+
+
+def is_project(path: Path) -> bool:
+    if (path / "src" / "source").is_dir():
+        return True
+    return (path / "source").is_dir() and (path / "extension").is_dir()
+
+
+def discover_projects(root: Path) -> list[Path]:
+    """Find all extension projects within the root directory, sorted by path."""
+    projects: list[Path] = []
+    for dir_name, sub_dir_names, _ in os.walk(root):
+        dir_path = Path(dir_name)
+        if is_project(dir_path):
+            projects.append(dir_path)
+            # Projects are not nested into each other
+            sub_dir_names.clear()
+            continue
+        sub_dir_names[:] = sorted(
+            d for d in sub_dir_names
+            if not (d.startswith(".") or d.startswith("!"))
+            and d not in SKIPPED_DIR_NAMES
+        )
+    return sorted(projects)
+
+
+def run_in_projects(
+    task: Task,
+    projects: list[Path],
+    options: dict,
+    workers: Optional[int] = None,
+) -> list[ProjectResult]:
+    """Run the task in every project on a pool of processes."""
+    workers = min(workers or os.cpu_count() or 1, len(projects))
+
+    # Informational output of many projects at once is unreadable, so
+    # only warnings and errors are shown, unless debugging
+    log_level = logging.root.level
+    if log_level > logging.DEBUG:
+        log_level = max(log_level, logging.WARNING)
+
+    if workers <= 1:
+        return [
+            run_in_project(task, project, options, log_level)
+            for project in projects
+        ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run_in_project, task, project, options, log_level)
+            for project in projects
+        ]
+        return [future.result() for future in futures]
+
+
+def run_in_project(
+    task: Task,
+    project: Path,
+    options: dict,
+    log_level: int,
+) -> ProjectResult:
+    """Run the task within the project directory and measure its time."""
+    saved_level = logging.root.level
+    logging.root.setLevel(log_level)
+    started = time.perf_counter()
+    cwd = os.getcwd()
+    os.chdir(project)
+    try:
+        code, details = task(options)
+    except YamlexError as e:
+        code = e.code
+        name = e.__class__.__name__
+        message = f" {e.args[0]}" if e.args else ""
+        details = [f"Error {code} ({name})!{message}"]
+    except Exception as e:
+        # Unexpected errors of one project must not hide the other results
+        code = 1
+        details = [f"{e.__class__.__name__}: {e}"]
+    finally:
+        os.chdir(cwd)
+        logging.root.setLevel(saved_level)
+
+    return ProjectResult(
+        project=project,
+        code=code,
+        seconds=time.perf_counter() - started,
+        details=details,
+    )
+
+
+def join_task(options: dict) -> tuple[int, list[str]]:
+    from yamlex.api.operations import join
+
+    options = dict(options)
+    source = options.pop("source") or get_default_extension_source_dir_path()
+    target = (
+        options.pop("target")
+        or get_default_extension_dir_path() / "extension.yaml"
+    )
+
+    result = join(source, target, **options)
+    return 0, ["Incrementally updated."] if result.incremental else []
+
+
+def diff_task(options: dict) -> tuple[int, list[str]]:
+    from yamlex.api.operations import diff
+
+    source = options["source"] or get_default_extension_source_dir_path()
+    target = (
+        options["target"]
+        or get_default_extension_dir_path() / "extension.yaml"
+    )
+
+    result = diff(source, target, only=options.get("only"))
+    if not result.changed:
+        return 0, []
+    serialized = json.dumps(result.differences, indent=2, default=str)
+    return 1, serialized.splitlines()
+
+
+def validate_task(options: dict) -> tuple[int, list[str]]:
+    from yamlex.api.mapper import validate_json_schemas_dir
+    from yamlex.api.validator import validate
+
+    source = options["source"] or get_default_extension_source_dir_path()
+    extension_yaml = (
+        options["extension_yaml"]
+        or get_default_extension_dir_path() / "extension.yaml"
+    )
+    validate_json_schemas_dir(options["schema"])
+
+    errors = validate(
+        schema=options["schema"],
+        sources=source,
+        root=options["root"],
+        extension_yaml=extension_yaml,
+        cache_dir_path=get_cache_dir_path(options["root"]),
+        # Projects already run in parallel
+        workers=1,
+        use_cache=options["use_cache"],
+    )
+
+    details: list[str] = []
+    for path, path_errors in errors.items():
+        details.extend(f"{path}: {error}" for error in path_errors)
+    return (1 if errors else 0), details
@@ -0,0 +1,244 @@
+"""
+Look up values by YAML path without loading everything.
+
+Within a source directory, the path is mapped onto the directory layout,
+and only the files that can contain the value are parsed. Within a YAML
+file, the parser events are followed along the path, and everything else
+is skipped without being constructed. Parsing stops as soon as the
+requested values are complete.
+"""
+import logging
+from fnmatch import fnmatchcase
+from io import StringIO
+from itertools import islice
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import ruamel.yaml
+from ruamel.yaml.emitter import Emitter
+from ruamel.yaml.events import (
+    AliasEvent,
+    CollectionEndEvent,
+    CollectionStartEvent,
+    DocumentEndEvent,
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+    StreamEndEvent,
+    StreamStartEvent,
+)
+
+from yamlex.api.joiner import assemble_recursively
+from yamlex.api.selector import Selector, Step, find
+from yamlex.api.snapshot import get_snapshot_path, read_snapshot
+from yamlex.api.util import create_yaml_parser, get_cache_dir_path
+from yamlex.api.exceptions import FailedToParseYamlError, InvalidPath
+
+
+logger = logging.getLogger(__name__)
+parser = create_yaml_parser()
+# Events are read without comments, which cannot be emitted out of context
+event_parser = ruamel.yaml.YAML(typ="safe", pure=True)
+
+
+class AliasOutsideNode(Exception):
+    """A value refers to an anchor defined elsewhere in the file."""
+
+
+def query(
+    path: Path,
+    selector: Selector,
+    first: bool = True,
+    cache: Optional[dict] = None,
+) -> list[Any]:
+    """
+    Return the values at the selector within the file or source directory.
+
+    With first, at most one value is returned and reading stops as soon as
+    it is complete.
+    """
+    if path.is_dir():
+        values = query_source_dir(path, selector, cache)
+    elif path.is_file():
+        values = query_file(path, selector)
+    else:
+        raise InvalidPath(f"{path} must be a directory or a file.")
+
+    # Values are read lazily, so nothing after the first value is read
+    return list(islice(values, 1) if first else values)
+
+
+def query_source_dir(
+    dir_path: Path,
+    selector: Selector,
+    cache: Optional[dict] = None,
+) -> Iterator[Any]:
+    # Not cut down to the selection, since filters need the fields they
+    # check, which the selection does not contain
+    data = assemble_recursively(dir_path, cache=cache, only=[selector], lazy_scalars=True)
+    yield from find(data, selector)
+
+
+def query_file(path: Path, selector: Selector) -> Iterator[Any]:
+    # The snapshot join stored holds what parsing the file gives, and is
+    # used as long as the file is unchanged
+    snapshot = read_snapshot(get_snapshot_path(get_cache_dir_path(Path(".")), path), path)
+    if snapshot is not None:
+        logger.debug(f"Using the snapshot of {path}")
+        yield from find(snapshot, selector)
+        return
+
+    found = 0
+    try:
+        with open(path, "r") as f:
+            events = event_parser.parse(f)
+            for event in events:
+                if isinstance(event, DocumentStartEvent):
+                    for value in match_node(events, next(events), selector):
+                        found += 1
+                        yield value
+                    return
+    except AliasOutsideNode:
+        logger.debug(f"Aliases in {path}, loading it entirely")
+    except ruamel.yaml.YAMLError as e:
+        raise FailedToParseYamlError(f"Failed to parse YAML in {path}: {e}")
+
+    try:
+        with open(path, "r") as f:
+            data = parser.load(f)
+    except Exception as e:
+        raise FailedToParseYamlError(f"Failed to parse YAML in {path}: {e}")
+    # Values found before the alias were already returned
+    yield from islice(find(data, selector), found, None)
+
+
+def is_streamable(step: Step) -> bool:
+    # Negative indexes need the whole sequence
+    if step.kind in ("key", "filter"):
+        return True
+    return step.value is None or step.value >= 0
+
+
+def match_node(events: Iterator, event: Any, selector: Selector) -> Iterator[Any]:
+    """
+    Yield the values at the selector within the node that starts with the event.
+
+    Consumes the events of the node. Only nodes at the end of the path, or
+    where the path cannot be followed event by event, are constructed.
+    """
+    if not selector or not is_streamable(selector[0]):
+        yield from find(construct_node(events, event), selector)
+        return
+
+    step, rest = selector[0], selector[1:]
+    if isinstance(event, AliasEvent):
+        # The anchor is behind us, the file is loaded entirely instead
+        raise AliasOutsideNode()
+    if isinstance(event, MappingStartEvent):
+        for key_event in events:
+            if isinstance(key_event, MappingEndEvent):
+                return
+            if isinstance(key_event, ScalarEvent):
+                key = key_event.value
+            else:
+                key = construct_node(events, key_event)
+            value_event = next(events)
+            if step.matches_key(key):
+                yield from match_node(events, value_event, rest)
+            else:
+                skip_node(events, value_event)
+    elif isinstance(event, SequenceStartEvent) and step.kind == "filter":
+        for item_event in events:
+            if isinstance(item_event, SequenceEndEvent):
+                return
+            # Items are checked by their events, and only matching items
+            # are followed further
+            collected = list(node_events(events, item_event))
+            if matches_filter(collected, step):
+                yield from match_node(iter(collected[1:]), collected[0], rest)
+    elif isinstance(event, SequenceStartEvent):
+        for index, item_event in enumerate(events):
+            if isinstance(item_event, SequenceEndEvent):
+                return
+            if step.matches_item(index, None, None):
+                yield from match_node(events, item_event, rest)
+            else:
+                skip_node(events, item_event)
+    else:
+        skip_node(events, event)
+
+
+def matches_filter(collected: list, step: Step) -> bool:
+    """Whether the events of an item match a filter, by its top level fields."""
+    if isinstance(collected[0], AliasEvent):
+        raise AliasOutsideNode()
+    if not isinstance(collected[0], MappingStartEvent):
+        return False
+    field, pattern = step.value
+    depth = 0
+    expect_key = True
+    for i, event in enumerate(collected[1:-1], start=1):
+        if depth == 0 and expect_key and isinstance(event, ScalarEvent) and event.value == field:
+            value_event = collected[i + 1]
+            if isinstance(value_event, AliasEvent):
+                raise AliasOutsideNode()
+            if not isinstance(value_event, ScalarEvent):
+                return False
+            return fnmatchcase(value_event.value, pattern)
+        if isinstance(event, CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, CollectionEndEvent):
+            depth -= 1
+        if depth == 0:
+            expect_key = not expect_key
+    return False
+
+
+def node_events(events: Iterator, event: Any) -> Iterator[Any]:
+    """Yield the events of the node that starts with the event."""
+    yield event
+    if not isinstance(event, CollectionStartEvent):
+        return
+    depth = 1
+    for event in events:
+        yield event
+        if isinstance(event, CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, CollectionEndEvent):
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def skip_node(events: Iterator, event: Any) -> None:
+    for _ in node_events(events, event):
+        pass
+
+
+def construct_node(events: Iterator, event: Any) -> Any:
+    """Construct the node from its events, with the formatting of its scalars."""
+    collected = list(node_events(events, event))
+
+    aliases = {e.anchor for e in collected if isinstance(e, AliasEvent)}
+    if aliases:
+        anchors = {
+            getattr(e, "anchor", None) for e in collected
+            if not isinstance(e, AliasEvent)
+        }
+        if not aliases <= anchors:
+            raise AliasOutsideNode()
+
+    # The events are written back as YAML text, which keeps the style of
+    # the scalars, and loaded like any other YAML
+    stream = StringIO()
+    emitter = Emitter(stream)
+    emitter.emit(StreamStartEvent())
+    emitter.emit(DocumentStartEvent(explicit=False))
+    for e in collected:
+        emitter.emit(e)
+    emitter.emit(DocumentEndEvent(explicit=False))
+    emitter.emit(StreamEndEvent())
+    return parser.load(stream.getvalue())
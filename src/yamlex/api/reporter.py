@@ -0,0 +1,94 @@
+"""
+Print the changes found by diff while they are found.
+
+Every reporter writes the changes one by one, so that nothing but the
+counts of the summary is kept in memory, and stops as soon as the changes
+stop coming, for example because of a limit.
+"""
+import json
+import logging
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+from yamlex.api.differ import Change
+from yamlex.api.selector import format_path
+from yamlex.api.util import format_table
+
+
+logger = logging.getLogger(__name__)
+
+# Values within text lines are cut after this many characters
+MAX_TEXT_VALUE_LENGTH = 80
+
+TEXT_MARKERS = {"added": "+", "removed": "-", "changed": "~"}
+
+
+def report_jsonl(changes: Iterable[Change], out: TextIO) -> int:
+    """One JSON object per change and line."""
+    count = 0
+    for change in changes:
+        out.write(json.dumps(change.as_dict(), default=str) + "\n")
+        count += 1
+    return count
+
+
+def report_text(changes: Iterable[Change], out: TextIO) -> int:
+    """One line per change with its path, such as ~ metrics[3].metadata.unit: Count -> Percent."""
+    count = 0
+    for change in changes:
+        marker = TEXT_MARKERS[change.kind]
+        if change.kind == "changed":
+            value = f"{text_value(change.old)} -> {text_value(change.new)}"
+        elif change.kind == "added":
+            value = text_value(change.new)
+        else:
+            value = text_value(change.old)
+        out.write(f"{marker} {format_path(change.path) or '.'}: {value}\n")
+        count += 1
+    return count
+
+
+def report_summary(changes: Iterable[Change], out: TextIO) -> int:
+    """Number of added, removed and changed values per top-level section."""
+    counts: dict[str, dict[str, int]] = {}
+    count = 0
+    for change in changes:
+        section = str(change.path[0]) if change.path else "."
+        section_counts = counts.setdefault(section, {kind: 0 for kind in TEXT_MARKERS})
+        section_counts[change.kind] += 1
+        count += 1
+
+    if counts:
+        rows = [("Section", *TEXT_MARKERS)]
+        for section, section_counts in sorted(counts.items()):
+            rows.append((section, *(str(section_counts[k]) for k in TEXT_MARKERS)))
+        rows.append((
+            "total",
+            *(str(sum(c[k] for c in counts.values())) for k in TEXT_MARKERS),
+        ))
+        for line in format_table(rows):
+            out.write(line + "\n")
+    return count
+
+
+# Reporters by format. Every reporter returns the number of changes.
+REPORTERS: dict[str, Callable[[Iterable[Change], TextIO], int]] = {
+    "jsonl": report_jsonl,
+    "text": report_text,
+    "summary": report_summary,
+}
+
+
+def limit_changes(changes: Iterator[Change], max_changes: int) -> Iterator[Change]:
+    """Stop after the first max_changes changes, without looking for the rest."""
+    for count, change in enumerate(changes, start=1):
+        yield change
+        if count >= max_changes:
+            logger.warning(f"Stopped after {max_changes} changes, there may be more.")
+            return
+
+
+def text_value(value: Any) -> str:
+    text = json.dumps(value, default=str, ensure_ascii=False)
+    if len(text) > MAX_TEXT_VALUE_LENGTH:
+        return text[:MAX_TEXT_VALUE_LENGTH - 3] + "..."
+    return text
@@ -0,0 +1,417 @@
+"""
+Split an edited extension.yaml into the existing source directory.
+
+Unlike split_yaml, which always writes the same opinionated layout, this
+keeps the files of the source directory. The directory is assembled to
+learn which file holds which part of the extension, see record_origin,
+and every file gets the same part of the edited extension. Only files
+whose data changed are written, keeping their comments where the data
+did not change.
+
+Array items are matched by their identity, such as the key of a metric
+or the entityType of a screen, rather than by their position, so that
+an added or removed item does not move the items of other files. Keys
+and items that no file holds yet are added to the index or grouper file
+of their level, or written to new files.
+"""
+import logging
+import re
+from collections import deque
+from collections.abc import Mapping, MutableMapping, MutableSequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from ruamel.yaml.comments import CommentedMap
+from ruamel.yaml.util import load_yaml_guess_indent
+
+from yamlex.api.joiner import assemble_recursively
+from yamlex.api.memory import phase, record_sections
+from yamlex.api.scalars import ScalarFile
+from yamlex.api.selector import MISSING, format_path
+from yamlex.api.util import (
+    copy_without_comments,
+    create_yaml_parser,
+    sanitize_file_stem,
+    indent,
+)
+from yamlex.api.exceptions import (
+    FailedToParseYamlError,
+    IncompatibleLayout,
+    WrongExtensionStructureError,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Fields that tell array items apart, in the order they are looked for
+IDENTITY_KEYS = ("key", "entityType", "group", "subgroup", "name", "id")
+# Relationships are told apart by all of these fields together
+RELATIONSHIP_KEYS = ("fromType", "typeOfRelation", "toType")
+# Keys that can be the name of a file of their own
+PLAIN_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.]*$")
+
+
+@dataclass
+class Resplit:
+    # New data of every file that changed or is added, text for scalar files
+    changed: dict[Path, Any] = field(default_factory=dict)
+    # Files whose content was removed from the extension
+    removed: list[Path] = field(default_factory=list)
+    # Number of files that stay as they are
+    unchanged: int = 0
+    # Indentation of the sequences of changed files, see load_file_to_update
+    sequence_indents: dict[Path, tuple[int, int]] = field(default_factory=dict)
+
+
+def resplit_yaml(
+    source_file_path: Path,
+    target_dir_path: Path,
+    cache: Optional[dict] = None,
+) -> Resplit:
+    """
+    Find the files of the source directory that change with the edited YAML file.
+
+    If cache is given, the files of the directory that did not change since
+    they were cached are not parsed again.
+    """
+    logger.info(f"Splitting the central YAML file into the existing parts: {source_file_path}")
+    try:
+        with phase("parse"), open(source_file_path, "r") as extension_yaml_file:
+            extension = create_yaml_parser().load(extension_yaml_file)
+    except Exception as e:
+        raise FailedToParseYamlError(e)
+    record_sections(extension)
+
+    origins: dict[Path, dict] = {}
+    with phase("merge"):
+        assembled = assemble_recursively(
+            target_dir_path,
+            origins=origins,
+            cache=cache,
+            lazy_scalars=True,
+        )
+    if not isinstance(extension, Mapping) or not isinstance(assembled, Mapping):
+        raise WrongExtensionStructureError((
+            "Error! Both the extension and the assembled source directory "
+            "must be objects."
+        ))
+
+    with phase("split"):
+        return LayoutSplitter(assembled, extension, origins, target_dir_path).split()
+
+
+class LayoutSplitter:
+    """Distribute the edited extension over the files the assembled one came from."""
+
+    def __init__(
+        self,
+        assembled: Mapping,
+        extension: Mapping,
+        origins: dict[Path, dict],
+        target_dir_path: Path,
+    ):
+        self.old = assembled
+        self.new = extension
+        self.origins = origins
+        # Matched items of every array, by its path within the assembled data
+        self.matches: dict[tuple, tuple[dict[int, int], list[int]]] = {}
+        # Directory of every level of the data, where its new files go
+        self.dirs: dict[tuple, Path] = {(): target_dir_path}
+        # Index or grouper file that takes the keys or items added to a level
+        self.homes: dict[tuple, Path] = {}
+        # New content of every file, MISSING if it was removed
+        self.contents: dict[Path, Any] = {}
+
+    def split(self) -> Resplit:
+        for file_path, origin in self.origins.items():
+            self.contents[file_path] = self.take(file_path, origin)
+        self.add_parent_dirs()
+        added = self.place_additions()
+
+        result = Resplit()
+        for file_path, origin in self.origins.items():
+            content = self.contents[file_path]
+            old = self.old_content(origin)
+            if content is MISSING or (origin["kind"] != "value" and not content):
+                logger.info(f"{indent(1)}Removed: {file_path}")
+                result.removed.append(file_path)
+            elif isinstance(old, ScalarFile):
+                if not isinstance(content, str):
+                    raise IncompatibleLayout(
+                        f"{file_path} holds text, but the extension has {type(content).__name__} "
+                        f"at {format_path(origin['path'])}."
+                    )
+                if old.text() != content:
+                    logger.info(f"{indent(1)}Changed: {file_path}")
+                    result.changed[file_path] = str(content)
+                else:
+                    result.unchanged += 1
+            elif copy_without_comments(old) != copy_without_comments(content):
+                logger.info(f"{indent(1)}Changed: {file_path}")
+                data, sequence_indent = load_file_to_update(file_path)
+                result.changed[file_path] = merge_values(data, content)
+                if sequence_indent is not None:
+                    result.sequence_indents[file_path] = sequence_indent
+            else:
+                result.unchanged += 1
+
+        for file_path, content in added.items():
+            logger.info(f"{indent(1)}Added: {file_path}")
+            result.changed[file_path] = copy_without_comments(content)
+        return result
+
+    def take(self, file_path: Path, origin: dict) -> Any:
+        """The part of the edited extension the file holds, see record_origin."""
+        kind, path = origin["kind"], origin["path"]
+        if kind == "value":
+            self.dirs.setdefault(tuple(path[:-1]), file_path.parent)
+            return self.locate(path)
+
+        if kind == "keys":
+            level = tuple(path)
+            self.dirs.setdefault(level, file_path.parent)
+            if level not in self.homes or file_path.stem in ("index", "+index"):
+                self.homes[level] = file_path
+            mapping = self.locate(path)
+            if not isinstance(mapping, Mapping):
+                return MISSING
+            return {k: mapping[k] for k in origin["keys"] if k in mapping}
+
+        # Items, the last file of the level takes the added ones
+        level = tuple(path[:-1])
+        self.dirs.setdefault(level, file_path.parent)
+        self.homes[level] = file_path
+        items = self.locate(path[:-1])
+        if not isinstance(items, list):
+            return MISSING
+        matches, _ = self.match(level, get_value(self.old, level), items)
+        start = path[-1]
+        return [items[matches[i]] for i in range(start, start + origin["count"]) if i in matches]
+
+    def old_content(self, origin: dict) -> Any:
+        """The part of the assembled extension the file holds."""
+        kind, path = origin["kind"], origin["path"]
+        if kind == "value":
+            return get_value(self.old, path)
+        if kind == "keys":
+            mapping = get_value(self.old, path)
+            return {k: mapping[k] for k in origin["keys"]}
+        start = path[-1]
+        return get_value(self.old, path[:-1])[start:start + origin["count"]]
+
+    def locate(self, path: list) -> Any:
+        """Value of the edited extension at a path of the assembled one, MISSING if it was removed."""
+        old, new = self.old, self.new
+        for n, step in enumerate(path):
+            if isinstance(step, int):
+                if not isinstance(new, list):
+                    return MISSING
+                j = self.match(tuple(path[:n]), old, new)[0].get(step)
+                if j is None:
+                    return MISSING
+                old, new = old[step], new[j]
+            else:
+                if not isinstance(new, Mapping) or step not in new:
+                    return MISSING
+                old, new = old[step], new[step]
+        return new
+
+    def match(self, level: tuple, old: list, new: list) -> tuple[dict[int, int], list[int]]:
+        matches = self.matches.get(level)
+        if matches is None:
+            matches = self.matches[level] = match_items(old, new)
+        return matches
+
+    def add_parent_dirs(self) -> None:
+        """Find the directories of the levels that only hold directories."""
+        for level, dir_path in list(self.dirs.items()):
+            while level:
+                step = level[-1]
+                if isinstance(step, int) and not dir_path.name.startswith("-"):
+                    break
+                if isinstance(step, str) and dir_path.name != step:
+                    break
+                level, dir_path = level[:-1], dir_path.parent
+                self.dirs.setdefault(level, dir_path)
+
+    def place_additions(self) -> dict[Path, Any]:
+        """Add new keys and items to the files of their level. Returns the new files."""
+        added: dict[Path, Any] = {}
+        for level, dir_path in self.dirs.items():
+            old = get_value(self.old, level)
+            new = self.locate(list(level))
+            if new is MISSING:
+                continue
+            home = self.homes.get(level)
+
+            if isinstance(old, Mapping) and isinstance(new, Mapping):
+                additions = {k: new[k] for k in new if k not in old}
+                if not additions:
+                    continue
+                if home is not None:
+                    self.contents[home].update(additions)
+                    continue
+                for key, value in additions.items():
+                    file_path = dir_path / f"{key}.yaml"
+                    if (
+                        isinstance(key, str)
+                        and key != "index"
+                        and PLAIN_KEY_PATTERN.match(key)
+                        and not file_path.exists()
+                    ):
+                        added[file_path] = value
+                    else:
+                        # Any key fits into a grouper
+                        file_path = free_file_path(dir_path, f"+{sanitize_file_stem(str(key))}", added)
+                        added[file_path] = {key: value}
+
+            elif isinstance(old, list) and isinstance(new, list):
+                _, unmatched = self.match(level, old, new)
+                if not unmatched:
+                    continue
+                if home is not None:
+                    self.contents[home].extend(new[j] for j in unmatched)
+                    continue
+                for j in unmatched:
+                    stem = sanitize_file_stem(item_name(new[j]) or f"item_{j}")
+                    added[free_file_path(dir_path, f"-{stem}", added)] = new[j]
+
+            else:
+                raise IncompatibleLayout((
+                    f"{format_path(list(level)) or 'The extension'} is "
+                    f"{'an array' if isinstance(new, list) else 'not an array'} in the "
+                    f"edited extension, unlike in {dir_path}. Split without "
+                    "--keep-layout instead."
+                ))
+        return added
+
+
+def get_value(data: Any, path: Any) -> Any:
+    for step in path:
+        data = data[step]
+    return data
+
+
+def item_identity(item: Any) -> Optional[tuple]:
+    """What tells the array item apart from the others, None if nothing does."""
+    if isinstance(item, Mapping):
+        if all(k in item for k in RELATIONSHIP_KEYS):
+            return tuple(str(item[k]) for k in RELATIONSHIP_KEYS)
+        for key in IDENTITY_KEYS:
+            value = item.get(key)
+            if isinstance(value, str):
+                return (key, value)
+        return None
+    if isinstance(item, (str, int, float)):
+        return ("", item)
+    return None
+
+
+def item_name(item: Any) -> Optional[str]:
+    """Name of the file for a new array item, such as the key of a metric."""
+    identity = item_identity(item)
+    if identity is None:
+        return None
+    if len(identity) == len(RELATIONSHIP_KEYS):
+        return "_".join(identity)
+    return str(identity[1])
+
+
+def match_items(old_items: list, new_items: list) -> tuple[dict[int, int], list[int]]:
+    """
+    Match the items of an array to the edited items.
+
+    Items with an identity are matched by it, the others by their order.
+    Returns the index of the edited item for every matched item, and the
+    indexes of the edited items that match none.
+    """
+    identified: dict[tuple, deque] = {}
+    anonymous: deque = deque()
+    for j, item in enumerate(new_items):
+        identity = item_identity(item)
+        if identity is None:
+            anonymous.append(j)
+        else:
+            identified.setdefault(identity, deque()).append(j)
+
+    matches: dict[int, int] = {}
+    for i, item in enumerate(old_items):
+        identity = item_identity(item)
+        candidates = anonymous if identity is None else identified.get(identity)
+        if candidates:
+            matches[i] = candidates.popleft()
+
+    matched = set(matches.values())
+    return matches, [j for j in range(len(new_items)) if j not in matched]
+
+
+def merge_values(old: Any, new: Any) -> Any:
+    """
+    The new value, made from the old one where possible.
+
+    Mappings and arrays are updated in place, so that the comments and
+    styles of what did not change are kept. New values are added
+    without comments.
+    """
+    if isinstance(old, MutableMapping) and isinstance(new, Mapping):
+        for key in [k for k in old if k not in new]:
+            del old[key]
+        for position, (key, value) in enumerate(new.items()):
+            if key in old:
+                old[key] = merge_values(old[key], value)
+            elif isinstance(old, CommentedMap):
+                old.insert(position, key, copy_without_comments(value))
+            else:
+                old[key] = copy_without_comments(value)
+        return old
+
+    if isinstance(old, MutableSequence) and isinstance(new, list):
+        matches, _ = match_items(old, new)
+        old_indexes = {j: i for i, j in matches.items()}
+        old[:] = [
+            merge_values(old[old_indexes[j]], item) if j in old_indexes
+            else copy_without_comments(item)
+            for j, item in enumerate(new)
+        ]
+        return old
+
+    # Strings of the file keep their quotes, which the edited extension
+    # only has where they are needed
+    if old == new and (type(old) is type(new) or type(new) is str and isinstance(old, str)):
+        return old
+    return copy_without_comments(new)
+
+
+def load_file_to_update(file_path: Path) -> tuple[Any, Optional[tuple[int, int]]]:
+    """
+    Parse a file that is written again, keeping the quotes of its strings.
+
+    Also returns the indentation of its sequences, the column of the items
+    and of the dashes as in dump_yaml, None if the file has no sequences.
+    """
+    try:
+        with phase("parse"):
+            data, sequence, offset = load_yaml_guess_indent(
+                file_path.read_text(),
+                yaml=create_yaml_parser(preserve_quotes=True),
+            )
+    except Exception as e:
+        raise FailedToParseYamlError(
+            f"Failed to parse {file_path} in {file_path.parent}. "
+            "Please make sure the YAML syntax is correct. "
+            f"The exact parsing error is: {e}"
+        )
+    if offset is None:
+        return data, None
+    return data, (sequence, offset)
+
+
+def free_file_path(dir_path: Path, stem: str, taken: dict[Path, Any]) -> Path:
+    """Path of a new YAML file with the stem, numbered if the name is taken."""
+    file_path = dir_path / f"{stem}.yaml"
+    number = 2
+    while file_path.exists() or file_path in taken:
+        file_path = dir_path / f"{stem}_{number}.yaml"
+        number += 1
+    return file_path
@@ -0,0 +1,246 @@
+"""
+Lazily loaded scalar files, such as SQL queries or descriptions.
+
+When assembling, non-YAML files are only checked to be text, by looking
+at their first few kilobytes. Their content is read when the assembled
+extension is written, or when diff cannot tell by the hash of the file
+whether it equals the value it is compared to.
+"""
+import codecs
+import hashlib
+import locale
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from ruamel.yaml.comments import CommentedBase
+from ruamel.yaml.representer import RoundTripRepresenter
+from ruamel.yaml.scalarstring import FoldedScalarString
+
+from yamlex.api.exceptions import NonTextFileError
+from yamlex.api.tree import FrozenMap
+
+
+SNIFF_SIZE = 8192
+CHUNK_SIZE = 65536
+
+
+class ScalarFile:
+    """Content of a scalar file, represented by its path until needed."""
+
+    __slots__ = ("path", "size", "keep_formatting", "_digest", "_plain")
+
+    def __init__(self, path: Path, size: int, keep_formatting: bool = True) -> None:
+        self.path = path
+        self.size = size
+        self.keep_formatting = keep_formatting
+        # SHA-256 of the raw bytes, computed on first use
+        self._digest: Optional[str] = None
+        # Whether the raw bytes are the encoded text, without '\r' that
+        # reading in text mode would translate
+        self._plain = False
+
+    def __repr__(self) -> str:
+        return f"ScalarFile({self.path})"
+
+    def __str__(self) -> str:
+        return self.text()
+
+    def text(self) -> str:
+        with open(self.path, "r") as scalar_file:
+            try:
+                return scalar_file.read()
+            except UnicodeDecodeError:
+                raise non_text_file_error(self.path)
+
+    def to_scalar(self) -> Union[str, FoldedScalarString]:
+        return self.wrap(self.text())
+
+    def wrap(self, text: str) -> Union[str, FoldedScalarString]:
+        """Turn text equal to the content into the scalar the file stands for."""
+        return FoldedScalarString(text) if self.keep_formatting else str(text)
+
+    def digest(self) -> str:
+        if self._digest is None:
+            digest = hashlib.sha256()
+            plain = True
+            with open(self.path, "rb") as scalar_file:
+                for chunk in iter(lambda: scalar_file.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    plain = plain and b"\r" not in chunk
+            self._digest = digest.hexdigest()
+            self._plain = plain
+        return self._digest
+
+    def same_as_file(self, other: "ScalarFile") -> bool:
+        return self.size == other.size and self.digest() == other.digest()
+
+    def same_as_text(self, text: str) -> Optional[bool]:
+        """
+        Compare the file to the text without reading it.
+
+        Returns None if the hash cannot tell, because the file contains
+        '\\r' or the text cannot be encoded like the file.
+        """
+        try:
+            encoded = text.encode(text_encoding())
+        except UnicodeEncodeError:
+            return None
+        if len(encoded) != self.size:
+            return False
+        digest = self.digest()
+        if not self._plain:
+            return None
+        return hashlib.sha256(encoded).hexdigest() == digest
+
+
+def text_encoding() -> str:
+    # The encoding open() uses for text files by default
+    return locale.getpreferredencoding(False)
+
+
+def non_text_file_error(path: Path) -> NonTextFileError:
+    return NonTextFileError((
+        f"Non-text file {path} found in {path.parent}. "
+        "Only plain text files and folders can be read by "
+        "yamlex. To ignore the file, prefix it with an "
+        f"exclamation mark like so: !{path.stem}."
+    ))
+
+
+def sniff_scalar_file(path: Path, keep_formatting: bool = True) -> ScalarFile:
+    """Check that the file looks like text, reading only its beginning."""
+    with open(path, "rb") as scalar_file:
+        size = os.fstat(scalar_file.fileno()).st_size
+        head = scalar_file.read(SNIFF_SIZE)
+
+    decoder = codecs.getincrementaldecoder(text_encoding())()
+    try:
+        # Not final, a multibyte character may be cut off at the end
+        decoder.decode(head, final=len(head) < SNIFF_SIZE)
+    except UnicodeDecodeError:
+        raise non_text_file_error(path)
+    if b"\0" in head:
+        raise non_text_file_error(path)
+
+    return ScalarFile(path, size, keep_formatting=keep_formatting)
+
+
+def represent_scalar_file(representer: RoundTripRepresenter, data: ScalarFile) -> Any:
+    return representer.represent_data(data.to_scalar())
+
+
+RoundTripRepresenter.add_representer(ScalarFile, represent_scalar_file)
+
+
+def materialize(data: Any) -> Any:
+    """Replace all scalar files within the data with their content."""
+    if isinstance(data, ScalarFile):
+        return data.to_scalar()
+    if isinstance(data, Mapping):
+        return with_values(data, [materialize(v) for v in data.values()])
+    if isinstance(data, (list, tuple)):
+        return with_values(data, [materialize(v) for v in data])
+    return data
+
+
+def materialized(data: Any) -> Any:
+    """
+    The data with all scalar files replaced by their content.
+
+    Unlike materialize, nothing is changed in place, since assembled data
+    may be shared with the cache. Only the mappings and sequences that hold
+    scalar files are copied.
+    """
+    if isinstance(data, ScalarFile):
+        return data.to_scalar()
+    if isinstance(data, Mapping):
+        old_values = list(data.values())
+    elif isinstance(data, (list, tuple)):
+        old_values = data
+    else:
+        return data
+    values = [materialized(v) for v in old_values]
+    if all(old is new for old, new in zip(old_values, values)):
+        return data
+    if isinstance(data, (dict, list)):
+        copied = type(data)(data)
+        if isinstance(data, CommentedBase):
+            data.copy_attributes(copied)
+        data = copied
+    return with_values(data, values)
+
+
+def with_values(data: Any, values: list) -> Any:
+    """
+    Put the values into the mapping or sequence, in the order of its items.
+
+    Dicts and lists are changed in place. Frozen trees are shared, so a new
+    one is made, unless all values are the same.
+    """
+    if isinstance(data, (dict, list)):
+        keys = list(data) if isinstance(data, dict) else range(len(data))
+        for key, value in zip(keys, values):
+            data[key] = value
+        return data
+
+    old_values = data.values() if isinstance(data, Mapping) else data
+    if all(old is new for old, new in zip(old_values, values)):
+        return data
+    if isinstance(data, FrozenMap):
+        return FrozenMap(tuple(data), tuple(values))
+    return tuple(values)
+
+
+def resolve_scalar_files(source: Any, target: Any) -> tuple[Any, Any]:
+    """
+    Replace scalar files within both data objects with comparable values.
+
+    Walks both objects together. Where a scalar file meets another scalar
+    file or a text at the same place, they are compared by hash first, and
+    equal ones are replaced without reading the file. All other scalar
+    files are replaced with their content.
+    """
+    if isinstance(source, ScalarFile) or isinstance(target, ScalarFile):
+        return resolve_scalar_pair(source, target)
+
+    if isinstance(source, Mapping) and isinstance(target, Mapping):
+        source_values = []
+        resolved: dict = {}
+        for key, value in source.items():
+            if key in target:
+                value, resolved[key] = resolve_scalar_files(value, target[key])
+            else:
+                value = materialize(value)
+            source_values.append(value)
+        target_values = [
+            resolved[key] if key in resolved else materialize(value)
+            for key, value in target.items()
+        ]
+        return with_values(source, source_values), with_values(target, target_values)
+
+    if isinstance(source, (list, tuple)) and isinstance(target, (list, tuple)):
+        pairs = [resolve_scalar_files(s, t) for s, t in zip(source, target)]
+        common = len(pairs)
+        source_values = [s for s, _ in pairs] + [materialize(v) for v in source[common:]]
+        target_values = [t for _, t in pairs] + [materialize(v) for v in target[common:]]
+        return with_values(source, source_values), with_values(target, target_values)
+
+    # Whatever has no counterpart cannot be compared by hash
+    return materialize(source), materialize(target)
+
+
+def resolve_scalar_pair(source: Any, target: Any) -> tuple[Any, Any]:
+    if isinstance(source, ScalarFile) and isinstance(target, ScalarFile):
+        if source.keep_formatting == target.keep_formatting and source.same_as_file(target):
+            # Equal files compare equal without being read
+            token = f"sha256:{source.digest()}"
+            return token, token
+    elif isinstance(source, ScalarFile) and isinstance(target, str):
+        if source.same_as_text(target):
+            return source.wrap(target), target
+    elif isinstance(target, ScalarFile) and isinstance(source, str):
+        if target.same_as_text(source):
+            return source, target.wrap(source)
+    return materialize(source), materialize(target)
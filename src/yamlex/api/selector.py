@@ -0,0 +1,256 @@
+"""
+Select parts of an extension with YAML path expressions.
+
+An expression is a dot-separated list of keys, each optionally followed by
+indexes in square brackets, for example 'screens', 'topology.types' or
+'snmp[*].subgroups'. Keys may contain the wildcards '*' and '?', and can be
+quoted to contain dots: 'vars."my.var"'. An index is either a number,
+negative numbers counting from the end, or '*' for all items. A filter
+such as 'metrics[key=com.foo.cpu]' selects the items whose field has the
+value, which may contain wildcards as well.
+
+Expressions are also mapped onto the layout of a source directory, so that
+only the files that can contribute to the selected parts are parsed.
+"""
+import re
+from collections.abc import Mapping
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Any, Iterator, Optional, Union
+
+from yamlex.api.exceptions import InvalidSelector
+from yamlex.api.tree import freeze
+
+
+@dataclass(frozen=True)
+class Step:
+    # "key", "index" or "filter"
+    kind: str
+    # Key pattern, or index. None stands for all items. For filters, the
+    # field and the pattern of its value.
+    value: Union[str, int, tuple[str, str], None]
+
+    def matches_key(self, key: Any) -> bool:
+        return self.kind == "key" and fnmatchcase(str(key), self.value)
+
+    def matches_item(self, index: int, length: Optional[int], item: Any) -> bool:
+        """Whether the item of a sequence matches. Length is needed for negative indexes."""
+        if self.kind == "filter":
+            field, pattern = self.value
+            return (
+                isinstance(item, Mapping)
+                and field in item
+                and fnmatchcase(str(item[field]), pattern)
+            )
+        if self.kind != "index":
+            return False
+        if self.value is None:
+            return True
+        return index == (self.value if self.value >= 0 else length + self.value)
+
+
+# A selector is the list of steps of one expression
+Selector = tuple[Step, ...]
+
+KEY_PATTERN = re.compile(r'"([^"]*)"|\'([^\']*)\'|([^.\[\]"\']+)')
+INDEX_PATTERN = re.compile(r"\[\s*(\*|-?\d+)\s*\]")
+# Keys that can be written without quotes
+PLAIN_KEY_PATTERN = re.compile(r"[^.\[\]\"'*?\s]|[^.\[\]\"'*?\s][^.\[\]\"'*?]*[^.\[\]\"'*?\s]")
+FILTER_PATTERN = re.compile(
+    r"\[\s*([^=\]\s]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\]]*?))\s*\]"
+)
+
+
+def parse_selector(expression: str) -> Selector:
+    steps: list[Step] = []
+    position = 0
+    length = len(expression)
+    while position < length:
+        if steps and expression[position] == ".":
+            position += 1
+        match = KEY_PATTERN.match(expression, position)
+        if match:
+            key = next(g for g in match.groups() if g is not None)
+            steps.append(Step("key", key))
+            position = match.end()
+        elif expression[position] != "[":
+            raise invalid_selector(expression, position)
+
+        while position < length and expression[position] == "[":
+            match = INDEX_PATTERN.match(expression, position)
+            if match:
+                index = match.group(1)
+                steps.append(Step("index", None if index == "*" else int(index)))
+                position = match.end()
+                continue
+            match = FILTER_PATTERN.match(expression, position)
+            if match is None:
+                raise invalid_selector(expression, position)
+            field = match.group(1)
+            value = next(g for g in match.groups()[1:] if g is not None)
+            steps.append(Step("filter", (field, value)))
+            position = match.end()
+
+        if position < length and expression[position] != ".":
+            raise invalid_selector(expression, position)
+        if position == length - 1:
+            raise invalid_selector(expression, position)
+
+    if not steps:
+        raise InvalidSelector("An empty selector selects nothing.")
+    return tuple(steps)
+
+
+def parse_selectors(expressions: list[str]) -> list[Selector]:
+    return [parse_selector(expression) for expression in expressions]
+
+
+def invalid_selector(expression: str, position: int) -> InvalidSelector:
+    return InvalidSelector(
+        f"Invalid selector {expression!r} at position {position + 1}. "
+        "Use keys separated by dots and indexes or filters in brackets, "
+        "for example snmp[*].subgroups or metrics[key=com.foo.cpu]."
+    )
+
+
+def format_path(path: list) -> str:
+    """
+    Write a concrete path of keys and indexes as an expression.
+
+    Keys that would be read differently, such as keys with dots or
+    wildcards, are quoted. The empty path is the empty string.
+    """
+    parts: list[str] = []
+    for step in path:
+        if isinstance(step, int):
+            parts.append(f"[{step}]")
+            continue
+        key = step if PLAIN_KEY_PATTERN.fullmatch(step) else (
+            f"'{step}'" if '"' in step else f'"{step}"'
+        )
+        parts.append(f".{key}" if parts else key)
+    return "".join(parts)
+
+
+def narrow_to_entry(selectors: list[Selector], name: str) -> Optional[list[Selector]]:
+    """
+    Selectors within an entry of a source directory.
+
+    Groupers ('+') and index files contribute to the level of their
+    directory, so the selectors stay the same. Array items ('-') contribute
+    to indexes and filters, and plain names to keys. Within an item, the
+    field of a filter is selected as well, so that the filter can be
+    checked after assembling.
+
+    Returns None if the entry cannot contribute to any selector, and an
+    empty list if everything within the entry is selected.
+    """
+    if name.startswith("+") or name == "index":
+        return selectors
+
+    if name.startswith("-"):
+        # The position of an item is only known after assembling, so
+        # every item may match an index
+        rest = [s[1:] for s in selectors if s[0].kind in ("index", "filter")]
+        rest.extend(
+            (Step("key", s[0].value[0]),)
+            for s in selectors if s[0].kind == "filter"
+        )
+    else:
+        rest = [s[1:] for s in selectors if s[0].matches_key(name)]
+
+    if not rest:
+        return None
+    if any(not s for s in rest):
+        return []
+    return rest
+
+
+# Returned by select when nothing within the data is selected
+MISSING = object()
+
+
+def select(data: Any, selectors: list[Selector]) -> Any:
+    """
+    Keep only the selected parts of the data, within their parents.
+
+    Returns MISSING if nothing is selected.
+    """
+    if any(not s for s in selectors):
+        return data
+
+    if isinstance(data, Mapping):
+        # Same type, so that ruamel maps keep their formatting on output,
+        # and frozen trees stay frozen
+        result = type(data)() if isinstance(data, dict) else {}
+        for key, value in data.items():
+            rest = [s[1:] for s in selectors if s[0].matches_key(key)]
+            if rest:
+                selected = select(value, rest)
+                if selected is not MISSING:
+                    result[key] = selected
+        if not result:
+            return MISSING
+        return result if isinstance(data, dict) else freeze(result)
+
+    if isinstance(data, (list, tuple)):
+        result = type(data)() if isinstance(data, list) else []
+        for i, item in enumerate(data):
+            rest = [s[1:] for s in selectors if s[0].matches_item(i, len(data), item)]
+            if rest:
+                selected = select(item, rest)
+                if selected is not MISSING:
+                    result.append(selected)
+        if not result:
+            return MISSING
+        return result if isinstance(data, list) else tuple(result)
+
+    return MISSING
+
+
+def find(data: Any, selector: Selector) -> Iterator[Any]:
+    """Yield every value at the path, in the order of the data."""
+    if not selector:
+        yield data
+        return
+
+    step, rest = selector[0], selector[1:]
+    if isinstance(data, Mapping):
+        for key, value in data.items():
+            if step.matches_key(key):
+                yield from find(value, rest)
+    elif isinstance(data, (list, tuple)):
+        for i, item in enumerate(data):
+            if step.matches_item(i, len(data), item):
+                yield from find(item, rest)
+
+
+def find_paths(data: Any, selector: Selector, path: tuple = ()) -> Iterator[list]:
+    """Yield the concrete path of every value at the selector, like find."""
+    if not selector:
+        yield list(path)
+        return
+
+    step, rest = selector[0], selector[1:]
+    if isinstance(data, Mapping):
+        for key, value in data.items():
+            if step.matches_key(key):
+                yield from find_paths(value, rest, path + (str(key),))
+    elif isinstance(data, (list, tuple)):
+        for i, item in enumerate(data):
+            if step.matches_item(i, len(data), item):
+                yield from find_paths(item, rest, path + (i,))
+
+
+def is_concrete(selector: Selector) -> bool:
+    """Whether the selector is a single path, without wildcards, filters or negative indexes."""
+    return all(
+        (step.kind == "key" and not any(c in step.value for c in "*?["))
+        or (step.kind == "index" and step.value is not None and step.value >= 0)
+        for step in selector
+    )
+
+
+def to_path(selector: Selector) -> list:
+    """Keys and indexes of a concrete selector."""
+    return [step.value for step in selector]
@@ -0,0 +1,165 @@
+"""
+Snapshots of assembled extensions, so that diff does not parse them again.
+
+When join writes extension.yaml, it also stores the data that parsing the
+written file gives, without comments. The snapshot is keyed by the hash of
+the written file and is only used while the file stays the same.
+
+Plain strings without unicode line breaks, integers, booleans and nulls
+read back as they were written, so such data is stored as it is. Anything
+else, such as block scalars, whose folding can change the text, or floats,
+would have to be read back from the written file, which takes as long as
+the join itself. For such data, join only stores the hash of the file, and
+the first diff that parses the file completes the snapshot.
+
+The hash is kept in a JSON header before the data, and the data is only
+unpickled if the hash matches. Unpickling is restricted to the types that
+parsing YAML gives, so that a snapshot from elsewhere cannot run code.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import pickle
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Optional
+
+from yamlex.api.tree import FrozenMap, freeze, to_builtins
+from yamlex.api.util import hash_file, indent
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS_DIR_NAME = "snapshots"
+SNAPSHOT_VERSION = 3
+# Values that parse back into the same value
+PLAIN_TYPES = (str, int, bool, type(None))
+# Unicode line breaks, which YAML reads back as plain line breaks or spaces
+UNICODE_LINE_BREAKS = ("\x85", "\u2028", "\u2029")
+# Classes that snapshots may contain, besides the builtin types
+SNAPSHOT_CLASSES = {
+    ("yamlex.api.tree", "FrozenMap"): FrozenMap,
+}
+# Modules of the scalar types parsing YAML gives, such as ScalarFloat
+SCALAR_MODULES = (
+    "datetime",
+    "ruamel.yaml.scalarbool",
+    "ruamel.yaml.scalarfloat",
+    "ruamel.yaml.scalarint",
+    "ruamel.yaml.scalarstring",
+    "ruamel.yaml.timestamp",
+)
+SCALAR_BASES = (
+    str,
+    int,
+    float,
+    bytes,
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+    datetime.tzinfo,
+)
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    """Unpickler that only creates frozen trees and YAML scalars."""
+
+    def find_class(self, module: str, name: str) -> Any:
+        cls = SNAPSHOT_CLASSES.get((module, name))
+        if cls is not None:
+            return cls
+        if module in SCALAR_MODULES:
+            cls = super().find_class(module, name)
+            if isinstance(cls, type) and issubclass(cls, SCALAR_BASES):
+                return cls
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in snapshots")
+
+
+def get_snapshot_path(cache_dir_path: Path, target: Path) -> Path:
+    """Snapshots are kept in the cache directory, one per target file."""
+    key = hashlib.sha256(str(target.resolve()).encode()).hexdigest()[:16]
+    return cache_dir_path / SNAPSHOTS_DIR_NAME / f"{key}.pickle"
+
+
+def write_snapshot(snapshot_path: Path, target: Path, data: Any, parsed: bool = False) -> None:
+    """
+    Store the data of the target file.
+
+    Data join wrote is only stored if it reads back unchanged, otherwise
+    only the hash of the file is, see complete_snapshot. Parsed data is
+    what parsing the file gave.
+    """
+    header = {"version": SNAPSHOT_VERSION, "hash": hash_file(target)}
+    if not parsed and not reads_back_unchanged(data):
+        logger.debug(f"{indent(1)}Leaving the snapshot of {target} to the first diff")
+        data = None
+    header["data"] = data is not None
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(snapshot_path, "wb") as f:
+        f.write(json.dumps(header).encode() + b"\n")
+        if data is not None:
+            pickle.dump(freeze(data), f, protocol=pickle.HIGHEST_PROTOCOL)
+    logger.debug(f"{indent(1)}Snapshot written: {snapshot_path}")
+
+
+def complete_snapshot(snapshot_path: Path, target: Path, data: Any) -> None:
+    """Store the parsed data of the target file, if join left its snapshot to diff."""
+    header = read_header(snapshot_path, target)
+    if header is not None and not header["data"]:
+        write_snapshot(snapshot_path, target, data, parsed=True)
+
+
+def read_snapshot(snapshot_path: Path, target: Path, frozen: bool = False) -> Optional[Any]:
+    """
+    Return the data of the target file, if its snapshot is up to date.
+
+    The data is made of dicts and lists, or with frozen, the frozen tree
+    it is stored as.
+    """
+    header = read_header(snapshot_path, target)
+    if header is None or not header["data"]:
+        return None
+    try:
+        with open(snapshot_path, "rb") as f:
+            f.readline()
+            data = SnapshotUnpickler(f).load()
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable snapshot {snapshot_path}: {e}")
+        return None
+    logger.debug(f"{indent(1)}Using snapshot of {target}")
+    return data if frozen else to_builtins(data)
+
+
+def read_header(snapshot_path: Path, target: Path) -> Optional[dict]:
+    """The header of the snapshot, if it is up to date with the target file."""
+    if not snapshot_path.exists():
+        return None
+    try:
+        with open(snapshot_path, "rb") as f:
+            header = json.loads(f.readline())
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable snapshot {snapshot_path}: {e}")
+        return None
+
+    if not isinstance(header, dict) or header.get("version") != SNAPSHOT_VERSION:
+        return None
+    if header.get("hash") != hash_file(target):
+        logger.debug(f"{indent(1)}Outdated snapshot of {target}")
+        return None
+    return header
+
+
+def reads_back_unchanged(data: Any) -> bool:
+    """Whether parsing the dumped data gives the same data."""
+    if isinstance(data, Mapping):
+        return all(
+            reads_back_unchanged(k) and reads_back_unchanged(v)
+            for k, v in data.items()
+        )
+    if isinstance(data, (list, tuple)):
+        return all(reads_back_unchanged(v) for v in data)
+    if isinstance(data, str) and any(c in data for c in UNICODE_LINE_BREAKS):
+        return False
+    # Subclasses are styled scalars, such as block scalars or ScalarFloat
+    return type(data) in PLAIN_TYPES
@@ -0,0 +1,381 @@
+"""
+Keep an index of a source directory up to date while it is edited.
+
+The index knows every directory and file of the source, the metric keys
+that files define and the metric keys that screens refer to, and the
+problems that stop the source from being assembled. When a file changes,
+only that file is parsed again and only the layout of its directory and
+the directories above it is checked again, instead of assembling the
+whole source.
+
+Layouts are checked with the rules of assemble_recursively: no two
+entries of a directory may have the same key, an array directory may
+only hold dash items and groupers with arrays, and an index file may not
+hold an array. Unlike the assembly, which stops at the first problem,
+the index finds all of them.
+"""
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from ruamel.yaml.comments import CommentedMap, CommentedSeq
+
+from yamlex.api.ignore import IgnoreRules, list_dir_entries, rules_for_dir
+from yamlex.api.linter import referenced_metric_keys
+from yamlex.api.util import create_yaml_parser
+
+
+logger = logging.getLogger(__name__)
+parser = create_yaml_parser()
+
+# Lines after the start of a value that are searched for a name within it,
+# such as a metric key within a multi-line metric selector
+MAX_SEARCH_LINES = 100
+
+
+@dataclass
+class Location:
+    file: Path
+    # Line and columns start at 0
+    line: int
+    start: int
+    end: int
+
+    def contains(self, line: int, column: int) -> bool:
+        return self.line == line and self.start <= column <= self.end
+
+
+@dataclass
+class Problem:
+    file: Path
+    # Name of the error that assembling would raise, or of the lint rule
+    code: str
+    message: str
+    severity: str = "error"
+    line: int = 0
+    start: int = 0
+    end: int = 0
+
+
+@dataclass
+class SourceFile:
+    path: Path
+    # Parsed data, None for scalar files and files that failed to parse
+    data: Any = None
+    # Metric keys the file defines and refers to, with their locations
+    definitions: list[tuple[str, Location]] = field(default_factory=list)
+    references: list[tuple[str, Location]] = field(default_factory=list)
+    # Problems within the file itself, such as a syntax error
+    problems: list[Problem] = field(default_factory=list)
+
+
+@dataclass
+class SourceDir:
+    path: Path
+    ignore: IgnoreRules
+    files: list[Path] = field(default_factory=list)
+    dirs: list[Path] = field(default_factory=list)
+    # Layout problems, None until the layout is checked
+    problems: Optional[list[Problem]] = None
+    is_array: bool = False
+
+
+class SourceIndex:
+    def __init__(self, root: Path):
+        self.root = Path(os.path.abspath(root))
+        self.files: dict[Path, SourceFile] = {}
+        self.dirs: dict[Path, SourceDir] = {}
+
+    def load(self) -> None:
+        """Scan and parse the whole source directory."""
+        self.files.clear()
+        self.dirs.clear()
+        if self.root.is_dir():
+            self.scan_dir(self.root, rules_for_dir(self.root))
+        logger.info(f"Indexed {len(self.files)} files in {len(self.dirs)} directories of {self.root}")
+
+    def scan_dir(self, dir_path: Path, ignore: IgnoreRules) -> None:
+        source_dir = self.dirs[dir_path] = SourceDir(dir_path, ignore)
+        for entry in list_dir_entries(dir_path, ignore):
+            path = dir_path / entry.name
+            if entry.is_dir():
+                source_dir.dirs.append(path)
+                self.scan_dir(path, ignore.enter(path, entry.name))
+            elif entry.is_file():
+                source_dir.files.append(path)
+                self.update_file(path)
+
+    def update_file(self, path: Path, text: Optional[str] = None) -> None:
+        """
+        Parse the file again, from the text if given, such as an unsaved buffer.
+
+        Files outside of the indexed directories are ignored.
+        """
+        path = Path(os.path.abspath(path))
+        source_dir = self.dirs.get(path.parent)
+        if source_dir is None or path not in source_dir.files:
+            return
+        self.files[path] = index_file(path, self.shape_of(path), text)
+        self.invalidate(path.parent)
+
+    def refresh_dir(self, dir_path: Path) -> None:
+        """
+        List the directory again after entries were added or removed.
+
+        New entries are indexed and removed ones dropped, everything else
+        keeps its index. See rescan_dir for changed ignore rules.
+        """
+        dir_path = Path(os.path.abspath(dir_path))
+        source_dir = self.dirs.get(dir_path)
+        if source_dir is None:
+            if dir_path.parent in self.dirs:
+                self.refresh_dir(dir_path.parent)
+            return
+
+        files: list[Path] = []
+        dirs: list[Path] = []
+        for entry in list_dir_entries(dir_path, source_dir.ignore):
+            if entry.is_dir():
+                dirs.append(dir_path / entry.name)
+            elif entry.is_file():
+                files.append(dir_path / entry.name)
+
+        for path in set(source_dir.files) - set(files):
+            self.files.pop(path, None)
+        for path in set(source_dir.dirs) - set(dirs):
+            self.drop_dir(path)
+        old_files = set(source_dir.files)
+        old_dirs = set(source_dir.dirs)
+        source_dir.files, source_dir.dirs = files, dirs
+        for path in files:
+            if path not in old_files:
+                self.update_file(path)
+        for path in dirs:
+            if path not in old_dirs:
+                self.scan_dir(path, source_dir.ignore.enter(path, path.name))
+                self.invalidate(path)
+        self.invalidate(dir_path)
+
+    def rescan_dir(self, dir_path: Path) -> None:
+        """Scan the directory again, for example because its ignore rules changed."""
+        dir_path = Path(os.path.abspath(dir_path))
+        source_dir = self.dirs.get(dir_path)
+        if source_dir is None:
+            return
+        self.drop_dir(dir_path)
+        if dir_path == self.root:
+            ignore = rules_for_dir(dir_path)
+        else:
+            ignore = self.dirs[dir_path.parent].ignore.enter(dir_path, dir_path.name)
+        if dir_path.is_dir():
+            self.scan_dir(dir_path, ignore)
+        self.invalidate(dir_path)
+
+    def drop_dir(self, dir_path: Path) -> None:
+        source_dir = self.dirs.pop(dir_path, None)
+        if source_dir is None:
+            return
+        for path in source_dir.files:
+            self.files.pop(path, None)
+        for path in source_dir.dirs:
+            self.drop_dir(path)
+
+    def invalidate(self, dir_path: Path) -> None:
+        """Check the layout of the directory and of the directories above it again."""
+        while dir_path in self.dirs:
+            self.dirs[dir_path].problems = None
+            if dir_path == self.root:
+                break
+            dir_path = dir_path.parent
+
+    def shape_of(self, path: Path) -> list:
+        """
+        Path of the content of the file within the assembled extension.
+
+        Array indexes depend on the other files of the array and are None.
+        Groupers and index files add their content to their directory.
+        """
+        shape: list = []
+        *dir_names, file_name = path.relative_to(self.root).parts
+        for key in [*dir_names, Path(file_name).stem]:
+            if key.startswith("-"):
+                shape.append(None)
+            elif not (key.startswith("+") or key == "index"):
+                shape.append(key)
+        return shape
+
+    def problems(self) -> dict[Path, list[Problem]]:
+        """All problems of the source by the file or directory they are found in."""
+        problems: dict[Path, list[Problem]] = {}
+        for source_file in self.files.values():
+            for problem in source_file.problems:
+                problems.setdefault(problem.file, []).append(problem)
+        for dir_path in self.dirs:
+            for problem in self.check_dir(dir_path):
+                problems.setdefault(problem.file, []).append(problem)
+        for problem in self.find_duplicate_metrics():
+            problems.setdefault(problem.file, []).append(problem)
+        return problems
+
+    def check_dir(self, dir_path: Path) -> list[Problem]:
+        """Layout problems of the directory, see assemble_recursively."""
+        source_dir = self.dirs[dir_path]
+        if source_dir.problems is not None:
+            return source_dir.problems
+
+        problems: list[Problem] = []
+        # Every key of the directory with its entry and whether it is an array
+        keys: dict[str, tuple[Path, bool]] = {}
+        # Of YAML files or scalar files with the same stem, the last one is used
+        yamls = {p.stem: p for p in source_dir.files if p.suffix in (".yaml", ".yml")}
+        scalars = {p.stem: p for p in source_dir.files if p.suffix not in (".yaml", ".yml")}
+        for key, path in yamls.items():
+            source_file = self.files.get(path)
+            keys[key] = (path, isinstance(source_file and source_file.data, list))
+        for key, path in [*scalars.items(), *((p.name, p) for p in source_dir.dirs)]:
+            if key in keys:
+                problems.extend(
+                    Problem(p, "DuplicateKey", f"Duplicate key found inside {dir_path}: {key}")
+                    for p in (keys[key][0], path)
+                )
+                continue
+            if path in self.dirs:
+                self.check_dir(path)
+                keys[key] = (path, self.dirs[path].is_array)
+            else:
+                keys[key] = (path, False)
+
+        source_dir.is_array = any(
+            k.startswith("-") or (k.startswith("+") and is_array)
+            for k, (_, is_array) in keys.items()
+        )
+        for key, (path, is_array) in keys.items():
+            if key == "index" and is_array:
+                problems.append(Problem(
+                    path,
+                    "IndexFileIsArray",
+                    f"Directory {dir_path} contains an index file with an array.",
+                ))
+            if source_dir.is_array and not (key.startswith("-") or (key.startswith("+") and is_array)):
+                plain = key.lstrip("-+")
+                problems.append(Problem(
+                    path,
+                    "InvalidItemWithinArrayDirectoryError",
+                    (
+                        f"Directory {dir_path} is an array, but it contains an "
+                        f"unexpected value in key {key}. Inside array folders, "
+                        f"either the key should start with a dash -{plain} or "
+                        f"the key must be a grouper +{plain} that contains "
+                        f"another array within itself."
+                    ),
+                ))
+
+        source_dir.problems = problems
+        return problems
+
+    def find_duplicate_metrics(self) -> Iterator[Problem]:
+        first: dict[str, Location] = {}
+        for name, location in self.definitions():
+            defined_at = first.setdefault(name, location)
+            if defined_at is not location:
+                yield Problem(
+                    location.file,
+                    "duplicate-metric-key",
+                    (
+                        f"Metric {name} is already defined at "
+                        f"{defined_at.file.relative_to(self.root).as_posix()}:{defined_at.line + 1}."
+                    ),
+                    line=location.line,
+                    start=location.start,
+                    end=location.end,
+                )
+
+    def definitions(self, name: Optional[str] = None) -> Iterator[tuple[str, Location]]:
+        for source_file in self.files.values():
+            for defined, location in source_file.definitions:
+                if name is None or defined == name:
+                    yield defined, location
+
+    def references(self, name: Optional[str] = None) -> Iterator[tuple[str, Location]]:
+        for source_file in self.files.values():
+            for referred, location in source_file.references:
+                if name is None or referred == name:
+                    yield referred, location
+
+    def symbol_at(self, path: Path, line: int, column: int) -> Optional[str]:
+        """Metric key that is defined or referred to at the position of the file."""
+        source_file = self.files.get(Path(os.path.abspath(path)))
+        if source_file is None:
+            return None
+        for name, location in source_file.definitions + source_file.references:
+            if location.contains(line, column):
+                return name
+        return None
+
+
+def index_file(path: Path, shape: list, text: Optional[str] = None) -> SourceFile:
+    """Parse a YAML file and collect its symbols. Other files are not read."""
+    source_file = SourceFile(path)
+    if path.suffix not in (".yaml", ".yml"):
+        return source_file
+
+    try:
+        if text is None:
+            with open(path, "r") as f:
+                text = f.read()
+        source_file.data = parser.load(text)
+    except Exception as e:
+        mark = getattr(e, "problem_mark", None)
+        line = mark.line if mark is not None else 0
+        column = mark.column if mark is not None else 0
+        source_file.problems.append(Problem(
+            path,
+            "FailedToParseYamlError",
+            f"Failed to parse {path.name}: {e}",
+            line=line,
+            start=column,
+            end=column,
+        ))
+        return source_file
+
+    collect_symbols(source_file, source_file.data, shape, text.splitlines())
+    return source_file
+
+
+def collect_symbols(source_file: SourceFile, node: Any, shape: list, lines: list[str]) -> None:
+    """Collect the metric definitions and the references of screens within the node."""
+    if isinstance(node, CommentedMap):
+        in_screen = len(shape) >= 2 and shape[0] == "screens"
+        for key, value in node.items():
+            if shape == ["metrics", None] and key == "key" and isinstance(value, str):
+                location = find_text(source_file.path, lines, node.lc.value(key), value)
+                source_file.definitions.append((value, location))
+            elif in_screen and key in ("metricKey", "metricSelector"):
+                position = node.lc.value(key)
+                for metric_key in referenced_metric_keys(key, value):
+                    location = find_text(source_file.path, lines, position, metric_key)
+                    source_file.references.append((metric_key, location))
+                    # The same key may appear again later within the selector
+                    position = (location.line, location.end)
+            else:
+                collect_symbols(source_file, value, shape + [key], lines)
+    elif isinstance(node, CommentedSeq):
+        for item in node:
+            collect_symbols(source_file, item, shape + [None], lines)
+
+
+def find_text(path: Path, lines: list[str], position: Any, text: str) -> Location:
+    """
+    Location of the text at or after the position, such as the start of a value.
+
+    Quotes and line breaks of the value are skipped this way. If the text
+    is not found, the location is the position itself.
+    """
+    line, column = position
+    for n in range(line, min(line + MAX_SEARCH_LINES, len(lines))):
+        start = lines[n].find(text, column if n == line else 0)
+        if start >= 0:
+            return Location(path, n, start, start + len(text))
+    return Location(path, line, column, column + len(text))
@@ -0,0 +1,463 @@
+import hashlib
+import json
+import logging
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import ruamel.yaml
+from ruamel.yaml.nodes import MappingNode, Node, SequenceNode
+
+from yamlex.api.joiner import load_scalar_file, load_yaml_file
+from yamlex.api.util import dump_yaml, indent, scan_source_dir
+
+
+logger = logging.getLogger(__name__)
+parser = ruamel.yaml.YAML()
+
+SOURCE_MAPS_DIR_NAME = "sourcemaps"
+SOURCE_MAP_VERSION = 1
+DOCUMENT_END = "...\n"
+# Line ending with the header of a block scalar, such as "key: >-" or "- |"
+BLOCK_SCALAR_START = re.compile(r"(?:^|[:-] )[>|][0-9+-]*$")
+
+
+def get_source_map_path(cache_dir_path: Path, target: Path) -> Path:
+    """Source maps are kept in the cache directory, one per target file."""
+    key = hashlib.sha256(str(target.resolve()).encode()).hexdigest()[:16]
+    return cache_dir_path / SOURCE_MAPS_DIR_NAME / f"{key}.json"
+
+
+def read_source_map(source_map_path: Path) -> Optional[dict]:
+    if not source_map_path.exists():
+        return None
+    try:
+        with open(source_map_path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable source map {source_map_path}: {e}")
+        return None
+
+
+def write_source_map(source_map_path: Path, source_map: dict) -> None:
+    source_map_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(source_map_path, "w") as f:
+        json.dump(source_map, f)
+
+
+def build_source_map(
+    text: str,
+    extension: dict,
+    origins: dict[Path, dict],
+    source: Path,
+    options: dict,
+) -> dict:
+    """
+    Record which lines and bytes of the generated text each source file occupies.
+
+    The text is composed once to find the nodes. Every part is then rendered
+    on its own and compared to its region of the text. Only parts that render
+    identically can later be spliced without a full dump.
+    """
+    lines = text.splitlines(keepends=True)
+    byte_offsets = [0]
+    for line in lines:
+        byte_offsets.append(byte_offsets[-1] + len(line.encode()))
+    root = parser.compose(text)
+
+    files, dirs = scan_source_dir(source)
+
+    # Locations claimed by more than one file cannot be spliced, because
+    # the later file overwrites parts of the earlier one
+    claims = Counter(
+        location
+        for origin in origins.values()
+        for location in claimed_locations(origin)
+    )
+
+    parts: dict[str, dict] = {}
+    rendered: list[tuple[dict, str]] = []
+    for file_path, origin in origins.items():
+        relative = file_path.relative_to(source).as_posix()
+        part = {**origin, "stat": files.get(relative), "spliceable": False}
+        parts[relative] = part
+
+        region = locate_region(root, lines, origin)
+        if region is None:
+            logger.debug(f"{indent(1)}Cannot locate: {relative}")
+            continue
+        start, end, context, column = region
+
+        chunk = None
+        if any(claims[c] > 1 for c in claimed_locations(origin)):
+            logger.debug(f"{indent(1)}Overlaps with other parts: {relative}")
+        else:
+            chunk = render_chunk(
+                part_content(extension, origin),
+                context,
+                column,
+                at_document_end=end == len(lines),
+            )
+
+        # Comments at the top of a file are emitted right before its
+        # first line, so they belong to the region of this part
+        if chunk:
+            leading = count_leading_comment_lines(chunk)
+            chunk_head = chunk.splitlines(keepends=True)[:leading]
+            if leading and lines[max(start - leading, 0):start] == chunk_head:
+                start -= leading
+
+        part.update(
+            start_line=start,
+            end_line=end,
+            start_byte=byte_offsets[start],
+            end_byte=byte_offsets[end],
+            context=context,
+            indent=column,
+        )
+        if chunk is not None:
+            rendered.append((part, chunk))
+
+    # A region ends where the next one begins, including its comments
+    regions = sorted(
+        (p for p in parts.values() if "start_line" in p),
+        key=lambda p: p["start_line"],
+    )
+    for previous, following in zip(regions, regions[1:]):
+        if previous["start_line"] < following["start_line"] < previous["end_line"]:
+            previous["end_line"] = following["start_line"]
+            previous["end_byte"] = following["start_byte"]
+
+    for part, chunk in rendered:
+        if chunk == "".join(lines[part["start_line"]:part["end_line"]]):
+            part["spliceable"] = True
+        else:
+            logger.debug(f"{indent(1)}Renders differently in place: {part}")
+
+    return {
+        "version": SOURCE_MAP_VERSION,
+        "options": options,
+        "source": source.resolve().as_posix(),
+        "output_hash": hashlib.sha256(text.encode()).hexdigest(),
+        "dirs": dirs,
+        "parts": parts,
+    }
+
+
+def splice_changed_parts(
+    source: Path,
+    target: Path,
+    source_map: dict,
+    options: dict,
+) -> Optional[str]:
+    """
+    Re-render only the changed source files and splice them into the target.
+
+    Updates the source map in place. Returns the new text of the target, or
+    None if the structure changed and a full join is required.
+    """
+    if (
+        source_map.get("version") != SOURCE_MAP_VERSION
+        or source_map.get("options") != options
+        or source_map.get("source") != source.resolve().as_posix()
+    ):
+        logger.info("Source map was created with different options.")
+        return None
+
+    if not target.exists():
+        logger.info(f"{target} does not exist.")
+        return None
+    with open(target, "r") as f:
+        text = f.read()
+    if hashlib.sha256(text.encode()).hexdigest() != source_map["output_hash"]:
+        logger.info(f"{target} was modified after the last join.")
+        return None
+
+    files, dirs = scan_source_dir(source)
+    parts: dict[str, dict] = source_map["parts"]
+    if files.keys() != parts.keys() or dirs != source_map["dirs"]:
+        logger.info("Source files were added, removed or renamed.")
+        return None
+
+    changed = [
+        relative for relative, stat in files.items()
+        if stat != parts[relative]["stat"]
+    ]
+    logger.info(f"Changed source files: {len(changed)}")
+
+    lines = text.splitlines(keepends=True)
+    splices: list[tuple[dict, list[str]]] = []
+    for relative in changed:
+        part = parts[relative]
+        if not part["spliceable"]:
+            logger.info(f"{indent(1)}Cannot be spliced: {relative}")
+            return None
+
+        content = load_part_content(source / relative, part, options)
+        if content is None:
+            logger.info(f"{indent(1)}Structure changed: {relative}")
+            return None
+
+        chunk = render_chunk(
+            content,
+            part["context"],
+            part["indent"],
+            at_document_end=part["end_line"] == len(lines),
+        )
+        if chunk is None:
+            return None
+        splices.append((part, chunk.splitlines(keepends=True)))
+        part["stat"] = files[relative]
+        logger.debug(f"{indent(1)}Splice: {relative}")
+
+    # Splice from the bottom up, so that earlier line numbers stay valid
+    splices.sort(key=lambda s: s[0]["start_line"], reverse=True)
+    for part, chunk_lines in splices:
+        old_end_line = part["end_line"]
+        old_end_byte = part["end_byte"]
+        lines[part["start_line"]:old_end_line] = chunk_lines
+
+        line_delta = len(chunk_lines) - (old_end_line - part["start_line"])
+        byte_delta = (
+            sum(len(line.encode()) for line in chunk_lines)
+            - (old_end_byte - part["start_byte"])
+        )
+        part["end_line"] += line_delta
+        part["end_byte"] += byte_delta
+
+        # Move all regions that follow the spliced one
+        for other in parts.values():
+            if "start_line" in other and other["start_line"] >= old_end_line:
+                other["start_line"] += line_delta
+                other["end_line"] += line_delta
+                other["start_byte"] += byte_delta
+                other["end_byte"] += byte_delta
+
+    text = "".join(lines)
+    source_map["output_hash"] = hashlib.sha256(text.encode()).hexdigest()
+    return text
+
+
+def count_leading_comment_lines(text: str) -> int:
+    count = 0
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith("#"):
+            break
+        count += 1
+    return count
+
+
+def claimed_locations(origin: dict) -> list[tuple]:
+    path = tuple(origin["path"])
+    if origin["kind"] == "keys":
+        return [path + (k,) for k in origin["keys"]]
+    if origin["kind"] == "items":
+        return [path[:-1] + (path[-1] + i,) for i in range(origin["count"])]
+    return [path]
+
+
+def locate_region(
+    root: Node,
+    lines: list[str],
+    origin: dict,
+) -> Optional[tuple[int, int, str, int]]:
+    """
+    Find the lines occupied by a part and its indentation context.
+
+    The region of an entry ends where the next entry of the same or any
+    enclosing node begins. Returns start line, end line (exclusive),
+    context and indentation, or None if the part cannot be located.
+    """
+    kind, path = origin["kind"], origin["path"]
+    if kind == "keys":
+        if not origin["keys"]:
+            return None
+        parent_path, first, last = path, origin["keys"][0], origin["keys"][-1]
+    elif kind == "items":
+        if not origin["count"]:
+            return None
+        parent_path, first = path[:-1], path[-1]
+        last = first + origin["count"] - 1
+    else:
+        parent_path, first, last = path[:-1], path[-1], path[-1]
+
+    node, end_line = root, len(lines)
+    for step in parent_path:
+        i = find_entry(node, step)
+        if i is None:
+            return None
+        end_line = entry_boundary(node, i, end_line)
+        node = node.value[i][1] if isinstance(node, MappingNode) else node.value[i]
+
+    first_i, last_i = find_entry(node, first), find_entry(node, last)
+    if first_i is None or last_i is None:
+        return None
+    # All keys of the part must follow each other without gaps
+    if kind == "keys" and last_i - first_i != len(origin["keys"]) - 1:
+        return None
+
+    if isinstance(node, MappingNode):
+        mark = node.value[first_i][0].start_mark
+    else:
+        mark = node.value[first_i].start_mark
+    start = mark.line
+    end = entry_boundary(node, last_i, end_line)
+
+    prefix = lines[start][:mark.column]
+    if not prefix.strip():
+        return start, end, "block", mark.column
+    m = re.fullmatch(r"( *)- +", prefix)
+    if m:
+        return start, end, "item", len(m.group(1))
+    return None
+
+
+def find_entry(node: Node, step: Union[str, int]) -> Optional[int]:
+    if isinstance(node, MappingNode) and not isinstance(step, int):
+        for i, (key, _) in enumerate(node.value):
+            if key.value == str(step):
+                return i
+    elif isinstance(node, SequenceNode) and isinstance(step, int):
+        if 0 <= step < len(node.value):
+            return step
+    return None
+
+
+def entry_boundary(node: Node, i: int, end_line: int) -> int:
+    """Line where the entry after the i-th one starts."""
+    if i + 1 >= len(node.value):
+        return end_line
+    if isinstance(node, MappingNode):
+        return node.value[i + 1][0].start_mark.line
+    return node.value[i + 1].start_mark.line
+
+
+def part_content(extension: dict, origin: dict) -> Union[dict, list]:
+    """Extract what the part contributes from the assembled extension."""
+    kind, path = origin["kind"], origin["path"]
+    if kind == "keys":
+        parent = get_by_path(extension, path)
+        return {k: parent[k] for k in origin["keys"]}
+
+    parent = get_by_path(extension, path[:-1])
+    if kind == "items":
+        return parent[path[-1]:path[-1] + origin["count"]]
+    if isinstance(path[-1], int):
+        return [parent[path[-1]]]
+    return {path[-1]: parent[path[-1]]}
+
+
+def get_by_path(data: Any, path: list) -> Any:
+    for step in path:
+        data = data[step]
+    return data
+
+
+def load_part_content(
+    file_path: Path,
+    part: dict,
+    options: dict,
+) -> Optional[Union[dict, list]]:
+    """
+    Load a changed source file as content to be rendered into its region.
+
+    Returns None if the file no longer fits into its previous place, for
+    example when a grouper turned from a mapping into an array.
+    """
+    if file_path.suffix in (".yaml", ".yml"):
+        data = load_yaml_file(
+            file_path,
+            remove_comments=options["remove_comments"],
+        )
+    else:
+        data = load_scalar_file(
+            file_path,
+            keep_formatting=options["keep_formatting"],
+        )
+
+    name = file_path.stem
+    kind = "value"
+    if name.startswith("+") or name == "index":
+        if isinstance(data, dict):
+            kind = "keys"
+        elif isinstance(data, list):
+            kind = "items"
+    if kind != part["kind"]:
+        return None
+
+    if kind == "keys":
+        if list(data) != part["keys"]:
+            return None
+        return dict(data)
+    if kind == "items":
+        if len(data) != part["count"]:
+            return None
+        return list(data)
+
+    key = part["path"][-1]
+    return [data] if isinstance(key, int) else {key: data}
+
+
+def render_chunk(
+    content: Union[dict, list],
+    context: str,
+    column: int,
+    at_document_end: bool = False,
+) -> Optional[str]:
+    """
+    Render the content the same way it appears at its place in the document.
+
+    Mappings in block context are dumped as they are. Array items, and
+    mappings starting right after the dash of an array item, are dumped
+    inside a wrapping array. The result is then indented to the column.
+    """
+    if context == "block" and isinstance(content, dict):
+        text = dump_yaml(content)
+        shift = column
+    else:
+        wrapped = content if isinstance(content, list) else [content]
+        # Drop the line with the wrapping key, items start at column 2
+        text = dump_yaml({"_": wrapped}).split("\n", 1)[1]
+        shift = column - 2
+        if shift < 0:
+            return None
+
+    # A document ending with a scalar that keeps trailing newlines gets
+    # an explicit document end marker, which is never indented
+    document_end = ""
+    if text.endswith(DOCUMENT_END):
+        text = text[:-len(DOCUMENT_END)]
+        document_end = DOCUMENT_END if at_document_end else ""
+
+    return indent_lines(text, shift) + document_end
+
+
+def indent_lines(text: str, shift: int) -> str:
+    """
+    Indent YAML text by the given number of spaces.
+
+    Blank lines and full-line comments are left as they are, because the
+    emitter writes comments at their original column regardless of nesting.
+    Lines of block scalars are always indented, even if they start with '#'.
+    """
+    padding = " " * shift
+    result: list[str] = []
+    block_scalar_indent: Optional[int] = None
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        line_indent = len(line) - len(line.lstrip(" "))
+        if block_scalar_indent is not None and stripped:
+            if line_indent <= block_scalar_indent:
+                block_scalar_indent = None
+
+        is_comment = stripped.startswith("#") and block_scalar_indent is None
+        if stripped and not is_comment:
+            result.append(padding + line)
+        else:
+            result.append(line)
+
+        if block_scalar_indent is None and BLOCK_SCALAR_START.search(stripped):
+            block_scalar_indent = line_indent
+    return "".join(result)
@@ -2,9 +2,9 @@ import logging
 from pathlib import Path
 from typing import Union
 
-import ruamel.yaml
-
+from yamlex.api.memory import phase, record_sections
 from yamlex.api.util import (
+    create_yaml_parser,
     sanitize_file_stem,
     remove_yaml_comments,
     indent,
@@ -40,13 +40,12 @@ def split_yaml(
     remove_comments: bool = False,
 ) -> dict[Path, Union[dict, list]]:
     """Decompose a YAML file into multiple files."""
-    parts_to_write: dict[Path, Union[dict, list]] = dict()
-
     logger.info(f"Decomposing the central YAML file into parts: {source_file_path}")
     try:
-        with open(source_file_path, "r") as extension_yaml_file:
-            parser = ruamel.yaml.YAML()
+        with phase("parse"), open(source_file_path, "r") as extension_yaml_file:
+            parser = create_yaml_parser()
             raw_data: dict = parser.load(extension_yaml_file)
+        with phase("comment stripping"):
             data = remove_yaml_comments(
                 source_file_path,
                 raw_data,
@@ -54,6 +53,15 @@ def split_yaml(
             ) if remove_comments else raw_data
     except Exception as e:
         raise FailedToParseYamlError(e)
+    record_sections(data)
+
+    with phase("split"):
+        return extract_parts(data, target_dir_path)
+
+
+def extract_parts(data: dict, target_dir_path: Path) -> dict[Path, Union[dict, list]]:
+    """Parts of the extension by the files they are written to."""
+    parts_to_write: dict[Path, Union[dict, list]] = dict()
 
     # Process datasource
     logger.info(f"Extracting datasource...")
@@ -0,0 +1,119 @@
+"""
+Compact, immutable representation of comment-free YAML data.
+
+Mappings become FrozenMap objects, sequences become tuples and scalars are
+kept as they are. String keys are interned and mappings with the same keys
+share one tuple of keys, so that thousands of similar mappings, such as
+metrics or screens, cost little more than their values.
+
+Used for data that never has to be written back with its comments, such as
+cached diff inputs, which diff compares as they are.
+"""
+import sys
+import weakref
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Iterator
+
+from ruamel.yaml.comments import CommentedMap, CommentedSeq
+
+
+class SharedKeys:
+    """Tuple of keys shared by all mappings with these keys."""
+
+    # Tuples cannot be referenced weakly, so they are wrapped
+    __slots__ = ("keys", "__weakref__")
+
+    def __init__(self, keys: tuple) -> None:
+        self.keys = keys
+
+
+# Every distinct tuple of keys is stored only once, as long as a mapping uses it
+_shared_keys: "weakref.WeakValueDictionary[tuple, SharedKeys]" = weakref.WeakValueDictionary()
+
+
+def share_keys(keys: tuple) -> SharedKeys:
+    shared = _shared_keys.get(keys)
+    if shared is None:
+        shared = _shared_keys[keys] = SharedKeys(keys)
+    return shared
+
+
+class FrozenMap(MutableMapping):
+    """
+    Mapping that cannot be changed.
+
+    It is a MutableMapping only because DeepDiff hashes the values of
+    mutable mappings, and only the keys of any other. Setting or deleting
+    keys raises TypeError.
+    """
+
+    __slots__ = ("_keys", "_values", "_shared")
+
+    def __init__(self, keys: tuple, values: tuple) -> None:
+        shared = share_keys(keys)
+        object.__setattr__(self, "_shared", shared)
+        object.__setattr__(self, "_keys", shared.keys)
+        object.__setattr__(self, "_values", values)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("FrozenMap is immutable")
+
+    def __getitem__(self, key: Any) -> Any:
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        raise TypeError("FrozenMap is immutable")
+
+    def __delitem__(self, key: Any) -> None:
+        raise TypeError("FrozenMap is immutable")
+
+    def __iter__(self) -> Iterator:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"FrozenMap({dict(zip(self._keys, self._values))!r})"
+
+    def __reduce__(self) -> tuple:
+        # Slots cannot be restored by the default pickling, which sets them
+        return (FrozenMap, (self._keys, self._values))
+
+
+def intern_key(key: Any) -> Any:
+    # Subclasses of str, such as ruamel scalar strings, cannot be interned
+    return sys.intern(key) if type(key) is str else key
+
+
+def freeze(data: Any) -> Any:
+    """Convert dicts, lists and their ruamel counterparts into a frozen tree."""
+    if isinstance(data, FrozenMap):
+        return data
+    if isinstance(data, Mapping):
+        keys = tuple(intern_key(k) for k in data)
+        return FrozenMap(keys, tuple(freeze(v) for v in data.values()))
+    if isinstance(data, (list, tuple)):
+        return tuple(freeze(v) for v in data)
+    return data
+
+
+def to_builtins(node: Any) -> Any:
+    """Convert a frozen tree into dicts and lists."""
+    if isinstance(node, FrozenMap):
+        return dict(zip(node._keys, map(to_builtins, node._values)))
+    if isinstance(node, tuple):
+        return [to_builtins(v) for v in node]
+    return node
+
+
+def to_ruamel(node: Any) -> Any:
+    """Convert a frozen tree into ruamel commented maps and sequences."""
+    if isinstance(node, FrozenMap):
+        return CommentedMap(zip(node._keys, map(to_ruamel, node._values)))
+    if isinstance(node, tuple):
+        return CommentedSeq(to_ruamel(v) for v in node)
+    return node
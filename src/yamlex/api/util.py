@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import re
 import sys
@@ -7,6 +8,7 @@ from typing import Any, Optional, Union, MutableMapping, MutableSequence
 
 import ruamel.yaml
 from ruamel.yaml.comments import CommentedBase, Comment
+from ruamel.yaml.constructor import RoundTripConstructor
 
 from yamlex.api.exceptions import (
     NoValidVersionNumber,
@@ -14,11 +16,43 @@ from yamlex.api.exceptions import (
     FailedToReadVersionFile,
     FailedToWriteVersionFile,
 )
+from yamlex.api.memory import phase
+from yamlex.api.ignore import IgnoreRules, list_dir_entries, rules_for_dir
 
 
 logger = logging.getLogger(__name__)
 parser = ruamel.yaml.YAML()
 
+# Plain strings up to this length are interned when parsed. This covers
+# all mapping keys and short values, such as 'type: gauge' or dimension
+# names, which repeat thousands of times in a large extension.
+MAX_INTERNED_LENGTH = 64
+
+
+class InterningConstructor(RoundTripConstructor):
+    """Round-trip constructor that shares one object for equal short strings."""
+
+    def construct_yaml_str(self, node: Any) -> Any:
+        value = super().construct_yaml_str(node)
+        # Styled scalars are str subclasses, which cannot be interned
+        if type(value) is str and len(value) <= MAX_INTERNED_LENGTH:
+            return sys.intern(value)
+        return value
+
+
+InterningConstructor.add_constructor(
+    "tag:yaml.org,2002:str",
+    InterningConstructor.construct_yaml_str,
+)
+
+
+def create_yaml_parser(preserve_quotes: bool = False) -> ruamel.yaml.YAML:
+    """Create a round-trip parser that interns keys and short strings."""
+    yaml_parser = ruamel.yaml.YAML()
+    yaml_parser.Constructor = InterningConstructor
+    yaml_parser.preserve_quotes = preserve_quotes
+    return yaml_parser
+
 
 def adjust_root_logger(verbose: bool = False, quiet: bool = False) -> None:
     if quiet:
@@ -31,6 +65,18 @@ def indent(num: int = 0) -> str:
     return "· " * num
 
 
+def format_table(rows: list[tuple[str, ...]]) -> list[str]:
+    """Lines of a table with a header row. Names are aligned to the left, numbers to the right."""
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return [
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        ).rstrip()
+        for row in rows
+    ]
+
+
 def get_default_extension_source_dir_path() -> Path:
     src_dir_path = Path("src")
     if src_dir_path.exists() and src_dir_path.is_dir():
@@ -63,6 +109,52 @@ def get_default_extension_dir_path() -> Path:
     raise ExtensionDirNotFound()
 
 
+def get_cache_dir_path(root: Path) -> Path:
+    return root / ".yamlex"
+
+
+def hash_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def hash_dir(dir_path: Path, pattern: str = "*") -> str:
+    """Hash names and contents of all files matching the pattern in a directory."""
+    digest = hashlib.sha256()
+    for path in sorted(dir_path.glob(pattern)):
+        if path.is_file():
+            digest.update(path.name.encode())
+            digest.update(hash_file(path).encode())
+    return digest.hexdigest()
+
+
+def scan_source_dir(dir_path: Path) -> tuple[dict[str, list[int]], list[str]]:
+    """
+    List files and directories of the source directory.
+
+    Follows the same rules as assemble_recursively: symlinks, paths
+    starting with '!' and paths excluded by .yamlexignore files are
+    ignored. Returns modification time and size for every file, and the
+    sorted list of directories.
+    """
+    files: dict[str, list[int]] = {}
+    dirs: list[str] = []
+
+    def scan(current: str, prefix: str, rules: IgnoreRules) -> None:
+        for entry in list_dir_entries(current, rules):
+            relative = f"{prefix}{entry.name}"
+            if entry.is_dir():
+                dirs.append(relative)
+                scan(entry.path, f"{relative}/", rules.enter(entry.path, entry.name))
+            elif entry.is_file():
+                stat = entry.stat()
+                files[relative] = [stat.st_mtime_ns, stat.st_size]
+
+    scan(str(dir_path), "", rules_for_dir(dir_path))
+    dirs.sort()
+    return files, dirs
+
+
 def is_manually_created(path: Path) -> bool:
     if path.exists():
         with open(path, "r") as f:
@@ -77,6 +169,42 @@ def sanitize_file_stem(stem: str) -> Path:
     return valid_id
 
 
+EMITTERS = ("ruamel", "fast")
+# Column of the items of a sequence and of its dashes, relative to the parent
+DEFAULT_SEQUENCE_INDENT = (4, 2)
+
+
+def dump_yaml(
+    data: Any,
+    line_length: Optional[int] = None,
+    emitter: str = "ruamel",
+    sequence_indent: Optional[tuple[int, int]] = None,
+) -> str:
+    """
+    Convert the data to YAML text.
+
+    The fast emitter writes the same text as ruamel, but only supports data
+    without comments, anchors and tags, and no line length. Anything else is
+    written by ruamel, see yamlex.api.emitter.
+
+    Sequences are indented by 4 with the dash at 2, unless sequence_indent
+    gives other ones, which only ruamel writes.
+    """
+    sequence, offset = sequence_indent or DEFAULT_SEQUENCE_INDENT
+    if emitter == "fast" and not line_length and (sequence, offset) == DEFAULT_SEQUENCE_INDENT:
+        from yamlex.api.emitter import UnsupportedByFastEmitter, emit_yaml
+        try:
+            return emit_yaml(data)
+        except UnsupportedByFastEmitter as e:
+            logger.debug(f"{indent(1)}Falling back to ruamel: {e}")
+
+    stream = StringIO()
+    parser.indent(mapping=2, sequence=sequence, offset=offset)
+    parser.width = line_length or sys.maxsize
+    parser.dump(data, stream)
+    return stream.getvalue()
+
+
 def write_file(
     file_path: Path,
     data: Union[dict, list],
@@ -84,14 +212,34 @@ def write_file(
     line_length: Optional[int] = None,
     dry_run: bool = False,
     print_to_stdout: bool = False,
+    emitter: str = "ruamel",
+    sequence_indent: Optional[tuple[int, int]] = None,
 ) -> None:
     # Convert dict to YAML. Dump to string first to add a comment
-    stream = StringIO()
-    parser.indent(mapping=2, sequence=4, offset=2)
-    parser.width = line_length or sys.maxsize
-    parser.dump(data, stream)
-    text = stream.getvalue()
+    with phase("dump"):
+        text = dump_yaml(
+            data,
+            line_length=line_length,
+            emitter=emitter,
+            sequence_indent=sequence_indent,
+        )
+    write_text(
+        file_path,
+        text,
+        add_file_header=add_file_header,
+        dry_run=dry_run,
+        print_to_stdout=print_to_stdout,
+    )
 
+
+def write_text(
+    file_path: Path,
+    text: str,
+    add_file_header: bool = True,
+    dry_run: bool = False,
+    print_to_stdout: bool = False,
+) -> None:
+    """Write YAML text that was already dumped, see write_file."""
     # Write a comment to indicate that the file was automatically generated
     header = f"# Generated by yamlex\n\n"
 
@@ -178,6 +326,20 @@ def bump_version(version: str) -> str:
     return result
 
 
+def copy_without_comments(obj: Any) -> Any:
+    """
+    Copy of the data with plain dicts and lists instead of ruamel types.
+
+    Unlike remove_yaml_comments, the data itself keeps its comments.
+    Scalars are not copied.
+    """
+    if isinstance(obj, MutableMapping):
+        return {k: copy_without_comments(v) for k, v in obj.items()}
+    if isinstance(obj, MutableSequence):
+        return [copy_without_comments(v) for v in obj]
+    return obj
+
+
 def remove_yaml_comments(
     key: str,
     obj: Any,
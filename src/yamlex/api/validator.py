@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import fastjsonschema
+import ruamel.yaml
+
+from yamlex.api.ignore import IgnoreRules, is_ignored
+from yamlex.api.mapper import map_schema_to_sources
+from yamlex.api.util import hash_dir, hash_file, indent
+from yamlex.api.exceptions import FailedToCompileSchema, InvalidPath
+
+
+logger = logging.getLogger(__name__)
+parser = ruamel.yaml.YAML(typ="safe")
+
+VALIDATORS_DIR_NAME = "validators"
+STATE_FILE_NAME = "validate.json"
+
+# Validators loaded by the current process, keyed by compiled code path
+_validators: dict[Path, Callable] = {}
+
+
+def validate(
+    schema: Path,
+    sources: Path,
+    root: Path,
+    extension_yaml: Path,
+    cache_dir_path: Path,
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+) -> dict[Path, list[str]]:
+    """
+    Validate source parts and the assembled extension.yaml against the schema.
+
+    Uses the same schema to file mapping as the map command. Every schema is
+    compiled once into a validator, which is cached on disk and keyed by the
+    hash of the schema directory. Parts that passed validation with the same
+    schemas before are skipped.
+
+    Returns:
+        dict: Validation errors for every invalid file.
+    """
+    schemas_hash = hash_dir(schema, "*.json")
+    parts = collect_parts_to_validate(schema, sources, root, extension_yaml)
+
+    state_file_path = cache_dir_path / STATE_FILE_NAME
+    state = read_state(state_file_path) if use_cache else {}
+    valid_parts: dict[str, str] = {}
+    if state.get("schemas") == schemas_hash:
+        valid_parts = state.get("parts", {})
+
+    # Figure out which parts changed since the last successful validation
+    parts_to_validate: dict[Path, Path] = {}
+    part_hashes: dict[Path, str] = {}
+    for part_path, schema_file_path in parts.items():
+        part_hash = f"{schema_file_path.name}:{hash_file(part_path)}"
+        part_hashes[part_path] = part_hash
+        if valid_parts.get(part_path.as_posix()) == part_hash:
+            logger.debug(f"{indent(1)}Unchanged, skip: {part_path}")
+            continue
+        parts_to_validate[part_path] = schema_file_path
+
+    logger.info((
+        f"Validating {len(parts_to_validate)} of {len(parts)} files, "
+        f"{len(parts) - len(parts_to_validate)} unchanged."
+    ))
+
+    # Compile every schema needed only once
+    validators_dir_path = cache_dir_path / VALIDATORS_DIR_NAME
+    code_paths: dict[Path, Path] = {}
+    for schema_file_path in set(parts_to_validate.values()):
+        code_paths[schema_file_path] = compile_validator(
+            schema_file_path,
+            validators_dir_path,
+            schemas_hash,
+        )
+
+    jobs = [
+        (part_path, code_paths[schema_file_path])
+        for part_path, schema_file_path in parts_to_validate.items()
+    ]
+    if workers == 1 or len(jobs) < 2:
+        results = [validate_part(*job) for job in jobs]
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            results = list(executor.map(
+                validate_part,
+                *zip(*jobs),
+                chunksize=chunksize,
+            ))
+
+    errors: dict[Path, list[str]] = {}
+    for (part_path, _), part_errors in zip(jobs, results):
+        if part_errors:
+            errors[part_path] = part_errors
+        else:
+            valid_parts[part_path.as_posix()] = part_hashes[part_path]
+
+    # Forget about the parts that are now invalid or no longer exist
+    valid_parts = {
+        p.as_posix(): valid_parts[p.as_posix()]
+        for p in parts
+        if p not in errors and p.as_posix() in valid_parts
+    }
+    if use_cache:
+        write_state(state_file_path, schemas_hash, valid_parts)
+
+    return errors
+
+
+def collect_parts_to_validate(
+    schema: Path,
+    sources: Path,
+    root: Path,
+    extension_yaml: Path,
+) -> dict[Path, Path]:
+    """
+    Find all existing files covered by the mapping and their schema files.
+
+    Files excluded by .yamlexignore files are not part of the extension,
+    so they are not validated either.
+    """
+    # Patterns are looked up within the root directory, so they must be
+    # relative to it
+    if extension_yaml.is_absolute():
+        try:
+            extension_yaml = extension_yaml.resolve().relative_to(root.resolve())
+        except ValueError:
+            raise InvalidPath(f"{extension_yaml} must be within the root directory {root}.")
+    mapping = map_schema_to_sources(schema, sources, root, extension_yaml)
+
+    parts: dict[Path, Path] = {}
+    rules_by_dir: dict[Path, IgnoreRules] = {}
+    for schema_file_name, patterns in mapping.items():
+        schema_file_path = root / schema_file_name
+        if not schema_file_path.exists():
+            logger.debug(f"Schema file not found, skip: {schema_file_path}")
+            continue
+        for pattern in patterns:
+            for part_path in sorted(root.glob(pattern)):
+                # The first matching schema wins, same as in the editor
+                if not part_path.is_file() or part_path in parts:
+                    continue
+                if is_ignored(part_path, root, rules_by_dir):
+                    continue
+                parts[part_path] = schema_file_path
+
+    return parts
+
+
+def compile_validator(
+    schema_file_path: Path,
+    validators_dir_path: Path,
+    schemas_hash: str,
+) -> Path:
+    """Compile a schema into validator code, unless it is already cached."""
+    code_file_path = (
+        validators_dir_path / f"{schema_file_path.name}.{schemas_hash[:16]}.py"
+    )
+    if code_file_path.exists():
+        logger.debug(f"{indent(1)}Cached validator: {code_file_path}")
+        return code_file_path
+
+    schemas_dir_path = schema_file_path.parent
+
+    # References to other schemas are always resolved from the local
+    # schema directory, never from the network
+    def load_local_schema(uri: str) -> dict:
+        name = Path(urlparse(uri).path).name
+        with open(schemas_dir_path / name, "r") as f:
+            return json.load(f)
+
+    try:
+        with open(schema_file_path, "r") as f:
+            definition = json.load(f)
+        code = fastjsonschema.compile_to_code(
+            definition,
+            handlers={
+                "": load_local_schema,
+                "http": load_local_schema,
+                "https": load_local_schema,
+            },
+            detailed_exceptions=False,
+            fast_fail=False,
+        )
+        # Entry point of the generated code is named after the schema $id
+        entry_point = fastjsonschema.RefResolver.from_schema(
+            definition,
+        ).get_scope_name()
+    except Exception as e:
+        raise FailedToCompileSchema(
+            f"Failed to compile {schema_file_path}: {e}"
+        )
+
+    # Drop validators compiled from the previous version of the schemas
+    validators_dir_path.mkdir(parents=True, exist_ok=True)
+    for stale in validators_dir_path.glob(f"{schema_file_path.name}.*.py"):
+        stale.unlink()
+
+    with open(code_file_path, "w") as f:
+        f.write(code)
+        f.write(f"\n\nvalidate = {entry_point}\n")
+    logger.debug(f"{indent(1)}Compiled validator: {code_file_path}")
+    return code_file_path
+
+
+def load_validator(code_file_path: Path) -> Callable:
+    validator = _validators.get(code_file_path)
+    if validator is None:
+        with open(code_file_path, "r") as f:
+            code = compile(f.read(), str(code_file_path), "exec")
+        namespace: dict = {}
+        exec(code, namespace)
+        validator = namespace["validate"]
+        _validators[code_file_path] = validator
+    return validator
+
+
+def validate_part(part_path: Path, code_file_path: Path) -> list[str]:
+    """Validate a single file and return the list of errors."""
+    validator = load_validator(code_file_path)
+
+    try:
+        with open(part_path, "r") as f:
+            data = parser.load(f)
+    except Exception as e:
+        return [f"Failed to parse YAML: {e}"]
+
+    # A grouper file may hold several array items at once
+    if part_path.name.startswith("+") and isinstance(data, list):
+        items = {f"data[{i}]": item for i, item in enumerate(data)}
+    else:
+        items = {"data": data}
+
+    errors: list[str] = []
+    for name, item in items.items():
+        try:
+            validator(item, name_prefix=name)
+        except fastjsonschema.JsonSchemaValuesException as e:
+            errors.extend(error.message for error in e.errors)
+        except fastjsonschema.JsonSchemaException as e:
+            errors.append(e.message)
+    return errors
+
+
+def read_state(state_file_path: Path) -> dict:
+    if not state_file_path.exists():
+        return {}
+    try:
+        with open(state_file_path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable {state_file_path}: {e}")
+        return {}
+
+
+def write_state(
+    state_file_path: Path,
+    schemas_hash: str,
+    valid_parts: dict[str, str],
+) -> None:
+    state_file_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(state_file_path, "w") as f:
+        json.dump({"schemas": schemas_hash, "parts": valid_parts}, f, indent=2)
@@ -1,25 +1,39 @@
+import importlib
 import logging
 import sys
-from typing import Optional
+from typing import Callable, Optional
 from typing_extensions import Annotated
 
 import typer
-from rich import print
-
-from yamlex.cli.commands.join import join as join_cmd
-from yamlex.cli.commands.map import map as map_cmd
-from yamlex.cli.commands.split import split as split_cmd
-from yamlex.cli.commands.diff import diff as diff_cmd
-from yamlex.cli.version import get_version
-from yamlex.api.exceptions import (
-    YamlexError,
-)
 
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 logger = logging.getLogger(__name__)
 
 
+# Commands are imported only when they are invoked, so that the
+# dependencies of one command do not slow down the start of the others.
+# Every command lives in yamlex.cli.commands.<name> as a function <name>.
+COMMANDS = [
+    "map",
+    "split",
+    "join",
+    "diff",
+    "validate",
+    "get",
+    "where",
+    "lint",
+    "build",
+    "server",
+    "lsp",
+]
+# Hidden aliases for popular commands.
+ALIASES = {
+    "j": "join",
+    "d": "diff",
+}
+
+
 help_text = """
 [b]How assembling works:[/b]
 
@@ -175,6 +189,16 @@ help_text = """
   │ name: com.example.extension.test  │                                   │
   └───────────────────────────────────┴───────────────────────────────────┘
 
+- [b]Ignoring with .yamlexignore files[/b]
+
+  A [i].yamlexignore[/i] file in any folder excludes files and folders
+  without renaming them, such as editor settings. It works like a
+  [i].gitignore[/i] file: one pattern per line, for example [i].idea/[/i]
+  or [i]*.bak[/i], and '!' in front of a pattern includes the matching
+  paths again. Patterns apply to the folder of the file and everything
+  within it. The [i].yamlexignore[/i] files in the current working
+  directory and the folders between it and --source apply as well.
+
 - [b]Scalar files[/b]
 
   Any plain text file (not yaml) will be added as a scalar value. With
@@ -215,6 +239,8 @@ def callback(
     ] = None,
 ) -> None:
     if version:
+        from yamlex.cli.version import get_version
+
         prog_version = get_version()
         print(prog_version)
 
@@ -224,7 +250,41 @@ def callback(
         return
 
 
-def run() -> None:
+def load_command(name: str) -> Callable:
+    module = importlib.import_module(f"yamlex.cli.commands.{name}")
+    return getattr(module, name)
+
+
+def requested_commands(args: list[str]) -> list[str]:
+    """
+    Figure out which commands need to be registered for these arguments.
+
+    Only the invoked command is needed. Printing the version needs none.
+    All commands are needed to show the help or an error about an unknown
+    command.
+    """
+    for arg in args:
+        if arg in ("--version", "-v"):
+            return []
+        if not arg.startswith("-"):
+            name = ALIASES.get(arg, arg)
+            if name in COMMANDS:
+                return [name]
+            break
+    return COMMANDS
+
+
+def run(forward: bool = True) -> None:
+    # Let the server of the workspace run the command, if there is one.
+    # The language server talks to its editor on stdin and stdout itself.
+    commands = requested_commands(sys.argv[1:])
+    if forward and len(commands) == 1 and commands[0] not in ("server", "lsp"):
+        from yamlex.cli.server import forward_to_server
+
+        code = forward_to_server(sys.argv[1:])
+        if code is not None:
+            exit(code)
+
     # Set up Typer app.
     app = typer.Typer(
         name="yamlex",
@@ -238,20 +298,25 @@ def run() -> None:
     # Set primary callback. This shows helps or allows to show version.
     app.callback(invoke_without_command=True, no_args_is_help=True)(callback)
 
-    # Declare main commands.
-    app.command(name="map")(map_cmd)
-    app.command(name="split")(split_cmd)
-    app.command(name="join")(join_cmd)
-    app.command(name="diff")(diff_cmd)
-
-    # Declare aliases for popular commands.
-    app.command(name="j", hidden=True)(join_cmd)
-    app.command(name="d", hidden=True)(diff_cmd)
+    # Declare main commands and their aliases.
+    for name in commands:
+        command = load_command(name)
+        app.command(name=name)(command)
+        for alias, aliased_name in ALIASES.items():
+            if aliased_name == name:
+                app.command(name=alias, hidden=True)(command)
 
     # Launch Typer app.
     try:
         app()
-    except YamlexError as e:
+    except Exception as e:
+        # Imported here, so that printing the version does not load the API
+        from yamlex.api.exceptions import YamlexError
+        if not isinstance(e, YamlexError):
+            raise
+
+        from rich import print
+
         code = e.code
         name = e.__class__.__name__
         message = f" {e.args[0]}" if e.args else ""
@@ -0,0 +1,114 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+import typer
+from typing_extensions import Annotated
+
+from yamlex.api.builder import build_archive
+from yamlex.api.util import (
+    adjust_root_logger,
+    get_cache_dir_path,
+    get_default_extension_dir_path,
+)
+from yamlex.cli.common_flags import (
+    verbose_flag,
+    quiet_flag,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def build(
+    extension_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--extension",
+            "-e",
+            help="Path to the extension directory with the extension.yaml file.",
+            show_default=False,
+            dir_okay=True,
+            file_okay=False,
+            exists=True,
+            readable=True,
+        )
+    ] = None,
+    output: Annotated[
+        Path,
+        typer.Option(
+            "--output",
+            "-o",
+            help="Path to the zip archive to write.",
+            dir_okay=False,
+            file_okay=True,
+        )
+    ] = Path("dist/extension.zip"),
+    includes: Annotated[
+        Optional[list[Path]],
+        typer.Option(
+            "--include",
+            "-i",
+            help="Additional file or directory to add to the root of the archive.",
+            show_default=False,
+            dir_okay=True,
+            file_okay=True,
+            exists=True,
+            readable=True,
+        )
+    ] = None,
+    workers: Annotated[
+        Optional[int],
+        typer.Option(
+            "--workers",
+            "-w",
+            help="Number of parallel compression processes.",
+            show_default="number of CPUs",
+            min=1,
+        ),
+    ] = None,
+    no_reuse: Annotated[
+        bool,
+        typer.Option(
+            "--no-reuse",
+            help="Compress all files, even those unchanged since the previous build.",
+        ),
+    ] = False,
+    verbose: verbose_flag = False,
+    quiet: quiet_flag = False,
+) -> None:
+    """
+    Package the extension directory into a zip archive.
+
+    Writes all files of the --extension directory, such as
+    [i]extension.yaml[/i], dashboards, alerts and libraries, into the
+    --output archive, plus every --include file or directory.
+
+    The archive is reproducible: entries are sorted by name and have fixed
+    timestamps and permissions, so the same files always produce the same
+    archive. Entries of files that did not change since the previous build
+    are copied from the previous archive instead of being compressed again.
+
+    The archive is not signed.
+    """
+    adjust_root_logger(verbose, quiet)
+
+    if extension_dir is None:
+        extension_dir = get_default_extension_dir_path()
+
+    logger.debug(f"Extension directory: {extension_dir}")
+    logger.debug(f"Output archive: {output}")
+
+    stats = build_archive(
+        extension_dir_path=extension_dir,
+        archive_path=output,
+        cache_dir_path=get_cache_dir_path(Path(".")),
+        includes=includes,
+        workers=workers,
+        reuse=not no_reuse,
+    )
+
+    logger.info((
+        f"Built {output} with {stats['entries']} files "
+        f"({stats['reused']} reused from the previous build)."
+    ))
@@ -1,5 +1,6 @@
 import json
 import logging
+import sys
 from pathlib import Path
 from typing import Optional
 
@@ -7,17 +8,30 @@ import ruamel.yaml
 import typer
 from typing_extensions import Annotated
 
-from yamlex.api.differ import diff as diff_data
-from yamlex.api.util import adjust_root_logger
+from yamlex.api.operations import diff as diff_extension, diff_changes
+from yamlex.api.projects import diff_task
+from yamlex.api.reporter import REPORTERS, limit_changes
+from yamlex.api.util import (
+    adjust_root_logger,
+    get_default_extension_dir_path,
+    get_default_extension_source_dir_path,
+)
 from yamlex.cli.common_flags import (
     verbose_flag,
     quiet_flag,
+    only_option,
+    projects_option,
+    all_projects_flag,
+    project_workers_option,
 )
+from yamlex.cli.projects import run_projects
 
 
 logger = logging.getLogger(__name__)
 parser = ruamel.yaml.YAML()
 
+OUTPUT_FORMATS = ("json", *REPORTERS)
+
 
 def diff(
     source: Annotated[
@@ -26,7 +40,7 @@ def diff(
             "--source",
             "-s",
             help="Path to the source directory or YAML file.",
-            show_default=False,
+            show_default="source or src/source",
             dir_okay=True,
             file_okay=True,
             exists=True,
@@ -39,13 +53,34 @@ def diff(
             "--target",
             "-t",
             help="Path to the target directory or YAML file.",
-            show_default=False,
+            show_default="extension/extension.yaml or src/extension/extension.yaml",
             dir_okay=True,
             file_okay=True,
             exists=True,
             readable=True,
         )
     ] = None,
+    only: only_option = None,
+    output_format: Annotated[
+        str,
+        typer.Option(
+            "--format",
+            "-f",
+            help="Output format of the differences: json, jsonl, text or summary.",
+        ),
+    ] = "json",
+    max_changes: Annotated[
+        Optional[int],
+        typer.Option(
+            "--max-changes",
+            help="Stop after this many changes. Not supported by the json format.",
+            show_default="no limit",
+            min=1,
+        ),
+    ] = None,
+    projects: projects_option = None,
+    all_projects: all_projects_flag = False,
+    workers: project_workers_option = None,
     verbose: verbose_flag = False,
     quiet: quiet_flag = False,
 ) -> None:
@@ -63,24 +98,79 @@ def diff(
 
     Exits with exit code 0 if there is no difference. Otherwise, the exit
     code is 1.
+
+    With --only, only the parts at the given YAML paths are compared, such
+    as [i]screens[/i] or [i]snmp[*].subgroups[/i]. From a source directory,
+    only the files that can contribute to these paths are parsed.
+
+    [b]Many extensions (--all and --project)[/b]
+
+    With --all or --project, yamlex compares the source directory of every
+    extension project to its [i]extension.yaml[/i], in parallel. Within
+    every project, --source and --target are relative to the project
+    directory and default to the same paths as for the join command. The
+    exit code is 1 if any project has differences.
+
+    [b]Streaming formats (--format and --max-changes)[/b]
+
+    The default json format prints all differences at once, as found by
+    DeepDiff. The other formats print every change as soon as it is
+    found: [i]jsonl[/i] prints a JSON object with the change, the YAML
+    path and the old and new value per line, [i]text[/i] prints lines
+    such as [i]~ metrics[3].metadata.unit: Count -> Percent[/i], with + for
+    added and - for removed values, and [i]summary[/i] prints the number of
+    changes per top-level section. With --max-changes, yamlex stops
+    comparing once that many changes are found.
     """
     adjust_root_logger(verbose, quiet)
 
+    if output_format not in OUTPUT_FORMATS:
+        logger.error(f"Unknown format {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}.")
+        raise typer.Exit(2)
+
+    if output_format == "json" and max_changes:
+        logger.error("--max-changes requires the jsonl, text or summary format.")
+        raise typer.Exit(2)
+
+    if output_format != "json" and (projects or all_projects):
+        logger.error("--all and --project only support the json format.")
+        raise typer.Exit(2)
+
+    if projects or all_projects:
+        run_projects(
+            diff_task,
+            {"source": source, "target": target, "only": only},
+            projects,
+            all_projects,
+            workers,
+        )
+
+    source = source or get_default_extension_source_dir_path()
+    target = target or get_default_extension_dir_path() / "extension.yaml"
     logger.debug(f"Source path: {source}")
     logger.debug(f"Target path: {target}")
 
+    if output_format != "json":
+        changes = diff_changes(source=source, target=target, only=only)
+        if max_changes:
+            changes = limit_changes(changes, max_changes)
+        if REPORTERS[output_format](changes, sys.stdout):
+            raise typer.Exit(1)
+        return
+
     # Compare source to target
-    difference = diff_data(
+    result = diff_extension(
         source=source,
         target=target,
+        only=only,
     )
 
     serialized = json.dumps(
-        difference,
+        result.differences,
         indent=2,
         default=str,
     )
     print(serialized)
 
-    if difference:
+    if result.changed:
         raise typer.Exit(1)
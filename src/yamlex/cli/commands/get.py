@@ -0,0 +1,101 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Optional
+
+import typer
+from typing_extensions import Annotated
+
+from yamlex.api.cache import get_cache
+from yamlex.api.query import query
+from yamlex.api.scalars import ScalarFile
+from yamlex.api.selector import parse_selector
+from yamlex.api.util import (
+    adjust_root_logger,
+    dump_yaml,
+    get_default_extension_source_dir_path,
+)
+from yamlex.cli.common_flags import (
+    verbose_flag,
+    quiet_flag,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def get(
+    expression: Annotated[
+        str,
+        typer.Argument(
+            help="YAML path of the value, such as version or metrics\\[key=com.foo.cpu].",
+            show_default=False,
+        ),
+    ],
+    source: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--source",
+            "-s",
+            help="Path to the source directory or YAML file to look into.",
+            show_default="source or src/source",
+            dir_okay=True,
+            file_okay=True,
+            exists=True,
+            readable=True,
+        )
+    ] = None,
+    all_values: Annotated[
+        bool,
+        typer.Option(
+            "--all",
+            "-a",
+            help="Print all matching values as a list, not only the first one.",
+        ),
+    ] = False,
+    verbose: verbose_flag = False,
+    quiet: quiet_flag = False,
+) -> None:
+    """
+    Print the value at a YAML path.
+
+    The path is a dot-separated list of keys, each optionally followed by
+    indexes or filters in brackets, for example [i]version[/i],
+    [i]screens[0].layout[/i], [i]metrics\\[key=com.foo.cpu][/i] or
+    [i]topology.types\\[name=x].rules[/i]. Keys and filter values may contain
+    the wildcards * and ?.
+
+    Within a source directory, only the files that can contain the value
+    are parsed. Within a YAML file, such as [i]extension.yaml[/i], yamlex
+    reads only as far as needed and skips everything else without building
+    it.
+
+    Strings are printed as they are, everything else as YAML. Exits with
+    exit code 1 if nothing is found at the path.
+    """
+    adjust_root_logger(verbose, quiet)
+
+    selector = parse_selector(expression)
+    source = source or get_default_extension_source_dir_path()
+    logger.debug(f"Looking up {expression} in {source}")
+
+    values = query(source, selector, first=not all_values, cache=get_cache())
+    if not values:
+        logger.error(f"Nothing found at {expression} in {source}.")
+        raise typer.Exit(1)
+
+    if all_values:
+        print(dump_yaml(values), end="")
+    else:
+        print(format_value(values[0]))
+
+
+def format_value(value: Any) -> str:
+    if isinstance(value, ScalarFile):
+        value = value.text()
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return dump_yaml(value).rstrip("\n")
+    # Booleans, numbers and null are written the same in JSON and YAML
+    return json.dumps(value, default=str)
@@ -1,26 +1,20 @@
 import logging
-import warnings
 from pathlib import Path
 from typing import Optional
 
 import typer
 from typing_extensions import Annotated
 
-from yamlex.api.joiner import assemble_recursively
+from yamlex.api.matrix import Variant, parse_variant, read_matrix_file
+from yamlex.api.memory import phase
+from yamlex.api.operations import join as join_extension, join_matrix
+from yamlex.api.projects import join_task
 from yamlex.api.util import (
+    EMITTERS,
     adjust_root_logger,
+    dump_yaml,
     get_default_extension_dir_path,
     get_default_extension_source_dir_path,
-    is_manually_created,
-    write_file,
-    read_version_properties,
-    parse_version,
-)
-from yamlex.api.exceptions import (
-    WrongExtensionStructureError,
-    EmptyAssembledExtensionError,
-    OverwritingManuallyCreatedFileError,
-    UnintendedIndexFileWarning,
 )
 from yamlex.cli.common_flags import (
     no_file_header_flag,
@@ -30,19 +24,31 @@ from yamlex.cli.common_flags import (
     dry_run_flag,
     remove_comments_flag,
     line_length_option,
+    emitter_option,
+    memory_report_flag,
+    memory_report_json_option,
+    only_option,
+    projects_option,
+    all_projects_flag,
+    project_workers_option,
 )
+from yamlex.cli.memory import memory_report
+from yamlex.cli.projects import run_projects
 
 
 logger = logging.getLogger(__name__)
 
 
 def join(
-    source: Annotated[
-        Optional[Path],
+    sources: Annotated[
+        Optional[list[Path]],
         typer.Option(
             "--source",
             "-s",
-            help="Path to the directory where individual source component files are stored.",
+            help=(
+                "Path to the directory where individual source component files are stored. "
+                "Can be repeated to layer directories over each other."
+            ),
             show_default="source or src/source",
             dir_okay=True,
             file_okay=False,
@@ -93,7 +99,52 @@ def join(
             help="Sort paths alphabetically when traversing source directory before join.",
         ),
     ] = False,
+    source_map: Annotated[
+        bool,
+        typer.Option(
+            "--source-map",
+            help="Record which lines of extension.yaml each source file occupies.",
+        ),
+    ] = False,
+    incremental: Annotated[
+        bool,
+        typer.Option(
+            "--incremental",
+            "-i",
+            help="Re-render only the changed source files and splice them into the existing extension.yaml.",
+        ),
+    ] = False,
     line_length: line_length_option = None,
+    emitter: emitter_option = "ruamel",
+    memory_report_table: memory_report_flag = False,
+    memory_report_json: memory_report_json_option = None,
+    only: only_option = None,
+    variant_specifications: Annotated[
+        Optional[list[str]],
+        typer.Option(
+            "--variant",
+            help=(
+                "Write this variant of extension.yaml, such as "
+                "target=build/dev/extension.yaml,dev,version=1.2.3. Can be repeated."
+            ),
+            show_default=False,
+        ),
+    ] = None,
+    matrix_file: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--matrix",
+            help="YAML file with a list of variants of extension.yaml to write.",
+            show_default=False,
+            dir_okay=False,
+            file_okay=True,
+            exists=True,
+            readable=True,
+        ),
+    ] = None,
+    projects: projects_option = None,
+    all_projects: all_projects_flag = False,
+    workers: project_workers_option = None,
     dry_run: dry_run_flag = False,
     remove_comments: remove_comments_flag = False,
     no_file_header: no_file_header_flag = False,
@@ -126,95 +177,209 @@ def join(
     When you add the --dev flag, yamlex will add the "custom:" prefix to the
     name of your extension and will put an explicit version into the final
     [i]extension.yaml[/i].
+
+    [b]Incremental join (--source-map and --incremental)[/b]
+
+    With --source-map, yamlex records which lines of the generated
+    [i]extension.yaml[/i] each source file occupies. The source map is kept
+    in the .yamlex directory of the current working directory.
+
+    With --incremental, yamlex uses the source map of the previous join to
+    re-render only the source files that changed since then and splices
+    them into the existing [i]extension.yaml[/i]. When files were added,
+    removed or renamed, when a grouper changed between a mapping and an
+    array, or when [i]extension.yaml[/i] was modified by hand, yamlex falls
+    back to a full join. The --dev and --line-length options always
+    require a full join.
+
+    [b]Partial join (--only)[/b]
+
+    With --only, yamlex assembles only the parts of the extension at the
+    given YAML paths, such as [i]screens[/i], [i]topology.types[/i] or
+    [i]snmp[*].subgroups[/i]. Keys may contain the wildcards * and ?, and
+    indexes are numbers or * for all items. Only the source files that can
+    contribute to these paths are parsed. The result is printed, unless
+    --target is given. Partial joins are never incremental and ignore
+    --dev.
+
+    [b]Many extensions (--all and --project)[/b]
+
+    With --all, yamlex finds every extension project within the current
+    directory, i.e. every directory with src/source/, or with source/ next
+    to extension/. Alternatively, list the projects with --project. The
+    projects are joined in parallel and a summary with the time and the
+    result of each project is printed at the end. Within every project,
+    --source and --target are relative to the project directory.
+
+    [b]Layered join (several --source directories)[/b]
+
+    When --source is repeated, the directories are layers of the same
+    source, such as a common base and a directory with the differences of
+    an on-prem flavour. Later layers override earlier ones by file and
+    directory: a file replaces the file or directory with the same name,
+    without its extension, within the earlier layers, and a directory is
+    merged with the same directory of the earlier layers. Prefixes such
+    as - and +, index files and ignored paths work as usual within every
+    layer. To remove a file or directory of an earlier layer, add an
+    empty file with its name and the ~ prefix, such as [i]~-cpu.yaml[/i]
+    or [i]~screens[/i]. Layered joins are never incremental and have no
+    source map.
+
+    [b]Variants (--variant and --matrix)[/b]
+
+    To write several variants of [i]extension.yaml[/i], such as a release
+    and a dev build, list them with --variant or in a --matrix file. The
+    source is assembled only once and the variants are written in
+    parallel, by --workers processes. Every variant is a comma-separated
+    list of options: the target, and any of dev, version, remove-comments,
+    line-length, no-file-header and emitter, such as
+    [i]target=build/legacy.yaml,remove-comments,line-length=80[/i]. Options
+    a variant does not set are taken from the command line. A matrix file
+    has a list of variants with the same options under the variants key:
+
+        variants:
+          - target: extension/extension.yaml
+          - target: build/dev/extension.yaml
+            dev: true
+            version: 1.2.3
+
+    Variants are never incremental and have no source map.
+
+    [b]Fast emitter (--emitter fast)[/b]
+
+    With --emitter fast, yamlex writes [i]extension.yaml[/i] with its own
+    writer instead of ruamel. The text is the same, but it is written
+    several times faster. It only supports files without comments,
+    anchors and tags, and no --line-length, so it is most useful together
+    with --remove-comments. Anything else is written by ruamel.
+
+    [b]Memory report (--memory-report)[/b]
+
+    With --memory-report, yamlex traces its memory allocations and prints
+    a table of the phases of the join: scanning the source directory,
+    parsing, comment stripping, merging the files, the path index,
+    dumping [i]extension.yaml[/i] and storing its snapshot for diff.
+    Every phase shows the peak memory while it ran and the net memory it
+    allocated and kept. A second table estimates the memory retained by
+    every top-level section of the extension, such as metrics or screens.
+    With --memory-report-json, the same report is written as JSON.
+    Tracing makes the join several times slower.
     """
     adjust_root_logger(verbose, quiet)
 
-    source = source or get_default_extension_source_dir_path()
-    logger.debug(f"Source files directory: {source}")
+    if emitter not in EMITTERS:
+        logger.error(f"Unknown emitter {emitter}. Use one of: {', '.join(EMITTERS)}.")
+        raise typer.Exit(2)
 
-    with warnings.catch_warnings(record=True) as caught_warnings:
-        warnings.simplefilter("always")
-        extension = assemble_recursively(
-            source,
-            keep_formatting=keep_formating,
-            sort_paths=sort_paths,
-            dry_run=dry_run,
+    if only and (projects or all_projects):
+        logger.error("--only cannot be combined with --all or --project.")
+        raise typer.Exit(2)
+
+    variants = None
+    if variant_specifications or matrix_file:
+        if target or only or incremental or source_map or projects or all_projects:
+            logger.error(
+                "Variants cannot be combined with --target, --only, --incremental, "
+                "--source-map, --all or --project."
+            )
+            raise typer.Exit(2)
+        defaults = Variant(
+            target=Path(),
+            dev=dev,
+            version=version,
             remove_comments=remove_comments,
+            line_length=line_length,
+            no_file_header=no_file_header,
+            emitter=emitter,
         )
+        variants = read_matrix_file(matrix_file, defaults) if matrix_file else []
+        variants.extend(parse_variant(v, defaults) for v in variant_specifications or [])
 
-        index_file_paths: list[str] = []
-        for w in caught_warnings:
-            if w.category is UnintendedIndexFileWarning:
-                index_file_paths.append(w.message.args[0])
-
-        # Explicitly disabled until we bump major version. For now we
-        # support index.yaml files as usual.
-        # if dry_run and index_file_paths:
-        #     print(f"Warning! index.yaml files found.")
-        #     for i in index_file_paths:
-        #         print(i)
-        #     print((
-        #         "Newer versions of Yamlex no longer use index files as "
-        #         "groupers. If you intend to have a field called 'index', "
-        #         "ignore this warning. Otherwise, prefix the index file with "
-        #         f"a grouper sign like so: +index.yaml. This warning will be "
-        #         "removed in the later versions of Yamlex."
-        #     ))
-
-    # An assembled extension cannot be an array.
-    if isinstance(extension, list):
-        raise WrongExtensionStructureError((
-            "Error! Invalid source directory structure. "
-            "Assembled extension is an array while object is expected."
-        ))
-
-    # An assembled extension cannot be empty
-    if not extension:
-        raise EmptyAssembledExtensionError(
-            "Error! Failed to assemble the extension. The result is empty."
-        )
+    if (memory_report_table or memory_report_json) and (projects or all_projects):
+        logger.error("--memory-report cannot be combined with --all or --project.")
+        raise typer.Exit(2)
 
-    # Figure out the current version
-    yaml_version = extension.get("version")
-
-    if dev:
-        name = extension.get("name")
-        if isinstance(name, str) and not name.startswith("custom:"):
-            name = f"custom:{name}"
-            extension["name"] = name
-            logger.info(f"Dev mode extension name: {name}")
-
-        # If new version is not explicitly specified
-        if not version:
-            current_version = parse_version(yaml_version)
-            if not current_version:
-                current_version = read_version_properties("version.properties")
-                logger.info(f"Version found in version.properties: {current_version}")
-
-        # Update version, if new explicit version was specified
-        if not version:
-            version = current_version
-
-        # Explicitly add version to generated extension.yaml
-        if yaml_version != version:
-            extension["version"] = version
-            logger.info(f"Explicit version in dev mode: {version}")
-
-    target = target or get_default_extension_dir_path() / "extension.yaml"
-    logger.debug(f"Target file: {target}")
-
-    # Check if the target file exists and was created manually
-    if is_manually_created(target) and not force:
-        raise OverwritingManuallyCreatedFileError(
-            f"The {target} file was created manually. Use --force to overwrite it."
+    if projects or all_projects:
+        run_projects(
+            join_task,
+            {
+                "source": sources[0] if sources else None,
+                "overlays": sources[1:] if sources else None,
+                "target": target,
+                "dev": dev,
+                "version": version,
+                "keep_formatting": keep_formating,
+                "sort_paths": sort_paths,
+                "remove_comments": remove_comments,
+                "line_length": line_length,
+                "add_file_header": not no_file_header,
+                "force": force,
+                "dry_run": dry_run,
+                "source_map": source_map,
+                "incremental": incremental,
+                "emitter": emitter,
+            },
+            projects,
+            all_projects,
+            workers,
         )
 
-    # Write to output file
-    should_add_file_header = not no_file_header
-    write_file(
-        target,
-        extension,
-        add_file_header=should_add_file_header,
-        line_length=line_length,
-        dry_run=dry_run,
-    )
+    source, *overlays = sources or [get_default_extension_source_dir_path()]
+    logger.debug(f"Source files directory: {source}")
+    for overlay in overlays:
+        logger.debug(f"Overlay directory: {overlay}")
+
+    with memory_report(memory_report_table, memory_report_json):
+        if variants:
+            join_matrix(
+                source,
+                variants,
+                keep_formatting=keep_formating,
+                sort_paths=sort_paths,
+                force=force,
+                dry_run=dry_run,
+                overlays=overlays,
+                workers=workers,
+            )
+            return
+
+        # Partial joins are printed, unless a target is given explicitly
+        if only:
+            result = join_extension(
+                source,
+                target,
+                keep_formatting=keep_formating,
+                sort_paths=sort_paths,
+                remove_comments=remove_comments,
+                line_length=line_length,
+                add_file_header=not no_file_header,
+                force=force,
+                dry_run=dry_run,
+                only=only,
+                emitter=emitter,
+                overlays=overlays,
+            )
+            if target is None:
+                with phase("dump"):
+                    print(dump_yaml(result.extension, line_length=line_length, emitter=emitter), end="")
+            return
+
+        target = target or get_default_extension_dir_path() / "extension.yaml"
+
+        join_extension(
+            source,
+            target,
+            dev=dev,
+            version=version,
+            keep_formatting=keep_formating,
+            sort_paths=sort_paths,
+            remove_comments=remove_comments,
+            line_length=line_length,
+            add_file_header=not no_file_header,
+            force=force,
+            dry_run=dry_run,
+            source_map=source_map,
+            incremental=incremental,
+            emitter=emitter,
+            overlays=overlays,
+        )
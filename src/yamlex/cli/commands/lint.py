@@ -0,0 +1,112 @@
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+import typer
+from typing_extensions import Annotated
+
+from yamlex.api.cache import get_cache
+from yamlex.api.linter import RULES, lint as lint_extension
+from yamlex.api.selector import format_path
+from yamlex.api.util import (
+    adjust_root_logger,
+    get_default_extension_source_dir_path,
+)
+from yamlex.cli.common_flags import (
+    verbose_flag,
+    quiet_flag,
+)
+
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("text", "json")
+
+
+def lint(
+    source: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--source",
+            "-s",
+            help="Path to the source directory or the extension.yaml file to check.",
+            show_default="source or src/source",
+            dir_okay=True,
+            file_okay=True,
+            exists=True,
+            readable=True,
+        )
+    ] = None,
+    output_format: Annotated[
+        str,
+        typer.Option(
+            "--format",
+            "-f",
+            help="Output format of the findings: text or json.",
+        ),
+    ] = "text",
+    workers: Annotated[
+        Optional[int],
+        typer.Option(
+            "--workers",
+            "-w",
+            help="Number of parallel processes that run the rules.",
+            show_default="run in this process",
+            min=1,
+        ),
+    ] = None,
+    verbose: verbose_flag = False,
+    quiet: quiet_flag = False,
+) -> None:
+    """
+    Check the extension for inconsistencies across its parts.
+
+    The extension is assembled once and its metric keys, screens, topology
+    types, relationships, datasource groups, subgroups and processes are
+    collected into a symbol table. The rules then look up the table:
+
+    - [i]duplicate-*[/i]: the same metric key, screen, topology type,
+      relationship, group, subgroup or process is defined more than once.
+    - [i]unknown-metric[/i]: a screen refers to a metric that is not
+      defined in metrics. Metrics of other namespaces, such as
+      builtin:host.cpu.usage, and arguments of transformations, such as
+      the dimension in :splitBy(dt.entity.host), are not checked.
+    - [i]unknown-entity-type[/i]: a screen or a relationship refers to an
+      entity type of the extension that is not defined in topology.types.
+      Types without a namespace, such as host, are built into Dynatrace
+      and not checked.
+    - [i]split-collision[/i]: different names that split writes into the
+      same file, so that one overwrites the other.
+
+    Every finding points to the source file and line it comes from. With
+    [i]--format json[/i], the findings are printed as a JSON list with the
+    rule, severity, message, path, file and line of each.
+
+    Exits with exit code 1 if there is any finding with the error severity.
+    """
+    adjust_root_logger(verbose, quiet)
+
+    if output_format not in OUTPUT_FORMATS:
+        logger.error(f"Unknown format {output_format}. Use one of: {', '.join(OUTPUT_FORMATS)}.")
+        raise typer.Exit(2)
+
+    source = source or get_default_extension_source_dir_path()
+    logger.debug(f"Linting {source} with {len(RULES)} rules")
+
+    findings = lint_extension(source, workers=workers, cache=get_cache())
+
+    if output_format == "json":
+        print(json.dumps([f.as_dict() for f in findings], indent=2))
+    else:
+        for finding in findings:
+            location = f"{finding.file}:{finding.line}" if finding.file else format_path(finding.path)
+            print(f"{location}: {finding.severity} [{finding.rule}] {finding.message}")
+
+    errors = sum(1 for f in findings if f.severity == "error")
+    if findings:
+        logger.info(f"Findings: {len(findings)}, errors: {errors}")
+    else:
+        logger.info("No findings.")
+    if errors:
+        raise typer.Exit(1)
@@ -0,0 +1,54 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+import typer
+from typing_extensions import Annotated
+
+from yamlex.api.util import adjust_root_logger
+from yamlex.cli.lsp import serve_lsp
+from yamlex.cli.common_flags import (
+    verbose_flag,
+    quiet_flag,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def lsp(
+    source: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--source",
+            "-s",
+            help="Path to the source directory, relative to the workspace.",
+            show_default="source or src/source",
+            dir_okay=True,
+            file_okay=False,
+        ),
+    ] = None,
+    verbose: verbose_flag = False,
+    quiet: quiet_flag = False,
+) -> None:
+    """
+    Run a language server for the source directory on stdin and stdout.
+
+    Editors start the server themselves, for example through a generic
+    language client extension that runs [i]yamlex lsp[/i] for YAML files.
+    The server indexes the source directory once and then parses only the
+    files that change, including unsaved edits. It provides:
+
+    - [b]Go to definition[/b] from a metric key used in a screen, such as
+      within [i]metricSelector[/i] or [i]metricKey[/i], to the metric that
+      defines it.
+    - [b]Find references[/b] of a metric key within all screens.
+    - [b]Diagnostics[/b] for YAML syntax errors, duplicate keys within a
+      directory, items that do not belong into an array directory, index
+      files with arrays and duplicate metric keys. Directory layouts are
+      checked with the same rules as [i]yamlex join[/i].
+
+    Logs are written to stderr, so that they do not mix with the protocol.
+    """
+    adjust_root_logger(verbose, quiet)
+    raise typer.Exit(serve_lsp(source))
@@ -11,6 +11,7 @@ from yamlex.api.mapper import (
     map_schema_to_sources,
     read_vscode_settings_json_file,
     extract_definitions_into_standalone_schemas,
+    bundle_schemas,
 )
 from yamlex.api.util import (
     adjust_root_logger,
@@ -78,11 +79,42 @@ def map(
             file_okay=True,
         )
     ] = None,
+    deduplicate: Annotated[
+        bool,
+        typer.Option(
+            "--deduplicate",
+            help="Store identical extracted definitions only once and reference them with $ref.",
+        ),
+    ] = False,
+    bundle: Annotated[
+        bool,
+        typer.Option(
+            "--bundle",
+            help="Map files to bundled schemas with all references resolved ahead of time.",
+        ),
+    ] = False,
     verbose: verbose_flag = False,
     quiet: quiet_flag = False,
 ) -> None:
     """
     Map JSON schema to YAML files in VS Code settings.
+
+    [b]Deduplicating extracted definitions (--deduplicate)[/b]
+
+    Many definitions extracted from different schema files are identical,
+    such as shared enums and types. With --deduplicate, every unique
+    definition is written only once and the duplicates point at the shared
+    file through $ref. This reduces the amount of schema the YAML language
+    server needs to load.
+
+    [b]Bundled schemas (--bundle)[/b]
+
+    By default, the mapped schema files reference each other, and the YAML
+    language server resolves those references while you type. With
+    --bundle, yamlex produces one self-contained schema for every mapped
+    part type in the bundled/ subfolder of the schema directory and maps
+    the parts to it. Recursive references are kept in a local definitions
+    block. Bundles are regenerated only when the schema files change.
     """
     adjust_root_logger(verbose, quiet)
     logger.debug(f"JSON schema files directory: {schema}")
@@ -100,7 +132,7 @@ def map(
 
     # Make schema more granular by extracting embedded definitions into
     # separate schema files.
-    extract_definitions_into_standalone_schemas(schema)
+    extract_definitions_into_standalone_schemas(schema, deduplicate=deduplicate)
 
     # Update yaml.schemas mapping in settings.json
     vscode_settings = read_vscode_settings_json_file(settings)
@@ -114,6 +146,21 @@ def map(
     
     # Update the mapping
     mapping_update = map_schema_to_sources(schema, source, root, extension_yaml)
+    if bundle:
+        schema_file_names = [Path(p).name for p in mapping_update]
+        bundled_schema = bundle_schemas(schema, schema_file_names)
+        mapping_update = map_schema_to_sources(
+            bundled_schema,
+            source,
+            root,
+            extension_yaml,
+        )
+
+    # Delete mappings of the same files to other schemas, for example
+    # when switching between bundled and regular schemas
+    for k, v in list(mapping.items()):
+        if k not in mapping_update and v in mapping_update.values():
+            del mapping[k]
     mapping.update(mapping_update)
 
     # Write the updated settings.json file
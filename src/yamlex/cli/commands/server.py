@@ -0,0 +1,71 @@
+import logging
+
+import typer
+from typing_extensions import Annotated
+
+from yamlex.api.util import adjust_root_logger
+from yamlex.cli.server import (
+    DEFAULT_IDLE_TIMEOUT,
+    is_supported,
+    serve,
+    stop_server,
+)
+from yamlex.cli.common_flags import (
+    verbose_flag,
+    quiet_flag,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def server(
+    idle_timeout: Annotated[
+        float,
+        typer.Option(
+            "--idle-timeout",
+            help="Stop the server after this many seconds without commands.",
+            min=1,
+        ),
+    ] = DEFAULT_IDLE_TIMEOUT,
+    stop: Annotated[
+        bool,
+        typer.Option(
+            "--stop",
+            help="Stop the server running in the current working directory.",
+        ),
+    ] = False,
+    verbose: verbose_flag = False,
+    quiet: quiet_flag = False,
+) -> None:
+    """
+    Keep yamlex running in the background to speed up repeated commands.
+
+    The server listens on a Unix socket in the .yamlex directory of the
+    current working directory. Other yamlex commands started in the same
+    directory find the server and let it run the command instead of
+    starting from scratch. The server keeps parsed source files and
+    assembled extensions in memory and reads files again only when they
+    change.
+
+    The server stops after --idle-timeout seconds without any commands, or
+    when [i]yamlex server --stop[/i] is run. Commands run in their own
+    process again as soon as no server is running.
+
+    Set the YAMLEX_NO_SERVER environment variable to always run commands in
+    their own process.
+    """
+    adjust_root_logger(verbose, quiet)
+
+    if not is_supported():
+        logger.error("The server requires Unix domain sockets.")
+        raise typer.Exit(1)
+
+    if stop:
+        if stop_server():
+            logger.info("Server stopped.")
+        else:
+            logger.info("No server is running.")
+        return
+
+    serve(idle_timeout=idle_timeout)
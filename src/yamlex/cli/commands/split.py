@@ -5,13 +5,12 @@ from typing import Optional
 import typer
 from typing_extensions import Annotated
 
-from yamlex.api.splitter import split_yaml
+from yamlex.api.operations import split as split_extension
 from yamlex.api.util import (
+    EMITTERS,
     adjust_root_logger,
     get_default_extension_dir_path,
     get_default_extension_source_dir_path,
-    is_manually_created,
-    write_file,
     indent,
 )
 from yamlex.cli.common_flags import (
@@ -21,8 +20,12 @@ from yamlex.cli.common_flags import (
     quiet_flag,
     dry_run_flag,
     line_length_option,
+    emitter_option,
+    memory_report_flag,
+    memory_report_json_option,
     remove_comments_flag,
 )
+from yamlex.cli.memory import memory_report
 
 
 logger = logging.getLogger(__name__)
@@ -55,7 +58,20 @@ def split(
             writable=True,
         ),
     ] = None,
+    keep_layout: Annotated[
+        bool,
+        typer.Option(
+            "--keep-layout",
+            help=(
+                "Update the existing files of --target instead of writing the "
+                "default layout. Only files whose content changed are written."
+            ),
+        ),
+    ] = False,
     line_length: line_length_option = None,
+    emitter: emitter_option = "ruamel",
+    memory_report_table: memory_report_flag = False,
+    memory_report_json: memory_report_json_option = None,
     dry_run: dry_run_flag = False,
     remove_comments: remove_comments_flag = False,
     no_file_header: no_file_header_flag = False,
@@ -81,32 +97,74 @@ def split(
     to be manually created and is not overwritten. You can still force
     the overwrite using the --force flag.
 
+    [b]Keep the existing layout (--keep-layout)[/b]:
+
+    With --keep-layout, yamlex does not write its default layout. Instead,
+    it assembles the existing --target folder to find out which file
+    holds which part of [i]extension.yaml[/i], and writes the new content
+    of every file that changed, keeping its comments. Array items, such as
+    metrics or screens, are matched by their key, entityType, name, etc.
+    rather than by their position. Added keys and items go into the index
+    or grouper file of their folder or into new files, and files whose
+    content was removed are deleted. Edits of comments only are not
+    written, and new items are placed in the order of the files.
+
     [b]Remove 'Generated with yamlex' header from split files[/b]:
 
     When splitting, you can choose to not add the 'Generated by yamlex'
     header to the generated files by using the --no-file-header flag.
+
+    [b]Fast emitter (--emitter fast)[/b]:
+
+    With --emitter fast, the parts are written by the faster writer of
+    yamlex instead of ruamel, with the same text. Parts with comments are
+    still written by ruamel, so it is most useful with --remove-comments.
+
+    [b]Memory report (--memory-report)[/b]:
+
+    With --memory-report, yamlex prints the peak and net memory of every
+    phase of the split: parsing, comment stripping, splitting and dumping
+    the parts, and the estimated memory retained by every top-level
+    section of [i]extension.yaml[/i]. With --memory-report-json, the same
+    report is written as JSON.
     """
     adjust_root_logger(verbose, quiet)
 
+    if emitter not in EMITTERS:
+        logger.error(f"Unknown emitter {emitter}. Use one of: {', '.join(EMITTERS)}.")
+        raise typer.Exit(2)
+
+    if keep_layout and remove_comments:
+        logger.error("--keep-layout cannot be combined with --remove-comments.")
+        raise typer.Exit(2)
+
     source = source or get_default_extension_dir_path() / "extension.yaml"
     logger.debug(f"Source file: {source}")
 
     target = target or get_default_extension_source_dir_path()
     logger.debug(f"Target directory: {target}")
 
-    split_parts = split_yaml(
-        source,
-        target,
-        remove_comments=remove_comments,
-    )
-
-    parts_to_skip: list[Path] = []
-    for path in split_parts.keys():
-        if is_manually_created(path) and not force:
-            part = split_parts.pop(path)
-            parts_to_skip.append(part)
+    with memory_report(memory_report_table, memory_report_json):
+        result = split_extension(
+            source,
+            target,
+            remove_comments=remove_comments,
+            line_length=line_length,
+            add_file_header=not no_file_header,
+            force=force,
+            dry_run=dry_run,
+            emitter=emitter,
+            keep_layout=keep_layout,
+        )
+
+    if keep_layout:
+        logger.info((
+            f"{len(result.written)} part files written, {len(result.removed)} "
+            f"removed, {result.unchanged} unchanged."
+        ))
+        return
 
-    if parts_to_skip:
+    if result.skipped:
         logger.info((
             "The following split parts will not be written, because "
             "an unmarked file with the same name already exists in the "
@@ -115,20 +173,12 @@ def split(
             "manually created or edited. Use --force to overwrite this "
             "behavior."
         ))
-        for p in parts_to_skip:
+        for p in result.skipped:
             logger.info(f"{indent(1)}Skip: {p}")
 
-    if not split_parts:
+    if not result.written:
         logger.info("No part files to be written.")
     else:
         logger.info("The following part files will be written:")
-        for path, part in split_parts.items():
-            write_file(
-                path,
-                part,
-                add_file_header=not no_file_header,
-                line_length=line_length,
-                dry_run=dry_run,
-                print_to_stdout=False,
-            )
+        for path in result.written:
             logger.info(f"{indent(1)}Added: {path}")
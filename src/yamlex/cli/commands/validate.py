@@ -0,0 +1,163 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+import typer
+from typing_extensions import Annotated
+
+from yamlex.api.mapper import validate_json_schemas_dir
+from yamlex.api.validator import validate as validate_data
+from yamlex.api.projects import validate_task
+from yamlex.api.util import (
+    adjust_root_logger,
+    get_cache_dir_path,
+    get_default_extension_dir_path,
+    get_default_extension_source_dir_path,
+    indent,
+)
+from yamlex.cli.common_flags import (
+    verbose_flag,
+    quiet_flag,
+    projects_option,
+    all_projects_flag,
+)
+from yamlex.cli.projects import run_projects
+
+
+logger = logging.getLogger(__name__)
+
+
+def validate(
+    schema: Annotated[
+        Path,
+        typer.Option(
+            "--json",
+            "-j",
+            help="Path to directory with valid extensions JSON schema files.",
+            dir_okay=True,
+            file_okay=False,
+        ),
+    ] = Path("schema"),
+    source: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--source",
+            "-s",
+            help="Path to the directory where individual source component files are stored.",
+            show_default="source or src/source",
+            dir_okay=True,
+            file_okay=False,
+        )
+    ] = None,
+    root: Annotated[
+        Path,
+        typer.Option(
+            "--root",
+            "-r",
+            help="Root directory relative to which the schemas are mapped to files.",
+            dir_okay=True,
+            file_okay=False,
+        )
+    ] = Path("."),
+    extension_yaml: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--extension-yaml",
+            "-e",
+            help="Path to the assembled extension.yaml file.",
+            show_default="extension/extension.yaml or src/extension/extension.yaml",
+            dir_okay=False,
+            file_okay=True,
+        )
+    ] = None,
+    workers: Annotated[
+        Optional[int],
+        typer.Option(
+            "--workers",
+            "-w",
+            help="Number of parallel validation processes.",
+            show_default="number of CPUs",
+            min=1,
+        ),
+    ] = None,
+    no_cache: Annotated[
+        bool,
+        typer.Option(
+            "--no-cache",
+            help="Validate all files, even those unchanged since the last successful run.",
+        ),
+    ] = False,
+    projects: projects_option = None,
+    all_projects: all_projects_flag = False,
+    verbose: verbose_flag = False,
+    quiet: quiet_flag = False,
+) -> None:
+    """
+    Validate source parts and [i]extension.yaml[/i] against the JSON schema.
+
+    Uses the same mapping of schema files to YAML files as the map command,
+    so run [i]yamlex map[/i] first to extract the granular schema files.
+
+    Each schema is compiled into a validator only once. Compiled validators
+    and the list of files that passed validation are cached in the .yamlex
+    directory under --root. Files that did not change since they last passed
+    validation are skipped, unless --no-cache is given.
+
+    Exits with exit code 0 if all files are valid. Otherwise, the errors are
+    printed together with file paths and the exit code is 1.
+
+    [b]Many extensions (--all and --project)[/b]
+
+    With --all or --project, every extension project is validated, with
+    --workers projects in parallel. All paths are relative to the
+    project directory, because schema files are mapped to the source
+    files relative to --root.
+    """
+    adjust_root_logger(verbose, quiet)
+
+    if projects or all_projects:
+        run_projects(
+            validate_task,
+            {
+                "schema": schema,
+                "source": source,
+                "root": root,
+                "extension_yaml": extension_yaml,
+                "use_cache": not no_cache,
+            },
+            projects,
+            all_projects,
+            workers,
+        )
+    logger.debug(f"JSON schema files directory: {schema}")
+    logger.debug(f"Root dir: {root}")
+
+    source = source or get_default_extension_source_dir_path()
+    logger.debug(f"Extension YAML source files directory: {source}")
+
+    extension_yaml = extension_yaml or get_default_extension_dir_path() / "extension.yaml"
+    logger.debug(f"extension.yaml file: {extension_yaml}")
+
+    # Make sure schemas directory contains extension.schema.json
+    validate_json_schemas_dir(schema)
+
+    errors = validate_data(
+        schema=schema,
+        sources=source,
+        root=root,
+        extension_yaml=extension_yaml,
+        cache_dir_path=get_cache_dir_path(root),
+        workers=workers,
+        use_cache=not no_cache,
+    )
+
+    for path, path_errors in errors.items():
+        print(f"{path}:")
+        for error in path_errors:
+            print(f"{indent(1)}{error}")
+
+    if errors:
+        logger.info(f"Invalid files: {len(errors)}")
+        raise typer.Exit(1)
+
+    logger.info("All files are valid.")
@@ -0,0 +1,161 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+import typer
+from typing_extensions import Annotated
+
+from yamlex.api.exceptions import PathIndexNotFound
+from yamlex.api.joiner import load_yaml_file
+from yamlex.api.pathindex import (
+    files_within,
+    get_path_index_path,
+    locate,
+    locate_line,
+    read_path_index,
+    source_file_path,
+    write_path_index,
+)
+from yamlex.api.selector import (
+    find_paths,
+    format_path,
+    is_concrete,
+    parse_selector,
+    to_path,
+)
+from yamlex.api.snapshot import get_snapshot_path, read_snapshot
+from yamlex.api.util import (
+    adjust_root_logger,
+    get_cache_dir_path,
+    get_default_extension_dir_path,
+    hash_file,
+)
+from yamlex.cli.common_flags import (
+    verbose_flag,
+    quiet_flag,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def where(
+    expression: Annotated[
+        Optional[str],
+        typer.Argument(
+            help="YAML path within extension.yaml, such as metrics[12].metadata.unit.",
+            show_default=False,
+        ),
+    ] = None,
+    line: Annotated[
+        Optional[int],
+        typer.Option(
+            "--line",
+            "-l",
+            help="Line number within extension.yaml to look up instead of a path.",
+            show_default=False,
+            min=1,
+        ),
+    ] = None,
+    target: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--target",
+            "-t",
+            help="Path to the extension.yaml file that was assembled by join.",
+            show_default="extension/extension.yaml or src/extension/extension.yaml",
+            dir_okay=False,
+            file_okay=True,
+            exists=True,
+            readable=True,
+        )
+    ] = None,
+    verbose: verbose_flag = False,
+    quiet: quiet_flag = False,
+) -> None:
+    """
+    Print the source file and line that define a path of [i]extension.yaml[/i].
+
+    Every join records where each source file ends up within
+    [i]extension.yaml[/i], so that lookups need neither the source
+    directory nor another join. Pass a path, such as
+    [i]metrics[12].metadata.unit[/i], or a line number of
+    [i]extension.yaml[/i] with [i]--line[/i].
+
+    Filters, wildcards and negative indexes, such as
+    [i]metrics\\[key=com.foo.cpu][/i], are resolved within
+    [i]extension.yaml[/i] first.
+
+    If the path is not found within the source file, for example because
+    it does not exist, the line of its closest parent is printed. If the
+    path is assembled from several files, such as a directory of array
+    items, all of them are printed.
+    """
+    adjust_root_logger(verbose, quiet)
+
+    if (expression is None) == (line is None):
+        logger.error("Pass either a path or --line.")
+        raise typer.Exit(2)
+
+    target = target or get_default_extension_dir_path() / "extension.yaml"
+    path_index_path = get_path_index_path(get_cache_dir_path(Path(".")), target)
+    path_index = read_path_index(path_index_path)
+    if path_index is None:
+        raise PathIndexNotFound(
+            f"No path index found for {target}. Run yamlex join to create it."
+        )
+    if path_index["target_hash"] != hash_file(target):
+        logger.warning(f"{target} changed since the last join, the results may be outdated.")
+
+    if line is not None:
+        target_lines = path_index.get("target_lines")
+        expression = locate_line(path_index, target, line)
+        if path_index.get("target_lines") is not target_lines:
+            write_path_index(path_index_path, path_index)
+        if expression is None:
+            logger.error(f"Line {line} is not within any value of {target}.")
+            raise typer.Exit(1)
+        logger.info(f"Line {line} is within {expression}")
+
+    selector = parse_selector(expression)
+    if is_concrete(selector):
+        paths = [to_path(selector)]
+    else:
+        data = read_snapshot(get_snapshot_path(get_cache_dir_path(Path(".")), target), target)
+        if data is None:
+            data = load_yaml_file(target)
+        paths = list(find_paths(data, selector))
+        if not paths:
+            logger.error(f"Nothing found at {expression} in {target}.")
+            raise typer.Exit(1)
+
+    # Entries of files that changed since the join are read again while
+    # locating, and written back so that later calls do not read them again
+    stats = [entry["stat"] for entry in path_index["files"]]
+    found = False
+    for path in paths:
+        location = locate(path_index, path)
+        if location is not None:
+            entry, file_line, found_path = location
+            if found_path != path:
+                logger.info(
+                    f"{format_path(path)} not found in {entry['file']}, "
+                    f"showing {format_path(found_path) or 'its beginning'}"
+                )
+            print(f"{source_file_path(path_index, entry).as_posix()}:{file_line}")
+            found = True
+            continue
+
+        # Assembled from a directory, every file within it is printed
+        for entry in files_within(path_index, path):
+            location = locate(path_index, entry["path"])
+            file_line = location[1] if location is not None else entry["lines"].get("", 1)
+            print(f"{source_file_path(path_index, entry).as_posix()}:{file_line}\t{format_path(entry['path'])}")
+            found = True
+
+    if [entry["stat"] for entry in path_index["files"]] != stats:
+        write_path_index(path_index_path, path_index)
+
+    if not found:
+        logger.error(f"No source file defines {expression}.")
+        raise typer.Exit(1)
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Optional
 
 import typer
@@ -57,4 +58,68 @@ line_length_option = Annotated[
         help="Maximum line length in the generated extension.yaml.",
         show_default="not limited",
     ),
-]
\ No newline at end of file
+]
+projects_option = Annotated[
+    Optional[list[Path]],
+    typer.Option(
+        "--project",
+        "-p",
+        help="Run in this extension project directory instead of the current one. Can be repeated.",
+        show_default=False,
+        dir_okay=True,
+        file_okay=False,
+        exists=True,
+    ),
+]
+all_projects_flag = Annotated[
+    bool,
+    typer.Option(
+        "--all",
+        help="Run in every extension project found within the current directory.",
+    ),
+]
+project_workers_option = Annotated[
+    Optional[int],
+    typer.Option(
+        "--workers",
+        "-w",
+        help="Number of projects processed in parallel with --all or --project, or of variants written in parallel by join.",
+        show_default="number of CPUs",
+        min=1,
+    ),
+]
+only_option = Annotated[
+    Optional[list[str]],
+    typer.Option(
+        "--only",
+        help="Only process the part at this YAML path, such as screens or snmp[*].subgroups. Can be repeated.",
+        show_default=False,
+    ),
+]
+emitter_option = Annotated[
+    str,
+    typer.Option(
+        "--emitter",
+        help=(
+            "Writer of the YAML files: ruamel, or fast for files without "
+            "comments. Falls back to ruamel for anything fast does not support."
+        ),
+    ),
+]
+memory_report_flag = Annotated[
+    bool,
+    typer.Option(
+        "--memory-report",
+        help="Print the memory used by every phase and by every top-level section of the extension.",
+    ),
+]
+memory_report_json_option = Annotated[
+    Optional[Path],
+    typer.Option(
+        "--memory-report-json",
+        help="Write the memory report as JSON to this file.",
+        show_default=False,
+        dir_okay=False,
+        file_okay=True,
+    ),
+]
@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import IO, Any, Callable, Optional
+from urllib.parse import unquote, urlparse
+
+
+logger = logging.getLogger(__name__)
+
+# JSON-RPC error codes, see the Language Server Protocol specification
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+# Kinds of watched file events
+FILE_CREATED = 1
+FILE_CHANGED = 2
+FILE_DELETED = 3
+SEVERITIES = {"error": 1, "warning": 2}
+
+
+def serve_lsp(source: Optional[Path] = None) -> int:
+    """
+    Serve the Language Server Protocol on stdin and stdout until the client exits.
+
+    Returns the exit code the protocol asks for: 0 if the client asked to
+    shut down before it exited, 1 otherwise.
+    """
+    server = LanguageServer(sys.stdout.buffer, source)
+    while not server.exited:
+        message = read_message(sys.stdin.buffer)
+        if message is None:
+            break
+        server.handle(message)
+    return 0 if server.shut_down else 1
+
+
+def read_message(stream: IO[bytes]) -> Optional[dict]:
+    """Read one message with its headers. Returns None at the end of the stream."""
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return {}
+    return json.loads(stream.read(length))
+
+
+def write_message(stream: IO[bytes], message: dict) -> None:
+    body = json.dumps(message).encode("utf-8")
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    stream.flush()
+
+
+def uri_to_path(uri: str) -> Path:
+    path = unquote(urlparse(uri).path)
+    # Windows paths look like /C:/...
+    if len(path) > 2 and path[0] == "/" and path[2] == ":":
+        path = path[1:]
+    return Path(os.path.abspath(path))
+
+
+def path_to_uri(path: Path) -> str:
+    return Path(os.path.abspath(path)).as_uri()
+
+
+class LanguageServer:
+    def __init__(self, out: IO[bytes], source: Optional[Path] = None):
+        self.out = out
+        self.source = source
+        self.index = None
+        # Files open in the client, which are read from the client instead of the disk
+        self.open_files: set[Path] = set()
+        # Diagnostics last sent for every file, to only send changes
+        self.published: dict[Path, list[dict]] = {}
+        # Whether the client sends events of files changed outside of it
+        self.watch_files = False
+        self.shut_down = False
+        self.exited = False
+        self.next_request_id = 0
+        self.requests: dict[str, Callable[[dict], Any]] = {
+            "initialize": self.initialize,
+            "shutdown": self.shutdown,
+            "textDocument/definition": self.definition,
+            "textDocument/references": self.references,
+        }
+        self.notifications: dict[str, Callable[[dict], None]] = {
+            "initialized": self.initialized,
+            "exit": self.exit,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didClose": self.did_close,
+            "workspace/didChangeWatchedFiles": self.did_change_watched_files,
+        }
+
+    def handle(self, message: dict) -> None:
+        method = message.get("method")
+        if method is None:
+            # Responses to requests of the server are not needed
+            return
+        params = message.get("params") or {}
+        if self.index is None and method not in ("initialize", "exit"):
+            if "id" in message:
+                self.respond(message["id"], error={"code": SERVER_NOT_INITIALIZED, "message": "Not initialized"})
+            return
+
+        if "id" not in message:
+            handler = self.notifications.get(method)
+            if handler is not None:
+                try:
+                    handler(params)
+                except Exception as e:
+                    logger.exception(f"Failed to handle {method}: {e}")
+            return
+
+        handler = self.requests.get(method)
+        if handler is None:
+            self.respond(message["id"], error={"code": METHOD_NOT_FOUND, "message": f"Unknown method {method}"})
+            return
+        try:
+            result = handler(params)
+        except Exception as e:
+            logger.exception(f"Failed to handle {method}: {e}")
+            self.respond(message["id"], error={"code": INTERNAL_ERROR, "message": str(e)})
+            return
+        self.respond(message["id"], result=result)
+
+    def respond(self, request_id: Any, result: Any = None, error: Optional[dict] = None) -> None:
+        message: dict = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None:
+            message["error"] = error
+        else:
+            message["result"] = result
+        write_message(self.out, message)
+
+    def notify(self, method: str, params: dict) -> None:
+        write_message(self.out, {"jsonrpc": "2.0", "method": method, "params": params})
+
+    def request(self, method: str, params: dict) -> None:
+        self.next_request_id += 1
+        write_message(self.out, {
+            "jsonrpc": "2.0",
+            "id": f"yamlex-{self.next_request_id}",
+            "method": method,
+            "params": params,
+        })
+
+    def initialize(self, params: dict) -> dict:
+        # Imported here, so that the server answers the client right away
+        from yamlex.api.sourceindex import SourceIndex
+        from yamlex.cli.version import get_version
+
+        root = Path(os.getcwd())
+        if params.get("rootUri"):
+            root = uri_to_path(params["rootUri"])
+        elif params.get("rootPath"):
+            root = Path(params["rootPath"])
+
+        source = self.source
+        if source is None:
+            source = root / "src" / "source" if (root / "src").is_dir() else root / "source"
+        elif not source.is_absolute():
+            source = root / source
+
+        self.index = SourceIndex(source)
+        self.index.load()
+        self.watch_files = (
+            params.get("capabilities", {})
+            .get("workspace", {})
+            .get("didChangeWatchedFiles", {})
+            .get("dynamicRegistration", False)
+        )
+        return {
+            "capabilities": {
+                # Open files are sent in full on every change
+                "textDocumentSync": {"openClose": True, "change": 1},
+                "definitionProvider": True,
+                "referencesProvider": True,
+            },
+            "serverInfo": {"name": "yamlex", "version": get_version()},
+        }
+
+    def initialized(self, params: dict) -> None:
+        if self.watch_files:
+            # Created and deleted files change the layout of their directory
+            self.request("client/registerCapability", {"registrations": [{
+                "id": "yamlex-watched-files",
+                "method": "workspace/didChangeWatchedFiles",
+                "registerOptions": {"watchers": [{
+                    "globPattern": f"{self.index.root.as_posix()}/**/*",
+                }]},
+            }]})
+        self.publish_diagnostics()
+
+    def shutdown(self, params: dict) -> None:
+        self.shut_down = True
+
+    def exit(self, params: dict) -> None:
+        self.exited = True
+
+    def did_open(self, params: dict) -> None:
+        document = params["textDocument"]
+        path = uri_to_path(document["uri"])
+        self.open_files.add(path)
+        self.index.update_file(path, document["text"])
+        self.publish_diagnostics()
+
+    def did_change(self, params: dict) -> None:
+        changes = params["contentChanges"]
+        if not changes:
+            return
+        self.index.update_file(uri_to_path(params["textDocument"]["uri"]), changes[-1]["text"])
+        self.publish_diagnostics()
+
+    def did_close(self, params: dict) -> None:
+        # Unsaved changes are gone, read the file from the disk again
+        path = uri_to_path(params["textDocument"]["uri"])
+        self.open_files.discard(path)
+        if path.exists():
+            self.index.update_file(path)
+        else:
+            self.index.refresh_dir(path.parent)
+        self.publish_diagnostics()
+
+    def did_change_watched_files(self, params: dict) -> None:
+        from yamlex.api.ignore import IGNORE_FILE_NAME
+
+        for change in params.get("changes", []):
+            path = uri_to_path(change["uri"])
+            if path.name == IGNORE_FILE_NAME:
+                self.index.rescan_dir(path.parent)
+            elif change["type"] in (FILE_CREATED, FILE_DELETED):
+                self.index.refresh_dir(path.parent)
+            elif path not in self.open_files:
+                self.index.update_file(path)
+        self.publish_diagnostics()
+
+    def definition(self, params: dict) -> list[dict]:
+        name = self.symbol_at(params)
+        if name is None:
+            return []
+        return [as_location(location) for _, location in self.index.definitions(name)]
+
+    def references(self, params: dict) -> list[dict]:
+        name = self.symbol_at(params)
+        if name is None:
+            return []
+        locations = [as_location(location) for _, location in self.index.references(name)]
+        if params.get("context", {}).get("includeDeclaration", False):
+            locations.extend(as_location(location) for _, location in self.index.definitions(name))
+        return locations
+
+    def symbol_at(self, params: dict) -> Optional[str]:
+        position = params["position"]
+        path = uri_to_path(params["textDocument"]["uri"])
+        return self.index.symbol_at(path, position["line"], position["character"])
+
+    def publish_diagnostics(self) -> None:
+        """Send the diagnostics of every file whose problems changed."""
+        diagnostics = {
+            path: [as_diagnostic(problem) for problem in problems]
+            for path, problems in self.index.problems().items()
+        }
+        for path in set(self.published) | set(diagnostics):
+            file_diagnostics = diagnostics.get(path, [])
+            if self.published.get(path, []) == file_diagnostics:
+                continue
+            self.notify("textDocument/publishDiagnostics", {
+                "uri": path_to_uri(path),
+                "diagnostics": file_diagnostics,
+            })
+        self.published = diagnostics
+
+
+def as_location(location: Any) -> dict:
+    return {
+        "uri": path_to_uri(location.file),
+        "range": {
+            "start": {"line": location.line, "character": location.start},
+            "end": {"line": location.line, "character": location.end},
+        },
+    }
+
+
+def as_diagnostic(problem: Any) -> dict:
+    return {
+        "range": {
+            "start": {"line": problem.line, "character": problem.start},
+            "end": {"line": problem.line, "character": problem.end},
+        },
+        "severity": SEVERITIES[problem.severity],
+        "code": problem.code,
+        "source": "yamlex",
+        "message": problem.message,
+    }
@@ -0,0 +1,64 @@
+import json
+import logging
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from yamlex.api.memory import (
+    MemoryReport,
+    sorted_phases,
+    start_memory_report,
+    stop_memory_report,
+)
+from yamlex.api.util import format_table
+
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def memory_report(print_table: bool, json_path: Optional[Path]) -> Iterator[None]:
+    """
+    Report the memory used within the block, if asked to.
+
+    The table is printed to stderr, so that it does not mix with YAML
+    printed to stdout. The report is also written if the block fails.
+    """
+    if not print_table and json_path is None:
+        yield
+        return
+
+    start_memory_report()
+    try:
+        yield
+    finally:
+        report = stop_memory_report()
+        if print_table:
+            print(format_memory_report(report), file=sys.stderr)
+        if json_path is not None:
+            with open(json_path, "w") as f:
+                json.dump(report.as_dict(), f, indent=2)
+            logger.info(f"Memory report written: {json_path}")
+
+
+def format_memory_report(report: MemoryReport) -> str:
+    """The report as tables of phases and sections, sizes in MiB."""
+    rows = [("Phase", "Calls", "Peak MiB", "Net MiB")]
+    for p in sorted_phases(report):
+        rows.append((p.name, str(p.calls), mib(p.peak), mib(p.net)))
+    rows.append(("total", "", mib(report.peak), ""))
+    lines = format_table(rows)
+
+    if report.sections:
+        rows = [("Section", "Retained MiB")]
+        for name, size in sorted(report.sections.items(), key=lambda s: -s[1]):
+            rows.append((name, mib(size)))
+        rows.append(("total", mib(sum(report.sections.values()))))
+        lines.append("")
+        lines.extend(format_table(rows))
+    return "\n".join(lines)
+
+
+def mib(size: int) -> str:
+    return f"{size / 2 ** 20:.1f}"
@@ -0,0 +1,54 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+from yamlex.api.projects import Task, discover_projects, run_in_projects
+from yamlex.api.util import indent
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_projects(
+    task: Task,
+    options: dict,
+    projects: Optional[list[Path]],
+    all_projects: bool,
+    workers: Optional[int],
+) -> None:
+    """
+    Run the task in every project and print a summary.
+
+    Always exits: with exit code 0 if the task succeeded in all projects,
+    otherwise with exit code 1.
+    """
+    projects = list(projects or [])
+    if all_projects:
+        projects.extend(p for p in discover_projects(Path(".")) if p not in projects)
+
+    if not projects:
+        logger.error("No extension projects found.")
+        raise typer.Exit(1)
+
+    logger.info(f"Extension projects: {len(projects)}")
+    results = run_in_projects(task, projects, options, workers=workers)
+
+    for result in results:
+        if result.details:
+            print(f"{result.project}:")
+            for line in result.details:
+                print(f"{indent(1)}{line}")
+
+    width = max(len(str(result.project)) for result in results)
+    print("Summary:")
+    for result in results:
+        status = "ok" if result.code == 0 else f"exit code {result.code}"
+        print(f"{indent(1)}{str(result.project):<{width}}  {result.seconds:7.2f} s  {status}")
+
+    failed = [result for result in results if result.code != 0]
+    total = sum(result.seconds for result in results)
+    print(f"Projects: {len(results)}, failed: {len(failed)}, total time: {total:.2f} s")
+
+    raise typer.Exit(1 if failed else 0)
@@ -0,0 +1,196 @@
+import io
+import json
+import logging
+import os
+import socket
+import sys
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Relative to the workspace, because socket paths are limited to ~100 chars
+SOCKET_PATH = Path(".yamlex/server.sock")
+DEFAULT_IDLE_TIMEOUT = 600
+
+# Set to disable forwarding of commands to a running server
+NO_SERVER_ENV_VAR = "YAMLEX_NO_SERVER"
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def forward_to_server(args: list[str]) -> Optional[int]:
+    """
+    Run the command in the server of the current workspace.
+
+    Prints the output of the command and returns its exit code. Returns None
+    if no server is running, so that the command runs in-process instead.
+    """
+    if not is_supported() or os.environ.get(NO_SERVER_ENV_VAR):
+        return None
+    if not SOCKET_PATH.exists():
+        return None
+
+    request = {"cwd": os.getcwd(), "args": args}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(SOCKET_PATH))
+            client.sendall(json.dumps(request).encode())
+            client.shutdown(socket.SHUT_WR)
+            response = json.loads(receive_all(client))
+    except (OSError, ValueError):
+        # Stale socket of a server that is gone
+        return None
+
+    if response.get("code") is None:
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["code"]
+
+
+def stop_server() -> bool:
+    """Ask the server of the current workspace to stop. Returns False if none runs."""
+    if not is_supported() or not SOCKET_PATH.exists():
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(SOCKET_PATH))
+            client.sendall(json.dumps({"stop": True}).encode())
+            client.shutdown(socket.SHUT_WR)
+            receive_all(client)
+    except OSError:
+        return False
+    return True
+
+
+def serve(idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+    """
+    Serve commands of the current workspace until idle for too long.
+
+    Parsed files and assembled trees are kept in memory between commands
+    and are invalidated when the files change. Commands run one at a time.
+    """
+    # Imported here, so that forwarding a command does not load the API
+    from yamlex.api.cache import enable_cache
+    from yamlex.api.exceptions import ServerAlreadyRunning
+
+    if is_server_running():
+        raise ServerAlreadyRunning(
+            f"A server is already listening on {SOCKET_PATH}."
+        )
+
+    enable_cache()
+    SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    SOCKET_PATH.unlink(missing_ok=True)
+
+    workspace = os.getcwd()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(SOCKET_PATH))
+        server.listen()
+        server.settimeout(idle_timeout)
+        logger.info(f"Listening on {SOCKET_PATH} in {workspace}")
+
+        try:
+            while True:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    logger.info(f"Idle for {idle_timeout} seconds, stopping.")
+                    break
+
+                with connection:
+                    connection.settimeout(None)
+                    try:
+                        request = json.loads(receive_all(connection))
+                    except (OSError, ValueError) as e:
+                        logger.debug(f"Ignoring invalid request: {e}")
+                        continue
+                    if request.get("stop"):
+                        connection.sendall(b"{}")
+                        logger.info("Stop requested.")
+                        break
+
+                    if request.get("cwd") != workspace:
+                        # Commands of other workspaces run in-process
+                        response = {"code": None}
+                    else:
+                        response = run_command(request["args"])
+                    connection.sendall(json.dumps(response).encode())
+        finally:
+            SOCKET_PATH.unlink(missing_ok=True)
+
+
+def is_server_running() -> bool:
+    """Check whether another server listens on the socket of the workspace."""
+    if not SOCKET_PATH.exists():
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(SOCKET_PATH))
+    except OSError:
+        return False
+    return True
+
+
+def run_command(args: list[str]) -> dict:
+    """Run the command in this process and capture its output and exit code."""
+    # Imported here to avoid a circular import with the app
+    from yamlex.cli.app import run
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+
+    # The root logger is configured once per process. Redirect its output
+    # and undo the level changes of --verbose and --quiet afterwards.
+    saved_argv = sys.argv
+    saved_level = logging.root.level
+    saved_streams = [
+        (handler, handler.stream)
+        for handler in logging.root.handlers
+        if isinstance(handler, logging.StreamHandler)
+    ]
+    for handler, _ in saved_streams:
+        handler.setStream(stderr)
+
+    code = 0
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            sys.argv = ["yamlex", *args]
+            try:
+                run(forward=False)
+            except SystemExit as e:
+                if isinstance(e.code, int):
+                    code = e.code
+                elif e.code is not None:
+                    print(e.code, file=sys.stderr)
+                    code = 1
+            except Exception:
+                traceback.print_exc()
+                code = 1
+    finally:
+        sys.argv = saved_argv
+        logging.root.setLevel(saved_level)
+        for handler, stream in saved_streams:
+            handler.setStream(stream)
+
+    return {
+        "code": code,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+    }
+
+
+def receive_all(connection: socket.socket) -> bytes:
+    chunks: list[bytes] = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks)